@@ -2,106 +2,339 @@
 """
 Utility functions for sentiment analysis, keyword extraction,
 and document-level statistics for visualization and analytics.
+
+Sentiment and keywords come from one JSON-mode LLM call per document,
+or per batch of short documents packed into a single prompt. Results
+are stored in the document_analysis table keyed by content hash and
+method, so a text is only ever analyzed once per method. Keywords can also be extracted locally
+(TF-IDF over the keyword index, no API call at all).
 """
 
-from rag_qa import ask_gemini_with_context
+import math
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import database
+from config import (
+    ANALYSIS_BATCH_CHARS,
+    ANALYSIS_BATCH_SIZE,
+    ANALYSIS_CONCURRENCY,
+    ANALYSIS_SHORT_CHARS,
+)
+from jobs import JobCancelled, get_job_registry
+from llm_client import configuration_error, get_client
+
+# Characters of each document sent to the LLM (as before)
+ANALYSIS_INPUT_CHARS = 3000
+
+# Characters of each document scanned for local keywords
+LOCAL_KEYWORD_CHARS = 200_000
+
+SENTIMENTS = ("Positive", "Negative", "Neutral")
+
+# Analysis methods stored with each result: "llm" has sentiment and
+# keywords, "local" only keywords
+ANALYSIS_METHODS = ("llm", "local")
+
+ANALYSIS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "sentiment": {"type": "STRING", "enum": list(SENTIMENTS)},
+        "keywords": {"type": "ARRAY", "items": {"type": "STRING"}},
+    },
+    "required": ["sentiment", "keywords"],
+}
+
+BATCH_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {"id": {"type": "INTEGER"}, **ANALYSIS_SCHEMA["properties"]},
+        "required": ["id", "sentiment", "keywords"],
+    },
+}
+
+# Same tokens as the keyword index (FTS5 unicode61), so IDF lookups match
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been
+before being below between both but by can could did do does doing down during each
+few for from further had has have having he her here hers herself him himself his how
+however i if in into is it its itself just like may me might more most must my myself
+no nor not now of off on once one only or other our ours ourselves out over own same
+shall she should so some such than that the their theirs them themselves then there
+these they this those through to too under until up upon us very was we were what when
+where which while who whom why will with within without would yet you your yours
+yourself yourselves also etc eg ie via per new use used using get got make made
+""".split())
 
 
 # --------------------------------------------------------------------
 # Helper: safely truncate long text for prompt limits
 # --------------------------------------------------------------------
-def _safe_text(text, limit=3000):
+def _safe_text(text, limit=ANALYSIS_INPUT_CHARS):
     if not text:
         return ""
     return text[:limit]
 
 
+def _clean_result(result, max_keywords):
+    """Normalize one parsed {"sentiment", "keywords"} object (None if malformed)."""
+    if not isinstance(result, dict):
+        return None
+    sentiment = str(result.get("sentiment", "")).strip().capitalize()
+    keywords = result.get("keywords")
+    if sentiment not in SENTIMENTS or not isinstance(keywords, list):
+        return None
+    keywords = [str(k).strip() for k in keywords if str(k).strip()]
+    return {"sentiment": sentiment, "keywords": keywords[:max_keywords]}
+
+
 # --------------------------------------------------------------------
-# SENTIMENT ANALYSIS
+# SENTIMENT + KEYWORDS (one LLM call)
 # --------------------------------------------------------------------
-def analyze_sentiment(text: str) -> str:
+def analyze_text(text: str, max_keywords=5):
     """
-    Classify overall sentiment as Positive, Negative, or Neutral.
-    Returns a single word.
+    Classify sentiment (Positive / Negative / Neutral) and extract the top
+    keywords in a single JSON-mode call. Returns {"sentiment", "keywords"},
+    or None if the call failed.
     """
+    if configuration_error():
+        return None
     text = _safe_text(text)
 
     prompt = f"""
-    You are a sentiment classifier. Read the document text and classify the
-    overall sentiment strictly as one of the following:
-
-    - Positive
-    - Negative
-    - Neutral
-
-    Respond with ONLY one word, no explanation.
+    Read the document and return JSON with:
+    - "sentiment": the overall sentiment, exactly one of Positive, Negative, Neutral
+    - "keywords": the {max_keywords} most important keywords, most important first
 
     Document:
     {text}
     """
 
-    result = ask_gemini_with_context([text], prompt)
-    return result.strip()
+    try:
+        return _clean_result(get_client().generate_json(prompt, ANALYSIS_SCHEMA), max_keywords)
+    except Exception:
+        return None
+
+
+def analyze_texts(texts, max_keywords=5):
+    """
+    Analyze several short texts in one prompt. Returns a list aligned with
+    texts holding {"sentiment", "keywords"} or None for texts the reply
+    missed (or all None if the call failed).
+    """
+    if configuration_error() or not texts:
+        return [None] * len(texts)
+
+    documents = "\n\n".join(f'<document id="{i}">\n{_safe_text(text)}\n</document>'
+                            for i, text in enumerate(texts))
+    prompt = f"""
+    For EACH document below return one JSON object with:
+    - "id": the document id
+    - "sentiment": the overall sentiment, exactly one of Positive, Negative, Neutral
+    - "keywords": the {max_keywords} most important keywords, most important first
+    Respond with a JSON array of {len(texts)} objects.
+
+    {documents}
+    """
+
+    try:
+        reply = get_client().generate_json(prompt, BATCH_SCHEMA)
+    except Exception:
+        return [None] * len(texts)
+
+    results = [None] * len(texts)
+    for item in reply if isinstance(reply, list) else []:
+        index = item.get("id") if isinstance(item, dict) else None
+        if isinstance(index, int) and 0 <= index < len(texts):
+            results[index] = _clean_result(item, max_keywords)
+    return results
 
 
 # --------------------------------------------------------------------
 # KEYWORD EXTRACTION
 # --------------------------------------------------------------------
-def extract_keywords(text: str, max_keywords=5):
+def extract_keywords_local(text: str, max_keywords=5):
     """
-    Extract important keywords from the document using Gemini.
-    Returns a Python list of strings.
+    Extract keywords without any API call: words and two-word phrases
+    (no stopwords) ranked by term frequency times inverse chunk frequency
+    in the keyword index, so terms common across the corpus rank low.
+    Without a keyword index this is plain term frequency.
     """
-    text = _safe_text(text)
+    tokens = _TOKEN_RE.findall(_safe_text(text, LOCAL_KEYWORD_CHARS).lower())
+    words = Counter(t for t in tokens
+                    if len(t) > 2 and t.isalpha() and t not in STOPWORDS)
+    if not words:
+        return []
 
-    prompt = f"""
-    Extract the TOP {max_keywords} most important keywords from the following text.
-    Respond ONLY with a comma-separated list of keywords. No sentences.
+    total, counts = database.get_term_chunk_counts(list(words))
+    def idf(term):
+        return math.log((total + 1) / (counts.get(term, 0) + 1)) + 1 if total else 1.0
 
-    Text:
-    {text}
-    """
+    scores = {term: tf * idf(term) for term, tf in words.items()}
+
+    # Phrases: adjacent content words repeated in the text
+    phrases = Counter(f"{a} {b}" for a, b in zip(tokens, tokens[1:])
+                      if a in words and b in words and a != b)
+    for phrase, tf in phrases.items():
+        if tf > 1:
+            first, second = phrase.split()
+            scores[phrase] = tf * (idf(first) + idf(second))
 
-    result = ask_gemini_with_context([text], prompt)
-    keywords = [kw.strip() for kw in result.split(",")]
+    keywords = []
+    for term, _ in sorted(scores.items(), key=lambda item: (-item[1], item[0])):
+        # A word already covered by a chosen phrase (or vice versa) adds nothing
+        if any(term in chosen.split() or chosen in term.split() for chosen in keywords):
+            continue
+        keywords.append(term)
+        if len(keywords) == max_keywords:
+            break
     return keywords
 
 
 # --------------------------------------------------------------------
 # DOCUMENT STATISTICS
 # --------------------------------------------------------------------
-def compute_document_stats(raw_text: str, summary: str = None):
+def stored_document_stats(doc_id: int):
     """
-    Compute useful statistics for visualization.
-    Returns a dictionary.
+    Statistics for visualization, read from the columns filled in
+    once at ingest.
     """
-    if not raw_text:
-        raw_text = ""
-
+    info = database.get_document_info(
+        doc_id, ("char_length", "summary_length", "word_count", "line_count"))
+    if info is None:
+        return None
     return {
-        "length": len(raw_text),
-        "summary_length": len(summary) if summary else 0,
-        "word_count": len(raw_text.split()),
-        "line_count": raw_text.count("\n") + 1,
+        "length": info["char_length"] or 0,
+        "summary_length": info["summary_length"] or 0,
+        "word_count": info["word_count"] or 0,
+        "line_count": info["line_count"] or 0,
     }
 
 
 # --------------------------------------------------------------------
 # FULL ANALYSIS PIPELINE
 # --------------------------------------------------------------------
-def analyze_document(raw_text: str, summary: str = None):
+def _pack(docs):
+    """
+    Group (id, source, hash, text) rows into LLM calls: short texts share
+    a prompt (ANALYSIS_BATCH_SIZE / ANALYSIS_BATCH_CHARS), long ones go alone.
+    """
+    batch, batch_chars = [], 0
+    for doc in docs:
+        text = doc[3]
+        if len(text) > ANALYSIS_SHORT_CHARS:
+            yield [doc]
+            continue
+        if batch and (len(batch) == ANALYSIS_BATCH_SIZE or
+                      batch_chars + len(text) > ANALYSIS_BATCH_CHARS):
+            yield batch
+            batch, batch_chars = [], 0
+        batch.append(doc)
+        batch_chars += len(text)
+    if batch:
+        yield batch
+
+
+def _analyze_batch(batch):
+    """LLM results for one packed batch; texts a batch reply missed are retried alone."""
+    if len(batch) == 1:
+        return [analyze_text(batch[0][3])]
+    results = analyze_texts([doc[3] for doc in batch])
+    return [result if result is not None else analyze_text(doc[3])
+            for doc, result in zip(batch, results)]
+
+
+def analyze_documents(doc_ids=None, method="llm", job_id=None):
     """
-    Return a full analysis package:
-    - sentiment
-    - keywords
-    - stats
+    Analyze every stored document (or those in doc_ids) that has no stored
+    analysis by method yet and store the results. Returns a list of {"id", "source",
+    "sentiment", "keywords", "method"} for the documents analyzed in this
+    run. Progress is reported to the job registry when job_id is given.
     """
-    sentiment = analyze_sentiment(raw_text)
-    keywords = extract_keywords(raw_text)
-    stats = compute_document_stats(raw_text, summary)
+    if method not in ANALYSIS_METHODS:
+        raise ValueError(f"Unknown analysis method: {method}")
+    jobs = get_job_registry()
+    database.prune_document_analyses()
+    todo = database.get_documents_without_analysis((method,), ANALYSIS_INPUT_CHARS, doc_ids)
+    if job_id:
+        jobs.update(job_id, total=len(todo))
+
+    results = []
+
+    def store(docs, analyses):
+        rows, done, errors = [], [], []
+        for (doc_id, source, text_hash, _), analysis in zip(docs, analyses):
+            if analysis is None:
+                errors.append({"id": doc_id, "source": source, "error": "Analysis failed"})
+                continue
+            rows.append((text_hash, analysis["sentiment"], analysis["keywords"], method))
+            done.append({"id": doc_id, "source": source, **analysis, "method": method})
+        if rows:
+            database.put_document_analyses(rows)
+        if job_id:
+            jobs.add_results(job_id, done)
+            jobs.add_errors(job_id, errors)
+        results.extend(done)
+
+    if method == "local":
+        for start in range(0, len(todo), ANALYSIS_BATCH_SIZE):
+            jobs.check_cancelled(job_id)
+            docs = todo[start:start + ANALYSIS_BATCH_SIZE]
+            # The truncated text is enough for the LLM but not for TF-IDF
+            store(docs, [{"sentiment": None,
+                          "keywords": extract_keywords_local(_leading_text(doc[0]))}
+                         for doc in docs])
+        return results
+
+    with ThreadPoolExecutor(max_workers=ANALYSIS_CONCURRENCY) as executor:
+        futures = {executor.submit(_analyze_batch, batch): batch for batch in _pack(todo)}
+        for future in as_completed(futures):
+            if jobs.cancelled(job_id):
+                executor.shutdown(cancel_futures=True)
+                raise JobCancelled(job_id)
+            store(futures[future], future.result())
+    return results
 
+
+def _leading_text(doc_id, limit=LOCAL_KEYWORD_CHARS):
+    """The first limit characters of a document; later blocks are never read."""
+    parts, size = [], 0
+    blocks = database.iter_document_text(doc_id)
+    try:
+        for block in blocks:
+            parts.append(block[:limit - size])
+            size += len(parts[-1])
+            if size >= limit:
+                break
+    finally:
+        blocks.close()  # hand the pooled connection back now
+    return "".join(parts)
+
+
+def get_document_analysis(doc_id: int):
+    """Stored analysis and statistics of one document, or None if unknown."""
+    info = database.get_document_info(doc_id, ("id", "path_or_url", "content_hash"))
+    if info is None:
+        return None
+    stored = database.get_document_analyses([info["content_hash"]]).get(info["content_hash"])
     return {
-        "sentiment": sentiment,
-        "keywords": keywords,
-        "stats": stats
+        "id": doc_id,
+        "source": info["path_or_url"],
+        "sentiment": stored["sentiment"] if stored else None,
+        "keywords": stored["keywords"] if stored else None,
+        "method": stored["method"] if stored else None,
+        "stats": stored_document_stats(doc_id),
     }
+
+
+def start_analysis(doc_ids=None, method="llm"):
+    """Queue an analysis job for a worker process and return its id."""
+    if method not in ANALYSIS_METHODS:
+        raise ValueError(f"Unknown analysis method: {method}")
+    return get_job_registry().enqueue(
+        "analyze", {"doc_ids": doc_ids, "method": method},
+        total=len(doc_ids) if doc_ids is not None else 0)
@@ -0,0 +1,232 @@
+"""
+FAISS index backends and the policy that picks one by corpus size.
+
+Backends:
+    flat      - exact search (IndexFlatL2), scans every vector
+    ivf_flat  - inverted lists over raw vectors, tuned with nprobe
+    ivf_pq    - inverted lists over product-quantized vectors, tuned with nprobe
+    hnsw      - graph index, tuned with efSearch (no per-id deletes)
+
+With vector_dtype="float16" the flat, ivf_flat and hnsw backends store
+vectors as fp16 scalar-quantized codes, halving their memory; ivf_pq is
+already compressed and ignores it.
+"""
+
+import math
+import threading
+
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+VECTOR_DTYPES = ("float32", "float16")
+
+# Auto policy thresholds (number of vectors)
+FLAT_MAX_VECTORS = 50_000
+IVF_FLAT_MAX_VECTORS = 1_000_000
+
+# faiss warns below ~39 training points per centroid
+MIN_POINTS_PER_CENTROID = 39
+MAX_TRAINING_POINTS = 200_000
+
+# IVF indexes are retrained once the corpus has grown this much past the
+# size they were trained on.
+RETRAIN_GROWTH_FACTOR = 4
+
+HNSW_M = 32
+DEFAULT_NPROBE = 16
+DEFAULT_EF_SEARCH = 64
+
+_faiss = None
+_faiss_lock = threading.Lock()
+
+
+def get_faiss():
+    """Return the faiss module, importing it on first call."""
+    global _faiss
+    if _faiss is None:
+        with _faiss_lock:
+            if _faiss is None:
+                import faiss
+                _faiss = faiss
+    return _faiss
+
+
+def choose_index_type(n_vectors):
+    """Pick an index backend for a corpus of n_vectors."""
+    if n_vectors < FLAT_MAX_VECTORS:
+        return "flat"
+    if n_vectors < IVF_FLAT_MAX_VECTORS:
+        return "ivf_flat"
+    return "ivf_pq"
+
+
+def _nlist_for(n_vectors):
+    """Number of IVF cells: ~4*sqrt(n), bounded by the available training data."""
+    nlist = int(4 * math.sqrt(max(n_vectors, 1)))
+    return max(1, min(nlist, n_vectors // MIN_POINTS_PER_CENTROID))
+
+
+def _pq_subquantizers(dim):
+    """Largest divisor of dim giving at least 8 dims per sub-quantizer (max 64)."""
+    for m in range(min(64, dim // 8), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def _training_sample(vectors):
+    if len(vectors) <= MAX_TRAINING_POINTS:
+        return vectors
+    rng = np.random.default_rng(0)
+    pick = rng.choice(len(vectors), MAX_TRAINING_POINTS, replace=False)
+    return vectors[pick]
+
+
+def build_index(index_type, vectors, ids=None, vector_dtype="float32"):
+    """
+    Create, train (for IVF) and fill an index of the given type, storing
+    vectors at vector_dtype precision.
+
+    index_type may be "auto". Falls back to "flat" when there is not
+    enough data to train an IVF index. When ids is given the index is
+    wrapped in IndexIDMap2 and the vectors are added with those ids.
+
+    Returns (index, resolved_type).
+    """
+    faiss = get_faiss()
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    n, dim = vectors.shape
+
+    if index_type == "auto":
+        index_type = choose_index_type(n)
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {index_type}")
+    if vector_dtype not in VECTOR_DTYPES:
+        raise ValueError(f"Unknown vector dtype: {vector_dtype}")
+    fp16 = vector_dtype == "float16"
+    sq_fp16 = faiss.ScalarQuantizer.QT_fp16
+
+    nlist = _nlist_for(n)
+    if index_type in ("ivf_flat", "ivf_pq") and nlist < 2:
+        index_type = "flat"
+    if index_type == "ivf_pq" and n < 256 * MIN_POINTS_PER_CENTROID:
+        index_type = "ivf_flat"
+
+    if index_type == "flat":
+        base = faiss.IndexScalarQuantizer(dim, sq_fp16) if fp16 else faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        if fp16:
+            base = faiss.IndexHNSWSQ(dim, sq_fp16, HNSW_M)
+            base.train(_training_sample(vectors))   # no-op for fp16, but required
+        else:
+            base = faiss.IndexHNSWFlat(dim, HNSW_M)
+    else:
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == "ivf_flat" and fp16:
+            base = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, sq_fp16)
+        elif index_type == "ivf_flat":
+            base = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            base = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_subquantizers(dim), 8)
+        base.train(_training_sample(vectors))
+
+    if ids is None:
+        index = base
+        index.add(vectors)
+    else:
+        index = faiss.IndexIDMap2(base)
+        index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+
+    set_search_params(index, DEFAULT_NPROBE, DEFAULT_EF_SEARCH)
+    return index, index_type
+
+
+def read_index(path, mmap=False):
+    """
+    Load an index saved with faiss.write_index. With mmap=True the vectors
+    stay in the file and are paged in on demand, so processes reading the
+    same file share one page-cache copy. A memory-mapped index is
+    read-only: reload it with mmap=False before adding or removing.
+    """
+    faiss = get_faiss()
+    if not mmap:
+        return faiss.read_index(path)
+    flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    return faiss.read_index(path, flag | faiss.IO_FLAG_READ_ONLY)
+
+
+def _base_index(index):
+    """Unwrap IndexIDMap/IndexIDMap2 to the index doing the actual search."""
+    faiss = get_faiss()
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """Apply recall knobs to whatever backend the index uses."""
+    faiss = get_faiss()
+    base = _base_index(index)
+    if nprobe is not None and isinstance(base, faiss.IndexIVF):
+        base.nprobe = int(min(nprobe, base.nlist))
+    if ef_search is not None and isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = int(ef_search)
+
+
+def get_search_params(index):
+    """Return (nprobe, ef_search) currently set on the index (None if n/a)."""
+    faiss = get_faiss()
+    base = _base_index(index)
+    nprobe = base.nprobe if isinstance(base, faiss.IndexIVF) else None
+    ef_search = base.hnsw.efSearch if isinstance(base, faiss.IndexHNSW) else None
+    return nprobe, ef_search
+
+
+def search_index(index, query_vectors, top_k, nprobe=None, ef_search=None):
+    """
+    index.search with per-call recall knobs; the previous settings are
+    restored afterwards. Callers sharing an index must hold their own lock.
+    """
+    previous = get_search_params(index)
+    set_search_params(index, nprobe, ef_search)
+    try:
+        return index.search(query_vectors, top_k)
+    finally:
+        set_search_params(index, *previous)
+
+
+def l2_to_similarity(distance):
+    """
+    Cosine similarity for a squared L2 distance between unit-length vectors
+    (sentence-transformers models normalize their embeddings): 1 - d / 2.
+    """
+    return 1.0 - float(distance) / 2.0
+
+
+def supports_remove(index_type):
+    """HNSW graphs cannot drop individual vectors."""
+    return index_type != "hnsw"
+
+
+def needs_rebuild(index_type, n_vectors, trained_size, configured="auto"):
+    """
+    True when the current index should be rebuilt for n_vectors:
+    - under "auto", the corpus crossed a policy threshold (downgrades
+      only happen once it has shrunk to half the threshold, to avoid flapping)
+    - an IVF index has outgrown the data it was trained on
+    """
+    if index_type in ("ivf_flat", "ivf_pq") and \
+            n_vectors > RETRAIN_GROWTH_FACTOR * max(trained_size, 1):
+        return True
+
+    if configured != "auto":
+        # Configured backend fell back to flat for lack of training data;
+        # try again once the corpus has doubled.
+        return index_type != configured and n_vectors >= 2 * max(trained_size, 1)
+
+    order = {"flat": 0, "hnsw": 0, "ivf_flat": 1, "ivf_pq": 2}
+    wanted = choose_index_type(n_vectors)
+    if order[wanted] > order[index_type]:
+        return True
+    shrunk = choose_index_type(n_vectors * 2)
+    return order[shrunk] < order[index_type]
@@ -0,0 +1,206 @@
+"""
+Two-level cache for /ask answers.
+
+Level 1 (exact): key = (normalized question, retrieved chunk ids, model,
+prompt template version, corpus generation).
+Level 2 (semantic): a question whose embedding is very close to a cached
+one, with the same retrieved chunks / model / prompt version / corpus
+generation, reuses that answer.
+
+Entries expire after a TTL and the cache is LRU-bounded. The corpus
+generation (database.get_corpus_generation) changes whenever a document
+is added, deleted or re-ingested and whenever the search index is saved,
+in whichever process that happens (web workers, job workers), so every
+process stops serving answers built from the old corpus. Invalidation is
+coarse: any corpus change drops every cached answer, not only those
+built from the changed document.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import database
+from config import (
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_SIMILARITY,
+    ANSWER_CACHE_TTL_SECONDS,
+    GEMINI_MODEL,
+)
+
+# Bump whenever the RAG prompt in rag_qa changes, so old answers miss.
+PROMPT_VERSION = "rag-v1"
+
+
+def normalize_question(question):
+    """Lowercase, drop punctuation and collapse whitespace."""
+    question = re.sub(r"[^\w\s]", " ", question.lower())
+    return " ".join(question.split())
+
+
+class AnswerCache:
+    def __init__(self, max_entries=None, ttl_seconds=None, similarity=None,
+                 model=None, prompt_version=PROMPT_VERSION):
+        self.max_entries = max_entries or ANSWER_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds or ANSWER_CACHE_TTL_SECONDS
+        self.similarity = similarity or ANSWER_CACHE_SIMILARITY
+        self.model = model or GEMINI_MODEL
+        self.prompt_version = prompt_version
+
+        # key -> {"answer", "vector", "context", "generation"}, in LRU order
+        self._entries = OrderedDict()
+        # key -> expiry time, in insertion order: with one TTL for every
+        # entry that is also expiry order, so expiring stops at the first
+        # live entry
+        self._expiry = OrderedDict()
+        # Newest generation seen; older entries are dropped when it moves
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._counters = {"exact_hits": 0, "semantic_hits": 0, "misses": 0,
+                          "evictions": 0, "invalidations": 0}
+
+    def _key(self, question, chunk_ids, generation):
+        return (normalize_question(question), tuple(sorted(chunk_ids)),
+                self.model, self.prompt_version, generation)
+
+    def _drop(self, key):
+        del self._entries[key]
+        del self._expiry[key]
+
+    def _expire(self, now, generation):
+        if generation > self._generation:
+            # The corpus changed (rare): answers of older generations are stale
+            self._generation = generation
+            for key in [k for k, e in self._entries.items() if e["generation"] < generation]:
+                self._drop(key)
+                self._counters["invalidations"] += 1
+
+        while self._expiry:
+            key, expires = next(iter(self._expiry.items()))
+            if expires > now:
+                break
+            self._drop(key)
+            self._counters["evictions"] += 1
+
+    def generation(self):
+        """
+        The current corpus generation. Read it before retrieving and pass
+        it to get() / put(), so an answer built while the corpus changed
+        is stored under the generation it was built from.
+        """
+        return database.get_corpus_generation()
+
+    # -----------------------------
+    # Lookup / store
+    # -----------------------------
+    def get(self, question, chunk_ids, query_vector=None, generation=None):
+        """
+        Return a cached answer or None. chunk_ids identify the retrieved
+        chunks (e.g. (doc_id, chunk_id) pairs); query_vector, if given,
+        enables the semantic level. generation defaults to the current one.
+        """
+        if generation is None:
+            generation = self.generation()
+        key = self._key(question, chunk_ids, generation)
+        now = time.time()
+
+        with self._lock:
+            self._expire(now, generation)
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._counters["exact_hits"] += 1
+                return entry["answer"]
+
+            if query_vector is not None:
+                match = self._semantic_match(key[1:], _unit(query_vector))
+                if match is not None:
+                    self._entries.move_to_end(match)
+                    self._counters["semantic_hits"] += 1
+                    return self._entries[match]["answer"]
+
+            self._counters["misses"] += 1
+            return None
+
+    def _semantic_match(self, context, vector):
+        """Best cached key with the same context and cosine >= threshold."""
+        candidates = [k for k, e in self._entries.items()
+                      if e["context"] == context and e["vector"] is not None]
+        if not candidates:
+            return None
+
+        matrix = np.vstack([self._entries[k]["vector"] for k in candidates])
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        return candidates[best] if scores[best] >= self.similarity else None
+
+    def put(self, question, chunk_ids, answer, query_vector=None, generation=None):
+        """Store an answer built from the retrieved chunks chunk_ids."""
+        if generation is None:
+            generation = self.generation()
+        key = self._key(question, chunk_ids, generation)
+        now = time.time()
+        with self._lock:
+            self._expire(now, generation)
+            if generation < self._generation:
+                return      # the corpus changed while the answer was built
+
+            self._entries[key] = {
+                "answer": answer,
+                "vector": None if query_vector is None else _unit(query_vector),
+                "context": key[1:],
+                "generation": generation,
+            }
+            self._entries.move_to_end(key)
+            self._expiry[key] = now + self.ttl_seconds
+            self._expiry.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self._counters["evictions"] += 1
+
+    # -----------------------------
+    # Invalidation
+    # -----------------------------
+    def clear(self):
+        with self._lock:
+            self._counters["invalidations"] += len(self._entries)
+            self._entries.clear()
+            self._expiry.clear()
+
+    # -----------------------------
+    # Counters
+    # -----------------------------
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._entries)
+        lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["exact_hits"] + stats["semantic_hits"]) / lookups \
+            if lookups else 0.0
+        return stats
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype="float32").reshape(-1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+# ----------------------------------------------------
+# Process-wide instance
+# ----------------------------------------------------
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """Return the process-wide AnswerCache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AnswerCache()
+        return _cache
@@ -1,11 +1,21 @@
 from export_utils import export_to_csv, export_to_excel, export_to_docx
 import database
 from document_ingestor import DocumentIngestor
-from rag_engine import VectorStore
-from rag_qa import ask_gemini_with_context
-from rag_engine import build_vector_store_from_db, run_rag_query
+from analysis_utils import ANALYSIS_METHODS, get_document_analysis, start_analysis
+from answer_cache import get_answer_cache
+from chat_store import format_turns, get_chat_store
+from crawler import start_crawl
+from bulk_summarize import start_bulk_summarize
+from config import JOB_WORKERS
+from index_manager import get_index_manager, make_vector_id
+from ingest_dedup import check_source
+from ingest_pipeline import classify_upload, get_pipeline
+from jobs import get_job_registry
+from rag_engine import embed_query, retrieve
+from rag_qa import ask_gemini_with_context, stream_gemini_with_context
 from flask import (
     Flask,
+    Response,
     request,
     render_template,
     jsonify,
@@ -13,10 +23,17 @@ from flask import (
     redirect,
     url_for,
     send_from_directory,
-    session
+    session,
+    stream_with_context
 )
+from collections import OrderedDict
 import os
+import hashlib
 import io
+import json
+import tempfile
+import threading
+import uuid
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -36,36 +53,149 @@ os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
 database.init_db()
 ingestor = DocumentIngestor()
 
-# Chat history in memory
-chat_history: list[dict] = []
+# Persistent FAISS index, read-only in web processes: document changes
+# (deletes, resets) and out-of-date indexes are handled by a worker
+# process, not in a request. Hits of deleted documents are skipped meanwhile.
+index_manager = get_index_manager()
+index_manager.request_rebuild = lambda: get_job_registry().enqueue("reindex", unique=True)
+index_manager.defer_changes = lambda event, doc_id=None: get_job_registry().enqueue(
+    "index_sync", {"event": event, "doc_id": doc_id})
+
+# /ask answer cache, keyed on the corpus generation shared by all processes
+answer_cache = get_answer_cache()
+
+# Heavy libraries load lazily; optionally pre-load them off the request path
+if os.getenv("WARMUP_ON_START", "0") == "1":
+    from warmup import start_warmup
+    start_warmup()
+
+# Per-session chat conversations (SQLite + per-process LRU)
+chat_store = get_chat_store()
+
+# Messages rendered on the /chat page; older ones stay in the database
+CHAT_PAGE_MESSAGES = 100
+
+# Answers produced by /ask/stream, keyed by the id kept in the session.
+# The session cookie is sent before streaming starts, so the final answer
+# cannot be stored in it directly.
+MAX_STREAMED_ANSWERS = 256
+_streamed_answers: "OrderedDict[str, str]" = OrderedDict()
+_streamed_answers_lock = threading.Lock()
 
 
 # ----------------------------------------------------------
-# FIXED: move vector store helper before any route that uses it
+# Vector store helper used by /ask and /chat/send
 # ----------------------------------------------------------
-def _build_vector_store():
+def _get_vector_store():
+    """
+    Return the shared persistent index, or None when nothing is indexed.
+    The index is updated incrementally on add/delete, never rebuilt here.
+    """
+    if index_manager.is_empty():
+        return None
+    return index_manager
+
+
+def _sse(event, data):
+    """Format one Server-Sent Events message with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _sse_response(generator):
+    return Response(
+        stream_with_context(generator),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _remember_streamed_answer(answer_id, answer):
+    with _streamed_answers_lock:
+        _streamed_answers[answer_id] = answer
+        while len(_streamed_answers) > MAX_STREAMED_ANSWERS:
+            _streamed_answers.popitem(last=False)
+
+
+def _retrieve(question, top_k=4):
+    """Return the texts of the top_k chunks for question ([] if KB empty)."""
+    if _get_vector_store() is None:
+        return []
+    return [item["text"] for item in retrieve(question, top_k=top_k)]
+
+
+def _retrieve_for_cache(question, top_k=4):
     """
-    Load all docs from DB and build FAISS vector store.
-    Used for both /ask and /chat/send.
+    Retrieval for the cached /ask paths. Returns (hits, query_vector);
+    the query embedding is shared by the search, the reranker and the
+    semantic cache.
     """
-    docs = database.get_all_documents()
-    if not docs:
-        return None, []
+    if _get_vector_store() is None:
+        return [], None
+    query_vector = embed_query(question)
+    return retrieve(question, top_k=top_k, query_vector=query_vector), query_vector
+
 
-    vs = VectorStore()
-    sources = []
+def _chunk_ids(hits):
+    """(doc_id, chunk_id) pairs of retrieved hits, as keyed by the answer cache."""
+    return [(h["meta"]["doc_id"], h["meta"]["chunk_id"]) for h in hits]
 
-    for (doc_id, source_type, path_or_url, raw_text, summary) in docs:
-        if not raw_text:
+
+def _export_refs(hits):
+    """
+    What /export_results needs to rebuild hits: (doc_id, chunk_id, start,
+    end, score, similarity) each. The texts stay out of the cookie session.
+    """
+    return [(h["meta"]["doc_id"], h["meta"]["chunk_id"], h["meta"]["start"], h["meta"]["end"],
+             h["score"], h["meta"].get("similarity")) for h in hits]
+
+
+def _export_hits(refs):
+    """Hits of _export_refs with their texts re-read; deleted documents are skipped."""
+    stored = database.get_indexed_chunks(
+        [(make_vector_id(doc_id, chunk_id), doc_id, chunk_id, start, end)
+         for doc_id, chunk_id, start, end, _, _ in refs])
+    hits = []
+    for (doc_id, chunk_id, start, end, score, similarity), row in zip(refs, stored):
+        if row is None:
             continue
-        vs.add_document(raw_text, source_name=path_or_url)
-        sources.append(path_or_url)
+        source, text, heading = row
+        hits.append({"text": text, "score": score,
+                     "meta": {"source": source, "doc_id": doc_id, "chunk_id": chunk_id,
+                              "start": start, "end": end, "heading": heading,
+                              "similarity": similarity}})
+    return hits
+
 
-    if not vs.chunks:
-        return None, sources
+def _is_error_answer(answer):
+    return answer.startswith("Error calling Gemini API")
 
-    vs.build()
-    return vs, sources
+
+def _conversation_id(create=True):
+    """The chat conversation of this browser session (created on demand)."""
+    conversation_id = session.get("chat_id")
+    if conversation_id is None and create:
+        conversation_id = chat_store.new_conversation_id()
+        session["chat_id"] = conversation_id
+    return conversation_id
+
+
+def _chat_prompt(conversation_id, message):
+    """
+    Build the chat prompt from the rolling summary of older turns plus the
+    recent turns (bounded by CHAT_HISTORY_TOKENS) and the new message.
+    """
+    summary, recent = chat_store.context(conversation_id)
+    summary_text = f"Summary of the earlier conversation:\n{summary}\n\n" if summary else ""
+
+    return (
+        "You are in a conversation with the user.\n"
+        "If external document context is provided, use it; otherwise answer normally.\n\n"
+        f"{summary_text}"
+        "Conversation so far:\n"
+        f"{format_turns(recent)}\n\n"
+        f"User's latest message: {message}\n\n"
+        "Reply as a helpful assistant."
+    )
 
 
 # ------------------------
@@ -79,13 +209,30 @@ def index():
 
 @app.route("/chat")
 def chat():
-    return render_template("chat.html", messages=chat_history)
+    conversation_id = _conversation_id(create=False)
+    messages = chat_store.messages(conversation_id, last=CHAT_PAGE_MESSAGES) \
+        if conversation_id else []
+    return render_template("chat.html", messages=messages)
+
+
+def _page_args(default_size=50, max_size=500):
+    """(page, page_size, offset) from the query string."""
+    page = max(request.args.get("page", 1, type=int), 1)
+    page_size = min(max(request.args.get("page_size", default_size, type=int), 1), max_size)
+    return page, page_size, (page - 1) * page_size
 
 
 @app.route("/documents")
 def documents():
-    docs = database.get_all_documents()
-    return render_template("documents.html", docs=docs)
+    page, page_size, offset = _page_args()
+    docs = database.list_documents(
+        offset=offset,
+        limit=page_size,
+        columns=("id", "source_type", "path_or_url", "char_length", "summary_length"),
+    )
+    total = database.count_documents()
+    return render_template("documents.html", docs=docs, page=page,
+                           page_size=page_size, total=total)
 
 
 @app.route("/documents/delete/<int:doc_id>", methods=["POST"])
@@ -96,8 +243,6 @@ def delete_document(doc_id):
 
 @app.route("/reset_kb", methods=["POST"])
 def reset_kb():
-    global chat_history
-
     database.clear_all_documents()
 
     upload_dir = app.config["UPLOAD_FOLDER"]
@@ -107,66 +252,125 @@ def reset_kb():
         except:
             pass
 
-    chat_history = []
+    chat_store.clear_all()
 
     return jsonify({"success": True})
 
 
+# Uploads are copied to disk in blocks of this size, never read whole
+UPLOAD_CHUNK_BYTES = 1 << 20
+
+
+def _save_upload(file, upload_dir):
+    """
+    Stream an uploaded file to a temporary file in upload_dir, in
+    UPLOAD_CHUNK_BYTES blocks. Returns (temp path, sha256 hex digest).
+    """
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(dir=upload_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for block in iter(lambda: file.stream.read(UPLOAD_CHUNK_BYTES), b""):
+                digest.update(block)
+                out.write(block)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path, digest.hexdigest()
+
+
 @app.route("/upload", methods=["POST"])
 def upload():
+    """
+    Save the uploaded files and queue them for background ingestion.
+    Parsing/OCR happens in the ingest pipeline; poll /jobs/<job_id>.
+    Files whose bytes are already stored are not processed again: the
+    job reports them as "unchanged" / "duplicate" with the existing doc id.
+    """
     files = request.files.getlist("file")
     if not files:
         return jsonify({"error": "No files uploaded"}), 400
 
-    from ocr_utils import extract_text_from_image, extract_text_from_scanned_pdf
-
     results = []
+    saved_paths = []
+    sources = {}
+    skipped = []
 
     for file in files:
         filename = file.filename
-        lower = filename.lower()
-        file_bytes = file.read()
-
         save_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-        with open(save_path, "wb") as f:
-            f.write(file_bytes)
-
-        # Images → OCR
-        if lower.endswith((".png", ".jpg", ".jpeg")):
-            text = extract_text_from_image(file_bytes)
-            database.add_document("image", save_path, text)
-            results.append({"file": filename, "type": "image", "ocr": True})
-            continue
+        temp_path, source_hash = _save_upload(file, app.config["UPLOAD_FOLDER"])
+        source_type, ocr = classify_upload(filename)
+
+        # Only new or changed files are kept in uploads/
+        status, doc_id = check_source(save_path, source_hash)
+        if status in ("unchanged", "duplicate"):
+            os.remove(temp_path)
+            skipped.append({"file": filename, "type": source_type,
+                            "doc_id": doc_id, "status": status})
+        else:
+            os.replace(temp_path, save_path)
+            saved_paths.append(save_path)
+            sources[save_path] = {"source_key": save_path, "source_hash": source_hash,
+                                  "replace": doc_id}
 
-        # PDF → OCR or fallback
-        if lower.endswith(".pdf"):
-            text = extract_text_from_scanned_pdf(save_path)
-            if not text or text.startswith("[OCR_PDF_ERROR]"):
-                text = ingestor.load(save_path)
-            database.add_document("pdf", save_path, text)
-            results.append({"file": filename, "type": "pdf", "ocr": True})
-            continue
+        results.append({"file": filename, "type": source_type, "ocr": ocr,
+                        "status": status, "doc_id": doc_id})
+
+    job_id = get_pipeline().submit(saved_paths, sources, skipped)
+    return jsonify({"success": True, "job_id": job_id, "results": results})
+
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = get_job_registry().get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job."}), 404
+    return jsonify(job)
 
-        # TXT / DOCX / other
-        text = ingestor.load(save_path)
-        database.add_document("file", save_path, text)
-        results.append({"file": filename, "type": "file", "ocr": False})
 
-    return jsonify({"success": True, "results": results})
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    status = get_job_registry().cancel(job_id)
+    if status is None:
+        return jsonify({"error": "Unknown job."}), 404
+    return jsonify({"success": True, "status": status})
 
 
 @app.route("/fetch_url", methods=["POST"])
 def fetch_url():
+    """
+    Queue a URL for fetching; poll /jobs/<job_id>. Known URLs are fetched
+    conditionally and only re-ingested if changed.
+    """
     url = request.form.get("url")
     if not url:
         return jsonify({"error": "No URL provided"}), 400
 
+    job_id = get_job_registry().enqueue("fetch_url", {"url": url}, total=1)
+    return jsonify({"success": True, "url": url, "job_id": job_id})
+
+
+@app.route("/crawl", methods=["POST"])
+def crawl():
+    """
+    Crawl a site (or a list of URLs, one per line) in the background and
+    ingest every page. Optional max_pages / max_depth (0 fetches only the
+    given URLs). Poll /jobs/<job_id>.
+    """
+    seeds = [u.strip() for u in request.form.get("url", "").splitlines() if u.strip()]
+    if not seeds:
+        return jsonify({"error": "No URL provided"}), 400
+
+    options = {}
     try:
-        text = ingestor.load(url)
-        database.add_document("url", url, text)
-        return jsonify({"success": True, "url": url})
-    except Exception as e:
-        return jsonify({"error": f"Failed to fetch: {str(e)}"}), 500
+        for name in ("max_pages", "max_depth"):
+            if request.form.get(name):
+                options[name] = int(request.form[name])
+    except ValueError:
+        return jsonify({"error": "max_pages and max_depth must be integers"}), 400
+
+    return jsonify({"job_id": start_crawl(seeds, **options)})
 
 
 @app.route("/ask", methods=["POST"])
@@ -175,36 +379,84 @@ def ask_question():
     if not question:
         return jsonify({"answer": "Please enter a question.", "chunks": []})
 
-    vs, kb_texts = _build_vector_store()
-    if vs is None:
-        # no documents → still produce an answer without RAG
-        answer = ask_gemini_with_context([], question)
-        session["last_export"] = []
-        session["last_answer"] = answer
-        session["last_question"] = question
-        return jsonify({"answer": answer, "chunks": []})
+    # No documents → hits is empty and Gemini answers without RAG
+    generation = answer_cache.generation()
+    hits, query_vector = _retrieve_for_cache(question)
+    retrieved_chunks = [item["text"] for item in hits]
+    chunk_ids = _chunk_ids(hits)
 
-    search_results = vs.search(question, top_k=4)
-    retrieved_chunks = [item["text"] for item in search_results]
+    answer = answer_cache.get(question, chunk_ids, query_vector, generation)
+    if answer is None:
+        answer = ask_gemini_with_context(retrieved_chunks, question)
+        if not _is_error_answer(answer):
+            answer_cache.put(question, chunk_ids, answer, query_vector, generation)
 
-    answer = ask_gemini_with_context(retrieved_chunks, question)
-
-    # 🔥 REQUIRED FOR EXPORT
-    session["last_export"] = retrieved_chunks
+    # 🔥 REQUIRED FOR EXPORT (texts are re-read on export, see _export_refs)
+    session["last_export"] = _export_refs(hits)
     session["last_answer"] = answer
     session["last_question"] = question
 
-    return jsonify({"answer": answer, "chunks": retrieved_chunks})
+    return jsonify({"answer": answer, "chunks": retrieved_chunks, "hits": hits})
+
+
+@app.route("/ask/stream", methods=["POST"])
+def ask_stream():
+    """
+    Streaming /ask over Server-Sent Events:
+      event: sources  -> retrieved chunks and scored hits, sent before the LLM call
+      event: token    -> {"text": ...} pieces of the answer
+      event: done     -> {"answer": full answer}
+    """
+    question = request.form.get("question", "").strip()
+    if not question:
+        return jsonify({"answer": "Please enter a question.", "chunks": []})
+
+    generation = answer_cache.generation()
+    hits, query_vector = _retrieve_for_cache(question)
+    retrieved_chunks = [item["text"] for item in hits]
+    chunk_ids = _chunk_ids(hits)
+    cached = answer_cache.get(question, chunk_ids, query_vector, generation)
+
+    answer_id = uuid.uuid4().hex
+    session["last_export"] = _export_refs(hits)
+    session["last_answer"] = ""
+    session["last_answer_id"] = answer_id
+    session["last_question"] = question
+
+    def generate():
+        yield _sse("sources", {"chunks": retrieved_chunks, "hits": hits})
+
+        if cached is not None:
+            answer = cached
+            yield _sse("token", {"text": answer})
+        else:
+            parts = []
+            for text in stream_gemini_with_context(retrieved_chunks, question):
+                parts.append(text)
+                yield _sse("token", {"text": text})
+
+            answer = "".join(parts).strip() or "(No answer returned by model.)"
+            if not _is_error_answer(answer):
+                answer_cache.put(question, chunk_ids, answer, query_vector, generation)
+
+        _remember_streamed_answer(answer_id, answer)
+        yield _sse("done", {"answer": answer})
+
+    return _sse_response(generate())
 
 
 @app.route("/export_results", methods=["POST"])
 def export_results():
     export_format = request.form.get("format", "csv")
 
-    rows = session.get("last_export", [])
+    rows = _export_hits(session.get("last_export", []))
     answer = session.get("last_answer", "")
     question = session.get("last_question", "")
 
+    if not answer and session.get("last_answer_id"):
+        with _streamed_answers_lock:
+            answer = _streamed_answers.get(session["last_answer_id"], "")
+
     if not rows:
         return jsonify({"error": "No data to export."}), 400
 
@@ -235,95 +487,152 @@ def export_results():
 def chat_send():
     """
     Chat endpoint:
-    - Keeps short-term conversation history
+    - Keeps a per-session conversation (recent turns + rolling summary)
     - Uses RAG only if documents exist
     - If no documents in KB → answer normally (ChatGPT-like)
+    - Returns only the new messages: {"messages": [user, assistant]}
     """
-    global chat_history
-
     message = request.form.get("message", "").strip()
     if not message:
         return jsonify({"error": "Empty message."}), 400
 
-    # Build vector store (if docs exist)
-    vs, _ = _build_vector_store()
-
-    # Build short conversation summary (last 6 turns)
-    history_text_lines = []
-    for turn in chat_history[-6:]:
-        role = turn["role"]
-        content = turn["content"]
-        history_text_lines.append(f"{role.capitalize()}: {content}")
-    history_text = "\n".join(history_text_lines)
-
-    # If documents exist → do RAG retrieval
-    if vs is not None:
-        search_results = vs.search(message, top_k=4)
-        retrieved_chunks = [item["text"] for item in search_results]
-    else:
-        # No documents → empty context
-        retrieved_chunks = []
-
-    # Final prompt
-    question_for_llm = (
-        "You are in a conversation with the user.\n"
-        "If external document context is provided, use it; otherwise answer normally.\n\n"
-        "Conversation so far:\n"
-        f"{history_text}\n\n"
-        f"User's latest message: {message}\n\n"
-        "Reply as a helpful assistant."
-    )
+    # RAG retrieval if documents exist, else empty context
+    conversation_id = _conversation_id()
+    retrieved_chunks = _retrieve(message)
+    question_for_llm = _chat_prompt(conversation_id, message)
 
     answer = ask_gemini_with_context(retrieved_chunks, question_for_llm)
 
-    # Update chat history
-    chat_history.append({"role": "user", "content": message})
-    chat_history.append({"role": "assistant", "content": answer})
+    return jsonify({"messages": chat_store.append(conversation_id, message, answer)})
+
 
-    return jsonify({"messages": chat_history})
+@app.route("/chat/messages")
+def chat_messages():
+    """Messages of this session's conversation with id > ?after= (default all)."""
+    conversation_id = _conversation_id(create=False)
+    if conversation_id is None:
+        return jsonify({"messages": []})
+    after = request.args.get("after", 0, type=int)
+    return jsonify({"messages": chat_store.messages(conversation_id, after_id=after)})
+
+
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """
+    Streaming /chat/send over Server-Sent Events (same events as
+    /ask/stream). The conversation is updated once the answer is
+    complete; "done" also carries the stored messages.
+    """
+    message = request.form.get("message", "").strip()
+    if not message:
+        return jsonify({"error": "Empty message."}), 400
+
+    # Resolved before streaming, while the session cookie can still be set
+    conversation_id = _conversation_id()
+    retrieved_chunks = _retrieve(message)
+    question_for_llm = _chat_prompt(conversation_id, message)
+
+    def generate():
+        yield _sse("sources", {"chunks": retrieved_chunks})
+
+        parts = []
+        for text in stream_gemini_with_context(retrieved_chunks, question_for_llm):
+            parts.append(text)
+            yield _sse("token", {"text": text})
+
+        answer = "".join(parts).strip() or "(No answer returned by model.)"
+        messages = chat_store.append(conversation_id, message, answer)
+        yield _sse("done", {"answer": answer, "messages": messages})
+
+    return _sse_response(generate())
 
 
 @app.route("/chat/clear", methods=["POST"])
 def chat_clear():
-    global chat_history
-    chat_history = []
+    conversation_id = _conversation_id(create=False)
+    if conversation_id is not None:
+        chat_store.clear(conversation_id)
     return jsonify({"success": True, "messages": []})
 
 
 @app.route("/summarize", methods=["POST"])
 def summarize():
-    docs = database.get_all_documents()
-    if not docs:
+    """
+    Summarize every document that has no summary yet, as a background job:
+    poll /jobs/<job_id>; its results hold {"id", "source", "summary"}.
+    """
+    if not database.get_document_ids():
         return jsonify({"error": "No documents in DB."})
 
-    summaries = []
-    for (doc_id, source_type, src, raw_text, summary) in docs:
-        if summary and summary.strip():
-            new = summary
-        else:
-            chunk = (raw_text or "")[:8000]
-            prompt = f"Summarize this clearly:\n\n{chunk}"
-            new = ask_gemini_with_context([chunk], prompt)
-            database.update_summary(doc_id, new)
+    return jsonify({"job_id": start_bulk_summarize()})
+
+
+@app.route("/analyze", methods=["POST"])
+def analyze():
+    """
+    Sentiment and keywords for every document (or the comma-separated
+    doc_ids) not analyzed yet, as a background job: poll /jobs/<job_id>.
+    method "local" extracts keywords only, without any LLM call.
+    """
+    method = request.form.get("method", "llm")
+    if method not in ANALYSIS_METHODS:
+        return jsonify({"error": f"method must be one of {', '.join(ANALYSIS_METHODS)}"}), 400
+    doc_ids = None
+    if request.form.get("doc_ids"):
+        try:
+            doc_ids = [int(i) for i in request.form["doc_ids"].split(",") if i.strip()]
+        except ValueError:
+            return jsonify({"error": "doc_ids must be comma-separated integers"}), 400
+    if not database.get_document_ids():
+        return jsonify({"error": "No documents in DB."})
+
+    return jsonify({"job_id": start_analysis(doc_ids, method)})
 
-        summaries.append({"id": doc_id, "source": src, "summary": new})
 
-    return jsonify({"summaries": summaries})
+@app.route("/analysis/<int:doc_id>")
+def document_analysis(doc_id):
+    """Stored sentiment, keywords and statistics of one document."""
+    analysis = get_document_analysis(doc_id)
+    if analysis is None:
+        return jsonify({"error": "Unknown document."}), 404
+    return jsonify(analysis)
 
 
 @app.route("/visualize")
 def visualize():
-    docs = database.get_all_documents()
-    data = []
-    for (doc_id, t, src, raw, sumry) in docs:
-        data.append({
-            "id": doc_id,
-            "source": src,
-            "type": t,
-            "length": len(raw or ""),
-            "summary_length": len(sumry or "") if sumry else 0,
-        })
-    return render_template("visualize.html", data=data)
+    page, page_size, offset = _page_args(default_size=100)
+    rows = database.list_documents(
+        offset=offset,
+        limit=page_size,
+        columns=("id", "source_type", "path_or_url", "char_length", "summary_length"),
+    )
+    data = [
+        {
+            "id": row["id"],
+            "source": row["path_or_url"],
+            "type": row["source_type"],
+            "length": row["char_length"] or 0,
+            "summary_length": row["summary_length"] or 0,
+        }
+        for row in rows
+    ]
+    total = database.count_documents()
+    return render_template("visualize.html", data=data, page=page,
+                           page_size=page_size, total=total)
+
+
+@app.route("/visualize/stats")
+def visualize_stats():
+    """
+    Corpus aggregates for the charts on /visualize. They are maintained
+    as documents change, so this never scans the documents.
+    """
+    return jsonify(database.get_corpus_stats())
+
+
+@app.route("/cache/stats")
+def cache_stats():
+    return jsonify(answer_cache.stats())
 
 
 @app.route("/files/<path:filename>")
@@ -332,4 +641,9 @@ def serve_uploaded_file(filename):
 
 
 if __name__ == "__main__":
+    # The debug reloader runs this file twice; start job workers only in
+    # the process that serves requests
+    if JOB_WORKERS > 0 and os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        from worker import start_workers
+        start_workers(JOB_WORKERS)
     app.run(debug=True)
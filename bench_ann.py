@@ -0,0 +1,79 @@
+"""
+Recall@k vs latency benchmark for the ANN backends in ann_index, measured
+against the exact flat index on a synthetic clustered corpus.
+
+    python bench_ann.py                 # 100k vectors, 384 dims
+    python bench_ann.py 500000 384 10   # n_vectors dim k
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from ann_index import build_index, search_index
+
+N_QUERIES = 200
+
+# (backend, knob name, knob values)
+SWEEPS = [
+    ("ivf_flat", "nprobe", [1, 4, 16, 64]),
+    ("ivf_pq", "nprobe", [1, 4, 16, 64]),
+    ("hnsw", "ef_search", [16, 32, 64, 128]),
+]
+
+
+def make_corpus(n, dim, n_clusters=256, seed=0):
+    """Gaussian blobs, closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim)).astype("float32")
+    labels = rng.integers(0, n_clusters, size=n)
+    vectors = centers[labels] + 0.3 * rng.normal(size=(n, dim)).astype("float32")
+    queries = centers[rng.integers(0, n_clusters, size=N_QUERIES)] + \
+        0.3 * rng.normal(size=(N_QUERIES, dim)).astype("float32")
+    return vectors.astype("float32"), queries.astype("float32")
+
+
+def timed_search(index, queries, k, **knobs):
+    start = time.perf_counter()
+    _, ids = search_index(index, queries, k, **knobs)
+    ms_per_query = (time.perf_counter() - start) * 1000 / len(queries)
+    return ids, ms_per_query
+
+
+def recall_at_k(found, truth):
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 384
+    k = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    print(f"Corpus: {n} vectors x {dim} dims, {N_QUERIES} queries, k={k}\n")
+    vectors, queries = make_corpus(n, dim)
+
+    flat, _ = build_index("flat", vectors)
+    truth, flat_ms = timed_search(flat, queries, k)
+
+    print(f"{'backend':<10} {'knob':<14} {'build s':>8} {'recall@k':>9} {'ms/query':>9}")
+    print("-" * 54)
+    print(f"{'flat':<10} {'-':<14} {'-':>8} {1.0:>9.3f} {flat_ms:>9.3f}")
+
+    for backend, knob, values in SWEEPS:
+        start = time.perf_counter()
+        index, resolved = build_index(backend, vectors)
+        build_s = time.perf_counter() - start
+        if resolved != backend:
+            print(f"{backend:<10} skipped (fell back to {resolved}; corpus too small)")
+            continue
+
+        for value in values:
+            ids, ms = timed_search(index, queries, k, **{knob: value})
+            print(f"{backend:<10} {knob + '=' + str(value):<14} {build_s:>8.1f} "
+                  f"{recall_at_k(ids, truth):>9.3f} {ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
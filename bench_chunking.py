@@ -0,0 +1,91 @@
+"""
+Chunking benchmark: the original line-concatenating chunker vs every
+chunking strategy, on a synthetic multi-MB document, plus a check that
+chunking the same text as 64 KB segments (the streaming path) gives the
+same chunks.
+
+    python bench_chunking.py        # 8 MB document
+    python bench_chunking.py 32     # 32 MB
+"""
+
+import random
+import sys
+import time
+
+import chunking
+
+WORDS = ("retrieval", "augmented", "generation", "index", "vector", "query",
+         "document", "chunk", "embedding", "answer", "model", "latency")
+
+
+def make_document(megabytes, seed=0):
+    """Markdown-ish text: headings, paragraphs of sentences, a few long lines."""
+    rng = random.Random(seed)
+    parts, size, n = [], 0, 0
+    while size < megabytes * 1_000_000:
+        if n % 40 == 0:
+            block = f"{'#' * rng.randint(1, 3)} Section {n}\n"
+        elif n % 97 == 0:
+            block = " ".join(rng.choice(WORDS) for _ in range(400)) + "\n"
+        else:
+            sentences = (" ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 20))).capitalize()
+                         + rng.choice(".!?") for _ in range(rng.randint(2, 6)))
+            block = " ".join(sentences) + "\n\n"
+        parts.append(block)
+        size += len(block)
+        n += 1
+    return "".join(parts)
+
+
+def old_chunk_text(text, max_chars=500):
+    """The chunker VectorStore used before chunking.py, for comparison."""
+    chunks = []
+    current = ""
+    for line in text.split("\n"):
+        if len(current) + len(line) < max_chars:
+            current += line + "\n"
+        else:
+            chunks.append(current.strip())
+            current = line + "\n"
+    if current.strip():
+        chunks.append(current.strip())
+    return chunks
+
+
+def segments_of(text, size=64 * 1024):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 8
+    text = make_document(megabytes)
+    mb = len(text) / 1_000_000
+    print(f"Document: {mb:.1f} MB\n")
+
+    print(f"{'chunker':<22} {'chunks':>8} {'max len':>8} {'empty':>6} {'s':>7} {'MB/s':>7} {'stream':>7}")
+    print("-" * 71)
+
+    chunks, secs = timed(lambda: old_chunk_text(text))
+    print(f"{'old (lines)':<22} {len(chunks):>8} {max(map(len, chunks)):>8} "
+          f"{sum(1 for c in chunks if not c):>6} {secs:>7.2f} {mb / secs:>7.1f} {'-':>7}")
+
+    configs = [("lines", {}), ("lines overlap=100", {"overlap": 100}),
+               ("tokens", {}), ("tokens overlap=32", {"overlap": 32}),
+               ("sentences", {}), ("markdown", {})]
+    for label, extra in configs:
+        options = {"strategy": label.split()[0], **extra}
+        chunks, secs = timed(lambda: chunking.chunk_text(text, **options))
+        streamed = list(chunking.iter_chunks(segments_of(text), **options))
+        print(f"{label:<22} {len(chunks):>8} {max(len(c.text) for c in chunks):>8} "
+              f"{sum(1 for c in chunks if not c.text):>6} {secs:>7.2f} {mb / secs:>7.1f} "
+              f"{'same' if streamed == chunks else 'DIFF':>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Micro-benchmark: per-call sqlite3.connect() (the old database.py
+behaviour) vs the pooled WAL connections and the bulk APIs.
+
+    python bench_db.py          # 2000 documents
+    python bench_db.py 10000
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import database
+
+TEXT = "lorem ipsum dolor sit amet " * 40
+
+
+def old_style_add(path, rows):
+    """One fresh connection and one commit per insert, default pragmas."""
+    for row in rows:
+        conn = sqlite3.connect(path)
+        with conn:
+            conn.execute(
+                "INSERT INTO documents (source_type, path_or_url, raw_text, summary) "
+                "VALUES (?, ?, ?, ?)",
+                row,
+            )
+        conn.close()
+
+
+def old_style_update(path, items):
+    for doc_id, summary in items:
+        conn = sqlite3.connect(path)
+        with conn:
+            conn.execute("UPDATE documents SET summary = ? WHERE id = ?", (summary, doc_id))
+        conn.close()
+
+
+def fresh_db(directory, name):
+    database.DB_PATH = os.path.join(directory, name)
+    database.init_db()
+    return database.DB_PATH
+
+
+def timed(label, n, fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<38} {elapsed:>8.3f} s  {n / elapsed:>10.0f} ops/s")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rows = [("file", f"doc-{i}.txt", TEXT, None) for i in range(n)]
+    updates = [(i + 1, f"summary {i}") for i in range(n)]
+
+    print(f"{n} documents\n")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = fresh_db(tmp, "old.db")
+        database.get_pool().close_all()
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.close()
+        timed("insert: connect per call", n, old_style_add, path, rows)
+        timed("update: connect per call", n, old_style_update, path, updates)
+
+        fresh_db(tmp, "pooled.db")
+        timed("insert: pooled add_document", n,
+              lambda: [database.add_document(*r) for r in rows])
+        timed("update: pooled update_summary", n,
+              lambda: [database.update_summary(*u) for u in updates])
+
+        fresh_db(tmp, "bulk.db")
+        timed("insert: add_documents_many", n, database.add_documents_many, rows)
+        timed("update: update_summaries_many", n, database.update_summaries_many, updates)
+
+        for pool in database._pools.values():
+            pool.close_all()
+
+
+if __name__ == "__main__":
+    main()
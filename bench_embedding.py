@@ -0,0 +1,82 @@
+"""
+Embedding throughput benchmark: chunks/sec for each embedding backend, in
+the calling process and over a worker pool, on chunks of a synthetic
+corpus. Also reports the FAISS index size at float32 vs float16 storage
+and how often the fp16 index returns the same top hit.
+
+    python bench_embedding.py              # 2000 chunks, 4 workers
+    python bench_embedding.py 10000 8
+
+Backends whose dependencies are missing are reported and skipped.
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import chunking
+from ann_index import build_index, get_faiss
+from bench_chunking import make_document
+from embedding_service import EmbeddingService
+
+
+def make_chunks(n):
+    chunks = []
+    megabytes = 0.5
+    while len(chunks) < n:
+        chunks = [c.text for c in chunking.chunk_text(make_document(megabytes))]
+        megabytes *= 2
+    return chunks[:n]
+
+
+def bench(service, chunks):
+    service.encode(chunks[:2 * service.batch_size])   # load models / start workers
+    start = time.perf_counter()
+    vectors = service.encode(chunks)
+    return vectors, time.perf_counter() - start
+
+
+def storage_report(vectors):
+    faiss = get_faiss()
+    queries = vectors[::max(1, len(vectors) // 200)]
+    results = {}
+    for dtype in ("float32", "float16"):
+        index, _ = build_index("flat", vectors, vector_dtype=dtype)
+        _, top = index.search(queries, 1)
+        results[dtype] = (len(faiss.serialize_index(index)), top[:, 0])
+    agree = float(np.mean(results["float32"][1] == results["float16"][1]))
+    for dtype, (size, _) in results.items():
+        print(f"{dtype:<8} index {size / 1e6:>8.2f} MB")
+    print(f"fp16 top-1 agreement with fp32: {agree:.1%}")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    chunks = make_chunks(n)
+    print(f"Corpus: {len(chunks)} chunks, avg {sum(map(len, chunks)) / len(chunks):.0f} chars\n")
+
+    print(f"{'backend':<10} {'workers':>8} {'s':>8} {'chunks/s':>10}")
+    print("-" * 40)
+    vectors = None
+    for backend in ("torch", "onnx"):
+        for n_workers in (0, workers):
+            service = EmbeddingService(backend=backend, workers=n_workers)
+            try:
+                result, secs = bench(service, chunks)
+            except Exception as e:
+                print(f"{backend:<10} {n_workers:>8} unavailable: {e}")
+                break
+            finally:
+                service.close()
+            vectors = result if vectors is None else vectors
+            print(f"{backend:<10} {n_workers:>8} {secs:>8.2f} {len(chunks) / secs:>10.1f}")
+
+    if vectors is not None:
+        print()
+        storage_report(vectors)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Startup-time benchmark: import each module in a fresh interpreter and
+print how long the import took.
+
+    python bench_startup.py            # project modules
+    python bench_startup.py faiss fitz # any modules you name
+"""
+
+import subprocess
+import sys
+
+DEFAULT_MODULES = [
+    "config",
+    "database",
+    "document_ingestor",
+    "export_utils",
+    "ocr_utils",
+    "rag_qa",
+    "rag_engine",
+    "index_manager",
+    "analysis_utils",
+    "app",
+]
+
+_SNIPPET = (
+    "import time; t = time.perf_counter(); import {name}; "
+    "print(f'{{(time.perf_counter() - t) * 1000:.1f}}')"
+)
+
+
+def time_import(name):
+    """Return import time in ms for module name, or an error string."""
+    proc = subprocess.run(
+        [sys.executable, "-c", _SNIPPET.format(name=name)],
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        last = (proc.stderr.strip().splitlines() or ["failed"])[-1]
+        return None, last
+    return float(proc.stdout.strip().splitlines()[-1]), None
+
+
+def main():
+    modules = sys.argv[1:] or DEFAULT_MODULES
+
+    print(f"{'module':<20} {'import ms':>10}")
+    print("-" * 32)
+    for name in modules:
+        ms, error = time_import(name)
+        if error:
+            print(f"{name:<20} {'ERROR':>10}  {error}")
+        else:
+            print(f"{name:<20} {ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
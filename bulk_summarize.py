@@ -0,0 +1,104 @@
+"""
+Bulk summarization of every document that has no summary yet.
+
+LLM calls run concurrently (SUMMARY_CONCURRENCY threads, further capped by
+the shared LLM client) and summaries are written back in batched
+transactions. The work list is "documents whose summary is empty", so a
+run that crashes part-way simply resumes where it stopped: already
+committed summaries are skipped by the next run.
+
+start_bulk_summarize() queues the run as a "summarize" job for a worker
+process (see jobs.py); only one such job is queued or running at a time.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import database
+from config import SUMMARY_BATCH_SIZE, SUMMARY_CONCURRENCY
+from jobs import JobCancelled, get_job_registry
+from rag_qa import ask_gemini_with_context
+
+# Same truncation /summarize has always used
+SUMMARY_INPUT_CHARS = 8000
+
+# Only one bulk run at a time per process, so two runs never summarize
+# the same docs (across processes the queue runs one job at a time)
+_run_lock = threading.Lock()
+
+
+def summarize_text(text):
+    """Summarize one document body (already truncated)."""
+    prompt = f"Summarize this clearly:\n\n{text}"
+    return ask_gemini_with_context([text], prompt)
+
+
+def run_bulk_summarize(job_id=None, concurrency=None, batch_size=None):
+    """
+    Summarize all unsummarized documents. Returns a list of
+    {"id", "source", "summary"} for the documents summarized in this run.
+    Progress is reported to the job registry when job_id is given.
+    """
+    with _run_lock:
+        return _run(job_id, concurrency or SUMMARY_CONCURRENCY,
+                    batch_size or SUMMARY_BATCH_SIZE)
+
+
+def _run(job_id, concurrency, batch_size):
+    jobs = get_job_registry()
+    todo = database.get_documents_without_summary(SUMMARY_INPUT_CHARS)
+    if job_id:
+        jobs.update(job_id, total=len(todo))
+
+    results = []
+    pending = []
+
+    def flush():
+        database.update_summaries_many([(r["id"], r["summary"]) for r in pending])
+        if job_id:
+            jobs.add_results(job_id, list(pending))
+        results.extend(pending)
+        pending.clear()
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {executor.submit(summarize_text, text): (doc_id, src)
+                       for doc_id, src, text in todo}
+
+            for future in as_completed(futures):
+                doc_id, src = futures[future]
+                try:
+                    summary = future.result()
+                    error = summary if summary.startswith("Error calling Gemini API") else None
+                except Exception as e:
+                    error = str(e)
+
+                # Errors are reported but not stored, so the next run retries them
+                if error:
+                    if job_id:
+                        jobs.add_errors(job_id, [{"id": doc_id, "source": src, "error": error}])
+                else:
+                    pending.append({"id": doc_id, "source": src, "summary": summary})
+                    if len(pending) >= batch_size:
+                        flush()
+
+                if jobs.cancelled(job_id):
+                    # The rest is left for the next run
+                    executor.shutdown(cancel_futures=True)
+                    raise JobCancelled(job_id)
+    finally:
+        # Keep what is already summarized, however the run ends
+        if pending:
+            flush()
+
+    if job_id:
+        jobs.finish(job_id)
+    return results
+
+
+def start_bulk_summarize():
+    """
+    Queue a bulk summarization job and return its id. If one is already
+    queued or running, its id is returned instead.
+    """
+    return get_job_registry().enqueue("summarize", unique=True)
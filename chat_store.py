@@ -0,0 +1,222 @@
+"""
+Per-session chat conversations.
+
+Messages live in SQLite (conversations / chat_messages tables), so every
+worker process sees the same history; each process keeps the recently
+used conversations in an LRU. A cached conversation only holds its
+rolling summary and the messages that summary does not cover yet.
+
+Once those raw messages pass CHAT_HISTORY_TOKENS, the older ones are
+folded into the summary by the LLM in the background, so the history
+sent with each message stays bounded however long the conversation gets.
+"""
+
+import math
+import threading
+import uuid
+from collections import OrderedDict
+
+import database
+from config import CHAT_CACHE_MAX_SESSIONS, CHAT_HISTORY_TOKENS, CHAT_RETENTION_DAYS
+from rag_qa import ask_gemini_with_context
+
+# The rolling summary is cut to this many characters
+SUMMARY_MAX_CHARS = 2000
+
+# Raw messages always kept out of the summary (the last exchange)
+MIN_RAW_MESSAGES = 2
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token)."""
+    return max(1, math.ceil(len(text) / 4))
+
+
+def format_turns(messages):
+    return "\n".join(f"{m['role'].capitalize()}: {m['content']}" for m in messages)
+
+
+def _public(message):
+    return {"id": message["id"], "role": message["role"], "content": message["content"]}
+
+
+class ChatStore:
+    def __init__(self, max_sessions=None, history_tokens=None, retention_days=None):
+        self.max_sessions = max_sessions or CHAT_CACHE_MAX_SESSIONS
+        self.history_tokens = history_tokens or CHAT_HISTORY_TOKENS
+        self.retention_days = retention_days or CHAT_RETENTION_DAYS
+
+        # conversation id -> {"version", "summary", "summarized_upto", "messages"}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._compressing = set()
+
+    def new_conversation_id(self):
+        """Id for a new conversation; idle conversations are pruned here."""
+        database.prune_conversations(self.retention_days)
+        return uuid.uuid4().hex
+
+    def _state(self, conversation_id):
+        """Cached state of a conversation, reloaded if another process changed it."""
+        version = database.get_conversation_version(conversation_id) or 0
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is not None and entry["version"] == version:
+                self._entries.move_to_end(conversation_id)
+                return entry
+
+        conversation = database.get_conversation(conversation_id) or \
+            {"summary": "", "summarized_upto": 0, "version": 0}
+        entry = {
+            "version": conversation["version"],
+            "summary": conversation["summary"],
+            "summarized_upto": conversation["summarized_upto"],
+            "messages": database.get_chat_messages(conversation_id,
+                                                   after_id=conversation["summarized_upto"]),
+        }
+        with self._lock:
+            self._entries[conversation_id] = entry
+            self._entries.move_to_end(conversation_id)
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+        return entry
+
+    # -----------------------------
+    # Reading
+    # -----------------------------
+    def context(self, conversation_id):
+        """
+        (summary, recent messages) to send with the next message. Recent
+        messages are capped at the token budget even while a summary
+        update is still pending.
+        """
+        entry = self._state(conversation_id)
+        recent, tokens = [], 0
+        for message in reversed(entry["messages"]):
+            tokens += message["tokens"]
+            if tokens > self.history_tokens and recent:
+                break
+            recent.append(message)
+        return entry["summary"], recent[::-1]
+
+    def messages(self, conversation_id, after_id=0, last=None):
+        """Visible messages as {"id", "role", "content"}, oldest first."""
+        return [_public(m) for m in
+                database.get_chat_messages(conversation_id, after_id=after_id, last=last)]
+
+    # -----------------------------
+    # Writing
+    # -----------------------------
+    def append(self, conversation_id, user_message, answer):
+        """Store one exchange and return the new messages (the delta)."""
+        rows = [("user", user_message, estimate_tokens(user_message)),
+                ("assistant", answer, estimate_tokens(answer))]
+        ids, version = database.add_chat_messages(conversation_id, rows)
+        new = [{"id": i, "role": role, "content": content, "tokens": tokens}
+               for i, (role, content, tokens) in zip(ids, rows)]
+
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            # Extend in place unless another process wrote in between
+            if entry is not None and entry["version"] + 1 == version:
+                entry["messages"].extend(new)
+                entry["version"] = version
+            else:
+                entry = None
+        if entry is None:
+            entry = self._state(conversation_id)
+
+        if self._raw_tokens(entry) > self.history_tokens:
+            self._schedule_compress(conversation_id)
+        return [_public(m) for m in new]
+
+    def clear(self, conversation_id):
+        database.delete_conversation(conversation_id)
+        with self._lock:
+            self._entries.pop(conversation_id, None)
+
+    def clear_all(self):
+        database.clear_conversations()
+        with self._lock:
+            self._entries.clear()
+
+    # -----------------------------
+    # Summary compression
+    # -----------------------------
+    @staticmethod
+    def _raw_tokens(entry):
+        return sum(m["tokens"] for m in entry["messages"])
+
+    def _schedule_compress(self, conversation_id):
+        with self._lock:
+            if conversation_id in self._compressing:
+                return
+            self._compressing.add(conversation_id)
+
+        def target():
+            try:
+                self.compress(conversation_id)
+            except Exception:
+                pass  # the raw history is still capped by context()
+            finally:
+                with self._lock:
+                    self._compressing.discard(conversation_id)
+
+        threading.Thread(target=target, name=f"chat-summary-{conversation_id[:8]}",
+                         daemon=True).start()
+
+    def compress(self, conversation_id):
+        """
+        Fold the oldest raw messages into the rolling summary until at most
+        half the token budget remains raw. Returns True if it did.
+        """
+        entry = self._state(conversation_id)
+        messages = entry["messages"]
+        if self._raw_tokens(entry) <= self.history_tokens:
+            return False
+
+        remaining = self._raw_tokens(entry)
+        fold = 0
+        while fold < len(messages) - MIN_RAW_MESSAGES and remaining > self.history_tokens // 2:
+            remaining -= messages[fold]["tokens"]
+            fold += 1
+        if not fold:
+            return False
+
+        summary = summarize_turns(entry["summary"], messages[:fold])
+        if summary is None:
+            return False
+
+        database.set_conversation_summary(conversation_id, summary, messages[fold - 1]["id"])
+        with self._lock:
+            self._entries.pop(conversation_id, None)
+        return True
+
+
+def summarize_turns(summary, messages):
+    """New rolling summary from the previous one plus messages, or None on error."""
+    transcript = (f"Summary so far:\n{summary}\n\n" if summary else "") + \
+        f"New turns:\n{format_turns(messages)}"
+    prompt = (
+        "Update the summary of this conversation with the new turns. Keep names, "
+        "facts, decisions and open questions; drop small talk. At most 200 words."
+    )
+    result = ask_gemini_with_context([transcript], prompt)
+    if result.startswith("Error calling Gemini API"):
+        return None
+    return result[:SUMMARY_MAX_CHARS]
+
+
+# ----------------------------------------------------
+# Process-wide instance
+# ----------------------------------------------------
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_chat_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ChatStore()
+        return _store
@@ -0,0 +1,320 @@
+"""
+Chunking engine used to split documents before they are embedded.
+
+Strategies:
+- "lines":     pack whole lines up to max_chars (the original behaviour)
+- "tokens":    fixed windows of max_tokens word/punctuation tokens
+- "sentences": pack whole sentences up to max_chars; blank lines end a sentence
+- "markdown":  like "lines", but every heading starts a new chunk and the
+               chunk remembers its heading path ("Intro > Setup")
+
+Every chunk is an exact slice of the source text: text == raw[start:end],
+so offsets can be used to highlight sources. Overlap repeats the tail of
+the previous chunk (tokens for "tokens", characters otherwise).
+
+Input is an iterable of text segments (see DocumentIngestor.iter_segments)
+scanned once with a small carry-over buffer, so chunking is linear in the
+text length and never needs the whole document in memory. A unit longer
+than max_chars (e.g. a huge line) is split at whitespace instead of
+becoming an oversized chunk, and empty chunks are never produced.
+"""
+
+import re
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from config import CHUNK_MAX_CHARS, CHUNK_MAX_TOKENS, CHUNK_OVERLAP, CHUNK_STRATEGY
+
+STRATEGIES = ("lines", "tokens", "sentences", "markdown")
+
+# A carry-over buffer with no safe split point is force-split at this size
+MAX_CARRY_CHARS = 1 << 20
+
+# Whole line, trimmed of surrounding whitespace
+LINE_RE = re.compile(r"\S(?:[^\n]*\S)?")
+# Word pieces (at most 32 characters) and single punctuation marks
+TOKEN_RE = re.compile(r"\w{1,32}|[^\w\s]")
+# End of a sentence: terminal punctuation (plus closing quotes/brackets)
+# followed by whitespace, or a blank line
+SENTENCE_END_RE = re.compile(r"[.!?]+[\"')\]]*(?=\s)|\n[ \t]*\n")
+HEADING_RE = re.compile(r"(#{1,6})\s+(.*?)[\s#]*$")
+FENCE_RE = re.compile(r"```|~~~")
+
+
+class Chunk(NamedTuple):
+    text: str
+    start: int
+    end: int
+    heading: Optional[str] = None
+
+
+class _Unit(NamedTuple):
+    start: int
+    end: int
+    text: str
+    lead: str                       # text between the previous unit and this one
+    section: Optional[str] = None   # markdown heading path in effect
+    breaks: bool = False            # unit must start a new chunk (headings)
+
+
+# -----------------------------
+# Scanning
+# -----------------------------
+def _newline_cut(buffer):
+    return buffer.rfind("\n") + 1
+
+
+def _space_cut(buffer):
+    i = len(buffer)
+    while i and not buffer[i - 1].isspace():
+        i -= 1
+    return i
+
+
+def _sentence_cut(buffer):
+    # Look for the last sentence end in a growing tail window first
+    window = 4096
+    while True:
+        start = max(0, len(buffer) - window)
+        cut = 0
+        for m in SENTENCE_END_RE.finditer(buffer, start):
+            cut = m.end()
+        if cut or not start:
+            return cut
+        window *= 4
+
+
+def _regex_spans(pattern):
+    def spans(buffer, end):
+        return (m.span() for m in pattern.finditer(buffer, 0, end))
+    return spans
+
+
+def _sentence_spans(buffer, end):
+    """Spans of the trimmed text between sentence ends."""
+    prev = 0
+    for m in SENTENCE_END_RE.finditer(buffer, 0, end):
+        # Punctuation belongs to its sentence, a blank line to neither
+        stop = m.start() if m.group()[0] == "\n" else m.end()
+        piece = buffer[prev:stop]
+        stripped = piece.strip()
+        if stripped:
+            start = prev + len(piece) - len(piece.lstrip())
+            yield start, start + len(stripped)
+        prev = m.end()
+
+    piece = buffer[prev:end]
+    stripped = piece.strip()
+    if stripped:
+        start = prev + len(piece) - len(piece.lstrip())
+        yield start, start + len(stripped)
+
+
+# strategy -> (unit spans in buffer[:end], safe cut point of a buffer)
+SCANNERS = {
+    "lines": (_regex_spans(LINE_RE), _newline_cut),
+    "markdown": (_regex_spans(LINE_RE), _newline_cut),
+    "sentences": (_sentence_spans, _sentence_cut),
+}
+
+
+def _scan(segments, find_spans, find_cut):
+    """
+    Yield (start, end, text, lead) for every unit over the concatenated
+    segments, lead being the text since the previous unit. Units are only
+    looked for up to a safe cut point (find_cut), so the result does not
+    depend on where the segments were split.
+    """
+    buffer = ""
+    base = 0
+    gap = ""      # text after the last unit, carried over from earlier buffers
+    first = True
+
+    def units(end):
+        nonlocal gap, first
+        prev = 0
+        for start, stop in find_spans(buffer, end):
+            lead = "" if first else gap + buffer[prev:start]
+            gap, first, prev = "", False, stop
+            yield base + start, base + stop, buffer[start:stop], lead
+        gap += buffer[prev:end]
+
+    for segment in segments:
+        buffer += segment
+        cut = find_cut(buffer)
+        if cut <= 0:
+            if len(buffer) < MAX_CARRY_CHARS:
+                continue
+            cut = len(buffer)
+        yield from units(cut)
+        buffer = buffer[cut:]
+        base += cut
+
+    yield from units(len(buffer))
+
+
+def _iter_units(segments, strategy):
+    markdown = strategy == "markdown"
+    stack = []          # markdown heading path as (level, title)
+    in_fence = False
+
+    for start, end, text, lead in _scan(segments, *SCANNERS[strategy]):
+        breaks = False
+        if markdown:
+            if FENCE_RE.match(text):
+                in_fence = not in_fence
+            elif not in_fence:
+                m = HEADING_RE.match(text)
+                if m:
+                    level = len(m.group(1))
+                    while stack and stack[-1][0] >= level:
+                        stack.pop()
+                    stack.append((level, m.group(2)))
+                    breaks = True
+        section = " > ".join(title for _, title in stack) if stack else None
+        yield _Unit(start, end, text, lead, section, breaks)
+
+
+def _split_long(units, max_chars):
+    """Split units longer than max_chars, preferring whitespace boundaries."""
+    for unit in units:
+        if len(unit.text) <= max_chars:
+            yield unit
+            continue
+
+        text, pos, lead = unit.text, 0, unit.lead
+        while pos < len(text):
+            end = pos + max_chars
+            if end < len(text):
+                cut = _space_cut(text[pos:end + 1])
+                end = pos + cut if cut > max_chars // 2 else end
+            piece = text[pos:end].rstrip()
+            yield unit._replace(start=unit.start + pos, end=unit.start + pos + len(piece),
+                                text=piece, lead=lead)
+            breaks_after = pos + len(piece)
+            pos = end
+            while pos < len(text) and text[pos].isspace():
+                pos += 1
+            lead = text[breaks_after:pos]
+            unit = unit._replace(breaks=False)
+
+
+# -----------------------------
+# Packing
+# -----------------------------
+def _pack(units, limit, overlap):
+    """Greedily pack consecutive units into chunks of at most limit chars."""
+
+    def size(first, last):
+        return last.end - first.start
+
+    def emit(current):
+        head = current[0]
+        text = head.text + "".join(u.lead + u.text for u in list(current)[1:])
+        return Chunk(text, head.start, current[-1].end, head.section)
+
+    current = deque()
+    for unit in units:
+        if current and (unit.breaks or
+                        size(current[0], unit) > limit):
+            yield emit(current)
+
+            # Carry whole units from the end of the chunk as overlap
+            tail = deque()
+            if overlap and not unit.breaks:
+                last = current[-1]
+                for u in reversed(current):
+                    if size(u, last) > overlap:
+                        break
+                    tail.appendleft(u)
+            current = tail
+            while current and size(current[0], unit) > limit:
+                current.popleft()
+
+        current.append(unit)
+
+    if current:
+        yield emit(current)
+
+
+def _iter_token_chunks(segments, max_tokens, overlap):
+    """
+    "tokens" strategy: windows of max_tokens tokens advancing by
+    max_tokens - overlap. Works on token spans directly (no per-token
+    objects) and only buffers the tokens of the unfinished window.
+    """
+    step = max_tokens - overlap
+    buffer = ""
+    base = 0
+    emitted = 0   # leading tokens of the buffer that were already emitted
+
+    def windows(end, final):
+        nonlocal emitted
+        spans = [m.span() for m in TOKEN_RE.finditer(buffer, 0, end)]
+        i = 0
+        while i < len(spans):
+            stop = min(i + max_tokens, len(spans))
+            if stop - i < max_tokens and not final:
+                break
+            if stop > emitted:
+                start, last = spans[i][0], spans[stop - 1][1]
+                yield Chunk(buffer[start:last], base + start, base + last)
+                emitted = stop
+            if stop == len(spans) and final:
+                i = len(spans)
+                break
+            i += step
+
+        # The buffer restarts at the first unfinished window
+        keep = spans[i][0] if i < len(spans) else end
+        emitted = max(0, emitted - i)
+        return keep
+
+    for segment in segments:
+        buffer += segment
+        cut = _space_cut(buffer)
+        if cut <= 0:
+            if len(buffer) < MAX_CARRY_CHARS:
+                continue
+            cut = len(buffer)
+        keep = yield from windows(cut, final=False)
+        buffer = buffer[keep:]
+        base += keep
+
+    yield from windows(len(buffer), final=True)
+
+
+# -----------------------------
+# Public API
+# -----------------------------
+def resolve_options(strategy=None, max_chars=None, max_tokens=None, overlap=None) -> Dict:
+    """Fill in config defaults and validate; the result identifies a chunking."""
+    options = {
+        "strategy": strategy or CHUNK_STRATEGY,
+        "max_chars": max_chars or CHUNK_MAX_CHARS,
+        "max_tokens": max_tokens or CHUNK_MAX_TOKENS,
+        "overlap": CHUNK_OVERLAP if overlap is None else overlap,
+    }
+    if options["strategy"] not in STRATEGIES:
+        raise ValueError(f"Unknown chunking strategy: {options['strategy']}")
+
+    limit = options["max_tokens"] if options["strategy"] == "tokens" else options["max_chars"]
+    if not 0 <= options["overlap"] < limit:
+        raise ValueError("Chunk overlap must be smaller than the chunk size.")
+    return options
+
+
+def iter_chunks(segments: Iterable[str], strategy=None, max_chars=None,
+                max_tokens=None, overlap=None) -> Iterator[Chunk]:
+    """Chunk the concatenation of segments, yielding Chunks in order."""
+    options = resolve_options(strategy, max_chars, max_tokens, overlap)
+    if options["strategy"] == "tokens":
+        return _iter_token_chunks(segments, options["max_tokens"], options["overlap"])
+
+    units = _split_long(_iter_units(segments, options["strategy"]), options["max_chars"])
+    return _pack(units, options["max_chars"], options["overlap"])
+
+
+def chunk_text(text: str, **options) -> List[Chunk]:
+    """Chunk a single string (see iter_chunks for the options)."""
+    return list(iter_chunks([text], **options))
@@ -5,3 +5,125 @@ load_dotenv()
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
 GEMINI_MODEL = "gemini-2.5-flash"   # or gemini-1.5-flash
+
+# Sentence-transformers model used for chunk embeddings. Cached vectors are
+# keyed by this name, so changing it invalidates the embedding cache.
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+# Embedding service (embedding_service.py): backend "torch" or "onnx" (the
+# model's int8-quantized ONNX export, needs sentence-transformers[onnx]),
+# encode batch size and worker processes for bulk encoding (0 = encode in
+# the web process). Changing the backend invalidates the embedding cache.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "0"))
+
+# Storage precision of cached embeddings and FAISS vectors: "float32" or
+# "float16" (half the memory, tiny recall loss). Changing it re-indexes.
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float32")
+
+# Chunking (see chunking.py): strategy is "lines", "tokens", "sentences" or
+# "markdown". CHUNK_OVERLAP is counted in tokens for "tokens" and in
+# characters for the other strategies. Changing any of these re-indexes.
+CHUNK_STRATEGY = os.getenv("CHUNK_STRATEGY", "lines")
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "500"))
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "128"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "0"))
+
+# FAISS backend: "auto" (picked by corpus size), "flat", "ivf_flat",
+# "ivf_pq" or "hnsw", plus the default recall knobs used at query time.
+INDEX_TYPE = os.getenv("INDEX_TYPE", "auto")
+INDEX_NPROBE = int(os.getenv("INDEX_NPROBE", "16"))
+INDEX_EF_SEARCH = int(os.getenv("INDEX_EF_SEARCH", "64"))
+# Memory-map the saved index and chunk table so every worker process
+# shares one page-cache copy instead of holding its own.
+INDEX_MMAP = os.getenv("INDEX_MMAP", "1") == "1"
+
+# Retrieval: "dense" (FAISS), "keyword" (BM25 over chunk_fts) or "hybrid"
+# (both, fused with "rrf" reciprocal-rank fusion or "weighted" min-max
+# normalized scores, where HYBRID_DENSE_WEIGHT is the dense share).
+SEARCH_MODE = os.getenv("SEARCH_MODE", "hybrid")
+HYBRID_FUSION = os.getenv("HYBRID_FUSION", "rrf")
+HYBRID_DENSE_WEIGHT = float(os.getenv("HYBRID_DENSE_WEIGHT", "0.5"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Dense hits with a cosine similarity below this are not sent to the LLM
+# (0 disables the cutoff). Keyword matches are kept in hybrid mode.
+MIN_SIMILARITY = float(os.getenv("MIN_SIMILARITY", "0.2"))
+
+# Second retrieval stage (see rag_engine.retrieve): RERANK_CANDIDATES hits
+# are re-ordered by RERANKER ("none", "mmr" or "cross_encoder") within
+# RERANK_BUDGET_MS per query, else the plain search order is kept.
+RERANKER = os.getenv("RERANKER", "mmr")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "250"))
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+
+# PDF OCR: render resolution, grayscale rendering and number of OCR
+# processes (0 = one per CPU core).
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+OCR_GRAYSCALE = os.getenv("OCR_GRAYSCALE", "1") == "1"
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0"))
+
+# Shared LLM client (llm_client.py): optional HTTP backend URL (used by
+# tests with a local fake server), in-flight request cap and retry count.
+LLM_BACKEND_URL = os.getenv("LLM_BACKEND_URL", "")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+
+# /ask answer cache: LRU size, time-to-live and the cosine similarity
+# above which a near-duplicate question reuses a cached answer.
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1024"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+# Chat (chat_store.py): conversations cached per process (LRU; the rest are
+# loaded from SQLite), estimated tokens of raw history sent with each
+# message before older turns are folded into a rolling summary, and days
+# an idle conversation is kept.
+CHAT_CACHE_MAX_SESSIONS = int(os.getenv("CHAT_CACHE_MAX_SESSIONS", "256"))
+CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "1500"))
+CHAT_RETENTION_DAYS = float(os.getenv("CHAT_RETENTION_DAYS", "30"))
+
+# HTML parsing for URLs and crawled pages: "auto" (lxml when installed,
+# else the pure-Python "html.parser"), "lxml" or "html.parser".
+HTML_PARSER = os.getenv("HTML_PARSER", "auto")
+
+# Site crawler (crawler.py): page and link-depth limits per crawl, parallel
+# fetches overall and per host, robots.txt handling, the User-Agent sent,
+# and whether navigation / footers / sidebars are stripped before chunking.
+# Stored pages are indexed (and the index saved) CRAWL_INDEX_BATCH at a time.
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "200"))
+CRAWL_MAX_DEPTH = int(os.getenv("CRAWL_MAX_DEPTH", "3"))
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "8"))
+CRAWL_PER_HOST = int(os.getenv("CRAWL_PER_HOST", "2"))
+CRAWL_RESPECT_ROBOTS = os.getenv("CRAWL_RESPECT_ROBOTS", "1") == "1"
+CRAWL_USER_AGENT = os.getenv("CRAWL_USER_AGENT", "LLM-Agent-Crawler/1.0")
+CRAWL_STRIP_BOILERPLATE = os.getenv("CRAWL_STRIP_BOILERPLATE", "1") == "1"
+CRAWL_INDEX_BATCH = int(os.getenv("CRAWL_INDEX_BATCH", "50"))
+
+# Background jobs (jobs.py / worker.py): worker processes app.py starts
+# itself (0 = run "python worker.py" separately), attempts per job before
+# it fails, first retry delay (doubled per attempt), seconds a worker's
+# claim on a job lasts without renewal, and queue poll interval.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "5"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+
+# Bulk summarization: parallel LLM calls and summaries per DB transaction.
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "8"))
+SUMMARY_BATCH_SIZE = int(os.getenv("SUMMARY_BATCH_SIZE", "20"))
+
+# Document analysis (analysis_utils.py): documents up to
+# ANALYSIS_SHORT_CHARS are packed into one LLM call, at most
+# ANALYSIS_BATCH_SIZE of them and ANALYSIS_BATCH_CHARS in total; parallel
+# LLM calls per analysis job.
+ANALYSIS_SHORT_CHARS = int(os.getenv("ANALYSIS_SHORT_CHARS", "1500"))
+ANALYSIS_BATCH_SIZE = int(os.getenv("ANALYSIS_BATCH_SIZE", "10"))
+ANALYSIS_BATCH_CHARS = int(os.getenv("ANALYSIS_BATCH_CHARS", "12000"))
+ANALYSIS_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY", "4"))
@@ -0,0 +1,316 @@
+"""
+Site crawler: ingest whole documentation sites (or a list of URLs).
+
+Starting from one or more seed URLs, pages are fetched breadth-first over
+a pooled requests.Session by CRAWL_CONCURRENCY threads, at most
+CRAWL_PER_HOST at a time per host. Links are followed up to
+CRAWL_MAX_DEPTH hops while they stay on the seed's host and under its
+directory; robots.txt (including Crawl-delay) is honoured per host. It
+is fetched by the pool threads too; a host's links wait until it is in.
+
+Each page goes through the same dedup path as /fetch_url (see
+ingest_dedup): known pages are fetched with If-None-Match /
+If-Modified-Since and only re-ingested when their bytes changed. The
+links of every parsed page are stored, so a 304 page is still expanded.
+Navigation, headers, footers and sidebars are stripped before chunking.
+Stored pages are indexed CRAWL_INDEX_BATCH at a time rather than one
+index update and save per page.
+"""
+
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urldefrag, urljoin, urlsplit
+from urllib.robotparser import RobotFileParser
+
+import database
+from config import (
+    CRAWL_CONCURRENCY,
+    CRAWL_INDEX_BATCH,
+    CRAWL_MAX_DEPTH,
+    CRAWL_MAX_PAGES,
+    CRAWL_PER_HOST,
+    CRAWL_RESPECT_ROBOTS,
+    CRAWL_STRIP_BOILERPLATE,
+    CRAWL_USER_AGENT,
+)
+from document_ingestor import get_html_parser, soup_to_text
+from ingest_dedup import FETCH_TIMEOUT, conditional_get, ingest_response, normalize_url
+from jobs import JobCancelled, get_job_registry
+
+# Links to files that are never HTML are not fetched
+SKIP_EXTENSIONS = (".pdf", ".zip", ".gz", ".tar", ".png", ".jpg", ".jpeg", ".gif",
+                   ".svg", ".ico", ".webp", ".css", ".js", ".mp3", ".mp4", ".woff", ".woff2")
+
+
+def make_session(pool_size=CRAWL_CONCURRENCY, user_agent=CRAWL_USER_AGENT):
+    """requests.Session whose connection pool fits pool_size parallel fetches."""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = user_agent
+    return session
+
+
+def extract_links(soup, base_url):
+    """Absolute http(s) links of a parsed page, fragments removed."""
+    base = soup.find("base", href=True)
+    if base is not None:
+        base_url = urljoin(base_url, base["href"])
+
+    links = []
+    for anchor in soup.find_all("a", href=True):
+        url = urldefrag(urljoin(base_url, anchor["href"].strip())).url
+        if url.startswith(("http://", "https://")):
+            links.append(url)
+    return links
+
+
+def _origin(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _scope(seed):
+    """(host, path prefix) a seed's crawl stays within."""
+    parts = urlsplit(seed)
+    path = parts.path or "/"
+    return parts.netloc.lower(), path[:path.rfind("/") + 1]
+
+
+class Crawler:
+    def __init__(self, max_pages=None, max_depth=None, concurrency=None, per_host=None,
+                 respect_robots=None, strip_boilerplate=None, session=None, index_batch=None):
+        self.max_pages = max_pages or CRAWL_MAX_PAGES
+        self.max_depth = CRAWL_MAX_DEPTH if max_depth is None else max_depth
+        self.concurrency = concurrency or CRAWL_CONCURRENCY
+        self.per_host = per_host or CRAWL_PER_HOST
+        self.respect_robots = CRAWL_RESPECT_ROBOTS if respect_robots is None else respect_robots
+        self.strip_boilerplate = (CRAWL_STRIP_BOILERPLATE if strip_boilerplate is None
+                                  else strip_boilerplate)
+        self.session = session or make_session(self.concurrency)
+        self.index_batch = index_batch or CRAWL_INDEX_BATCH
+
+        self._robots = {}
+        self._robots_lock = threading.Lock()
+
+    # -----------------------------
+    # robots.txt
+    # -----------------------------
+    def _robots_for(self, url):
+        origin = _origin(url)
+        with self._robots_lock:
+            robots = self._robots.get(origin)
+        if robots is not None:
+            return robots
+
+        robots = RobotFileParser(origin + "/robots.txt")
+        try:
+            response = self.session.get(robots.url, timeout=FETCH_TIMEOUT)
+            if response.status_code in (401, 403):
+                robots.disallow_all = True
+            elif response.status_code >= 400:
+                robots.allow_all = True
+            else:
+                robots.parse(response.text.splitlines())
+        except Exception:
+            robots.allow_all = True
+        with self._robots_lock:
+            self._robots[origin] = robots
+        return robots
+
+    def robots_known(self, url):
+        """True if url's robots.txt is already fetched (allowed() won't block)."""
+        with self._robots_lock:
+            return _origin(url) in self._robots
+
+    def allowed(self, url):
+        if not self.respect_robots:
+            return True
+        return self._robots_for(url).can_fetch(self.session.headers["User-Agent"], url)
+
+    def crawl_delay(self, url):
+        if not self.respect_robots:
+            return 0
+        delay = self._robots_for(url).crawl_delay(self.session.headers["User-Agent"])
+        return float(delay or 0)
+
+    # -----------------------------
+    # One page
+    # -----------------------------
+    def fetch(self, url):
+        """
+        Fetch and ingest one page. Returns (status, doc_id, links), status
+        as in ingest_dedup.ingest_url or "skipped" for non-HTML responses.
+        """
+        key, known, response = conditional_get(url, self.session)
+        if response is None:
+            return "unchanged", known["id"], database.get_page_links(key) or []
+
+        content_type = response.headers.get("Content-Type", "text/html")
+        if "html" not in content_type:
+            return "skipped", None, []
+
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(response.content, get_html_parser())
+        links = extract_links(soup, response.url)
+        database.set_page_links(key, links)
+
+        status, doc_id = ingest_response(
+            url, key, response, to_text=lambda _: soup_to_text(soup, self.strip_boilerplate))
+        return status, doc_id, links
+
+    # -----------------------------
+    # Crawl
+    # -----------------------------
+    def run(self, seeds, job_id=None):
+        """
+        Crawl from the seed URLs. Returns (results, errors): results as
+        {"url", "status", "doc_id", "depth"}, errors as {"url", "error"}.
+        Progress is reported to the job registry when job_id is given.
+        """
+        # Index listeners get the stored pages in batches (see flush)
+        with database.deferred_notifications():
+            results, errors = self._crawl(seeds, job_id)
+        # Only now are the last pages indexed; if that failed, the job fails
+        if job_id:
+            get_job_registry().finish(job_id)
+        return results, errors
+
+    def _crawl(self, seeds, job_id):
+        jobs = get_job_registry() if job_id else None
+        scopes = [_scope(seed) for seed in seeds]
+
+        seen = set()
+        frontier = deque()
+        results, errors = [], []
+        new_results, new_errors = [], []
+        unindexed = 0               # pages stored since the last index update
+
+        in_flight = {}              # future -> (url, depth, host)
+        robots_fetches = {}         # future -> origin whose robots.txt it fetches
+        held = {}                   # origin -> [(url, depth)] waiting for its robots.txt
+        active = Counter()          # host -> fetches in flight
+        next_allowed = {}           # host -> earliest next fetch (Crawl-delay)
+        cancelled = False
+
+        def enqueue(url, depth):
+            key = normalize_url(url)
+            if key in seen or len(seen) >= self.max_pages:
+                return
+            if urlsplit(url).path.lower().endswith(SKIP_EXTENSIONS):
+                return
+            seen.add(key)
+            if self.respect_robots and not self.robots_known(url):
+                # Fetched in the pool so a slow host doesn't stall dispatching
+                origin = _origin(url)
+                if origin not in held:
+                    held[origin] = []
+                    robots_fetches[executor.submit(self._robots_for, url)] = origin
+                held[origin].append((url, depth))
+                return
+            admit(url, depth)
+
+        def admit(url, depth):
+            if not self.allowed(url):
+                new_results.append({"url": url, "status": "disallowed", "doc_id": None,
+                                    "depth": depth})
+                return
+            frontier.append((url, depth))
+
+        def in_scope(url):
+            parts = urlsplit(url)
+            host, path = parts.netloc.lower(), parts.path or "/"
+            return any(host == h and path.startswith(prefix) for h, prefix in scopes)
+
+        def flush():
+            # The rest is indexed when run() leaves deferred_notifications()
+            nonlocal unindexed
+            unindexed += sum(r["status"] in ("added", "updated") for r in new_results)
+            if unindexed >= self.index_batch:
+                database.flush_notifications()
+                unindexed = 0
+            results.extend(new_results)
+            errors.extend(new_errors)
+            if jobs:
+                jobs.update(job_id, total=len(seen))
+                jobs.add_results(job_id, list(new_results))
+                jobs.add_errors(job_id, list(new_errors))
+            new_results.clear()
+            new_errors.clear()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency,
+                                thread_name_prefix="crawl") as executor:
+            for seed in seeds:
+                enqueue(seed, 0)
+            flush()
+
+            while frontier or in_flight or robots_fetches:
+                # Dispatch what the global and per-host limits allow, in order
+                now = time.monotonic()
+                waiting = deque()
+                earliest = None     # when a delayed host may be fetched again
+                while frontier and len(in_flight) < self.concurrency:
+                    url, depth = frontier.popleft()
+                    host = urlsplit(url).netloc.lower()
+                    if active[host] >= self.per_host or next_allowed.get(host, 0) > now:
+                        waiting.append((url, depth))
+                        if next_allowed.get(host, 0) > now:
+                            earliest = min(earliest or next_allowed[host], next_allowed[host])
+                        continue
+                    active[host] += 1
+                    delay = self.crawl_delay(url)
+                    if delay:
+                        next_allowed[host] = now + delay
+                    in_flight[executor.submit(self.fetch, url)] = (url, depth, host)
+                frontier.extendleft(reversed(waiting))
+
+                timeout = None if earliest is None else max(0.0, earliest - time.monotonic())
+                if not in_flight and not robots_fetches:
+                    # Everything left is waiting for a host's Crawl-delay
+                    time.sleep(timeout or 0)
+                    continue
+                done, _ = wait([*in_flight, *robots_fetches], timeout=timeout,
+                               return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    if future in robots_fetches:
+                        for url, depth in held.pop(robots_fetches.pop(future)):
+                            if not cancelled:
+                                admit(url, depth)
+                        continue
+                    url, depth, host = in_flight.pop(future)
+                    active[host] -= 1
+                    try:
+                        status, doc_id, links = future.result()
+                    except Exception as e:
+                        new_errors.append({"url": url, "error": str(e)})
+                        continue
+                    new_results.append({"url": url, "status": status, "doc_id": doc_id,
+                                        "depth": depth})
+                    if depth < self.max_depth:
+                        for link in links:
+                            if in_scope(link):
+                                enqueue(link, depth + 1)
+                flush()
+
+                # Stop dispatching; pages already in flight still finish
+                if jobs and not cancelled and jobs.cancelled(job_id):
+                    cancelled = True
+                    frontier.clear()
+
+        if cancelled:
+            raise JobCancelled(job_id)
+        return results, errors
+
+
+def start_crawl(seeds, **options):
+    """Queue a crawl job for a worker process and return its id."""
+    return get_job_registry().enqueue("crawl", {"seeds": list(seeds), "options": options},
+                                      total=len(seeds))
+
@@ -1,16 +1,210 @@
+import codecs
+import hashlib
+import json
+import os
+import queue
+import re
 import sqlite3
-from typing import List, Tuple, Optional
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Tuple, Optional
 
 DB_PATH = "documents.db"
 
+# Connections kept open per database file and process
+POOL_SIZE = 8
 
-def get_connection() -> sqlite3.Connection:
-    """Create a new SQLite connection."""
-    return sqlite3.connect(DB_PATH)
+# Bytes read per step when streaming a document's raw_text
+TEXT_BLOCK_BYTES = 1 << 20
+
+# Set by init_db(): whether the chunk_fts keyword index could be created
+FTS5_AVAILABLE = False
+
+# Applied to every pooled connection. WAL lets readers run while a writer
+# commits; busy_timeout waits for the writer lock instead of failing with
+# "database is locked".
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -20000",          # ~20 MB page cache
+    "PRAGMA mmap_size = 268435456",        # 256 MB memory-mapped I/O
+)
+
+# Callbacks fired after documents change: callback(event, doc_id)
+# where event is "add", "update", "delete" or "clear" (doc_id is None for
+# "clear"), or "add_many" / "update_many" with a list of doc ids as the
+# second argument.
+_change_listeners: List[Callable[[str, Optional[int]], None]] = []
+
+# Events held back by deferred_notifications(), and how deeply it is nested
+_deferred_events: List[Tuple[str, object]] = []
+_defer_depth = 0
+_defer_lock = threading.Lock()
+
+
+def add_change_listener(callback: Callable[[str, Optional[int]], None]) -> None:
+    """Register a callback that runs after add/delete/clear."""
+    if callback not in _change_listeners:
+        _change_listeners.append(callback)
+
+
+def remove_change_listener(callback: Callable[[str, Optional[int]], None]) -> None:
+    """Unregister a callback previously passed to add_change_listener."""
+    if callback in _change_listeners:
+        _change_listeners.remove(callback)
+
+
+def _notify(event: str, doc_id=None) -> None:
+    with _defer_lock:
+        if _defer_depth:
+            _deferred_events.append((event, doc_id))
+            return
+    for callback in list(_change_listeners):
+        callback(event, doc_id)
+
+
+@contextmanager
+def deferred_notifications() -> Iterator[None]:
+    """
+    Hold back change notifications from every thread of this process until
+    the block exits (or flush_notifications() is called), then deliver them
+    coalesced: the adds and updates between two deletes / clears become one
+    "add_many" and one "update_many", so listeners index them in one go.
+    """
+    global _defer_depth
+    with _defer_lock:
+        _defer_depth += 1
+    try:
+        yield
+    finally:
+        with _defer_lock:
+            _defer_depth -= 1
+            last = _defer_depth == 0
+        if last:
+            flush_notifications()
+
+
+def flush_notifications() -> None:
+    """Deliver the notifications held back by deferred_notifications()."""
+    with _defer_lock:
+        events = list(_deferred_events)
+        _deferred_events.clear()
+
+    added, updated = [], []
+
+    def deliver(event, doc_id):
+        for callback in list(_change_listeners):
+            callback(event, doc_id)
+
+    def deliver_batch():
+        if added:
+            deliver("add_many", list(added))
+        if updated:
+            deliver("update_many", list(updated))
+        added.clear()
+        updated.clear()
+
+    for event, doc_id in events:
+        if event in ("add", "add_many"):
+            added.extend(doc_id if event == "add_many" else [doc_id])
+        elif event in ("update", "update_many"):
+            updated.extend(doc_id if event == "update_many" else [doc_id])
+        else:
+            deliver_batch()
+            deliver(event, doc_id)
+    deliver_batch()
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of SQLite connections to one database file.
+
+    Connections are created lazily (up to max_size), configured with
+    PRAGMAS and reused; callers block when all of them are checked out.
+    """
+
+    def __init__(self, path: str, max_size: int = POOL_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self.pid = os.getpid()
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.max_size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+        return self._idle.get()
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def close_all(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Pool for the current DB_PATH, recreated after a fork."""
+    with _pools_lock:
+        pool = _pools.get(DB_PATH)
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[DB_PATH] = ConnectionPool(DB_PATH)
+        return pool
+
+
+@contextmanager
+def get_connection() -> Iterator[sqlite3.Connection]:
+    """
+    Borrow a pooled connection for the duration of a with-block.
+    The transaction is committed on success and rolled back on error.
+    """
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        pool.release(conn)
 
 
 def init_db() -> None:
     """Create the documents table if it does not exist."""
+    global FTS5_AVAILABLE
     with get_connection() as conn:
         cur = conn.cursor()
         cur.execute(
@@ -20,29 +214,632 @@ def init_db() -> None:
                 source_type TEXT,
                 path_or_url TEXT,
                 raw_text TEXT,
-                summary TEXT
+                summary TEXT,
+                char_length INTEGER,
+                word_count INTEGER,
+                line_count INTEGER,
+                summary_length INTEGER,
+                content_hash TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        _migrate_document_stats(cur)
+        _init_corpus_stats(cur)
+        _init_corpus_generation(cur)
+        # Chunk layout of each document: which content hash sits at which
+        # position. Used to find embeddings that can be reused on rebuild.
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                doc_id INTEGER NOT NULL,
+                chunk_id INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                heading TEXT,
+                PRIMARY KEY (doc_id, chunk_id)
+            )
+            """
+        )
+        cur.execute("PRAGMA table_info(chunks)")
+        if "heading" not in {row[1] for row in cur.fetchall()}:
+            cur.execute("ALTER TABLE chunks ADD COLUMN heading TEXT")
+        # Content-addressed embedding cache: one float32 vector per
+        # (embedding model, chunk sha256). Switching models simply misses.
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunk_embeddings (
+                model TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, sha256)
+            )
+            """
+        )
+        # Chat conversations (one per browser session) and their messages.
+        # Messages up to summarized_upto are folded into summary; version
+        # changes on every write so per-process caches can tell they are stale.
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS conversations (
+                id TEXT PRIMARY KEY,
+                summary TEXT NOT NULL DEFAULT '',
+                summarized_upto INTEGER NOT NULL DEFAULT 0,
+                version INTEGER NOT NULL DEFAULT 0,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chat_messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                tokens INTEGER NOT NULL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_chat_messages_conversation "
+                    "ON chat_messages (conversation_id, id)")
+        # Outgoing links of crawled pages by normalized URL, so a page that
+        # answers 304 Not Modified can still be expanded by the crawler.
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS page_links (
+                source_key TEXT PRIMARY KEY,
+                links TEXT NOT NULL
+            )
+            """
+        )
+        # Durable background job queue (jobs.py / worker.py) and the
+        # results / errors each job reports.
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL DEFAULT '{}',
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL DEFAULT 1,
+                total INTEGER NOT NULL DEFAULT 0,
+                done INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                lease_until REAL,
+                run_after REAL NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+            """
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queue "
+                    "ON jobs (status, priority DESC, created_at)")
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS job_results (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL,
+                is_error INTEGER NOT NULL,
+                data TEXT NOT NULL
             )
             """
         )
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_job_results_job ON job_results (job_id, id)")
+        # Sentiment / keywords per distinct document text and analysis
+        # method (analysis_utils.py), so identical texts share one analysis
+        # and edited ones get a new one
+        _init_document_analysis(cur)
+        # BM25 keyword index over the indexed chunks (rowid = FAISS vector
+        # id), maintained by IndexManager. Needs SQLite built with FTS5.
+        try:
+            cur.execute("CREATE VIRTUAL TABLE IF NOT EXISTS chunk_fts USING fts5(text)")
+            # Per-term chunk counts of chunk_fts (IDF for local keywords)
+            cur.execute("CREATE VIRTUAL TABLE IF NOT EXISTS chunk_vocab "
+                        "USING fts5vocab(chunk_fts, 'row')")
+            FTS5_AVAILABLE = True
+        except sqlite3.OperationalError:
+            FTS5_AVAILABLE = False
+        conn.commit()
+
+
+# ----------------------------------------------------
+# Precomputed per-document metadata
+# ----------------------------------------------------
+STATS_COLUMNS = {
+    "char_length": "INTEGER",
+    "word_count": "INTEGER",
+    "line_count": "INTEGER",
+    "summary_length": "INTEGER",
+    "content_hash": "TEXT",
+    "created_at": "TEXT",
+}
+
+# Where a document came from, used to skip duplicate ingests (ingest_dedup.py)
+SOURCE_COLUMNS = {
+    "source_key": "TEXT",       # normalized URL, or the upload path
+    "source_hash": "TEXT",      # sha256 of the uploaded / fetched bytes
+    "etag": "TEXT",             # HTTP validators of the last fetch
+    "last_modified": "TEXT",
+}
+
+# Columns list_documents() may select / sort by. raw_text is deliberately
+# absent: listing pages must never load document bodies.
+LIST_COLUMNS = (
+    "id", "source_type", "path_or_url", "summary",
+    "char_length", "word_count", "line_count", "summary_length",
+    "content_hash", "created_at",
+)
+DEFAULT_LIST_COLUMNS = (
+    "id", "source_type", "path_or_url", "char_length", "summary_length", "created_at",
+)
+
+_WORD_RE = re.compile(r"\S+")
+_BACKFILL_BATCH = 200
+
+
+def content_hash(raw_text: Optional[str]) -> str:
+    """sha256 hex digest of a document body (the content_hash column)."""
+    return hashlib.sha256((raw_text or "").encode("utf-8")).hexdigest()
+
+
+def document_stats(raw_text: Optional[str]) -> Tuple[int, int, int, str]:
+    """(char_length, word_count, line_count, content_hash) of a document body."""
+    raw_text = raw_text or ""
+    return (
+        len(raw_text),
+        sum(1 for _ in _WORD_RE.finditer(raw_text)),
+        raw_text.count("\n") + 1,
+        content_hash(raw_text),
+    )
+
+
+class TextFile(NamedTuple):
+    """
+    A document body spooled to a UTF-8 file (see spool_text), with its
+    document_stats. Accepted wherever a raw_text string is.
+    """
+    path: str
+    byte_length: int
+    char_length: int
+    word_count: int
+    line_count: int
+    content_hash: str
+
+
+def spool_text(segments: Iterable[str], path: str) -> TextFile:
+    """
+    Write text segments to path as UTF-8 and return it as a TextFile. The
+    stats are computed on the way, so only one segment is held in memory.
+    """
+    digest = hashlib.sha256()
+    byte_length = char_length = word_count = newlines = 0
+    in_word = False
+    with open(path, "wb") as out:
+        for segment in segments:
+            if not segment:
+                continue
+            data = segment.encode("utf-8")
+            out.write(data)
+            digest.update(data)
+            byte_length += len(data)
+            char_length += len(segment)
+            newlines += segment.count("\n")
+            word_count += sum(1 for _ in _WORD_RE.finditer(segment))
+            if in_word and not segment[0].isspace():
+                word_count -= 1     # the word runs on from the previous segment
+            in_word = not segment[-1].isspace()
+    return TextFile(path, byte_length, char_length, word_count, newlines + 1,
+                    digest.hexdigest())
+
+
+def _text_stats(raw_text) -> Tuple[int, int, int, str]:
+    if isinstance(raw_text, TextFile):
+        return raw_text[2:]
+    return document_stats(raw_text)
+
+
+def _write_text_file(conn: sqlite3.Connection, doc_id: int, text_file: TextFile) -> None:
+    """
+    Copy a spooled body into documents.raw_text in TEXT_BLOCK_BYTES
+    blocks: the value is allocated at its final size, then filled through
+    incremental blob I/O, so the text is never materialized in Python.
+    """
+    cur = conn.cursor()
+    if not hasattr(conn, "blobopen"):  # Python < 3.11
+        with open(text_file.path, encoding="utf-8") as f:
+            cur.execute("UPDATE documents SET raw_text = ? WHERE id = ?", (f.read(), doc_id))
+        return
+
+    cur.execute("UPDATE documents SET raw_text = CAST(zeroblob(?) AS TEXT) WHERE id = ?",
+                (text_file.byte_length, doc_id))
+    with conn.blobopen("documents", "raw_text", doc_id) as blob, \
+            open(text_file.path, "rb") as f:
+        for block in iter(lambda: f.read(TEXT_BLOCK_BYTES), b""):
+            blob.write(block)
+
+
+def _migrate_document_stats(cur: sqlite3.Cursor) -> None:
+    """Add the metadata columns to older databases and backfill them."""
+    cur.execute("PRAGMA table_info(documents)")
+    existing = {row[1] for row in cur.fetchall()}
+    for column, sql_type in {**STATS_COLUMNS, **SOURCE_COLUMNS}.items():
+        if column not in existing:
+            cur.execute(f"ALTER TABLE documents ADD COLUMN {column} {sql_type}")
+    for column in ("content_hash", "source_key", "source_hash"):
+        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_documents_{column} "
+                    f"ON documents ({column})")
+
+    cur.execute("UPDATE documents SET created_at = CURRENT_TIMESTAMP "
+                "WHERE created_at IS NULL")
+    cur.execute("UPDATE documents SET summary_length = length(coalesce(summary, '')) "
+                "WHERE summary_length IS NULL")
+
+    # Bodies are read one small batch at a time
+    while True:
+        cur.execute("SELECT id, raw_text FROM documents WHERE char_length IS NULL "
+                    "LIMIT ?", (_BACKFILL_BATCH,))
+        rows = cur.fetchall()
+        if not rows:
+            break
+        cur.executemany(
+            "UPDATE documents SET char_length = ?, word_count = ?, line_count = ?, "
+            "content_hash = ? WHERE id = ?",
+            [(*document_stats(raw_text), doc_id) for doc_id, raw_text in rows],
+        )
+
+
+# ----------------------------------------------------
+# Corpus generation
+# ----------------------------------------------------
+# Bumped by triggers whenever a document is added, deleted or gets new
+# text, and by bump_corpus_generation() when a saved index changes. Every
+# process sees it, so per-process caches (answer_cache) key on it.
+_GENERATION_SQL = (
+    "INSERT INTO counters (name, value) VALUES ('corpus_generation', 1) "
+    "ON CONFLICT (name) DO UPDATE SET value = value + 1;"
+)
+
+
+def _init_corpus_generation(cur: sqlite3.Cursor) -> None:
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+        """
+    )
+    cur.execute("CREATE TRIGGER IF NOT EXISTS documents_generation_insert "
+                f"AFTER INSERT ON documents BEGIN {_GENERATION_SQL} END")
+    cur.execute("CREATE TRIGGER IF NOT EXISTS documents_generation_delete "
+                f"AFTER DELETE ON documents BEGIN {_GENERATION_SQL} END")
+    cur.execute("CREATE TRIGGER IF NOT EXISTS documents_generation_update "
+                f"AFTER UPDATE OF raw_text ON documents BEGIN {_GENERATION_SQL} END")
+
+
+_ANALYSIS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS document_analysis (
+        content_hash TEXT NOT NULL,
+        sentiment TEXT,
+        keywords TEXT NOT NULL,
+        method TEXT NOT NULL,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (content_hash, method)
+    )
+"""
+
+
+def _init_document_analysis(cur: sqlite3.Cursor) -> None:
+    """Create the table, or re-key one holding a single analysis per text."""
+    cur.execute("PRAGMA table_info(document_analysis)")
+    keys = {row[1] for row in cur.fetchall() if row[5]}
+    if keys == {"content_hash"}:
+        cur.execute("ALTER TABLE document_analysis RENAME TO document_analysis_old")
+        cur.execute(_ANALYSIS_TABLE_SQL)
+        cur.execute("INSERT INTO document_analysis SELECT content_hash, sentiment, "
+                    "keywords, method, created_at FROM document_analysis_old")
+        cur.execute("DROP TABLE document_analysis_old")
+    else:
+        cur.execute(_ANALYSIS_TABLE_SQL)
+
+
+def get_corpus_generation() -> int:
+    """Current corpus generation (0 for a database never written to)."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT value FROM counters WHERE name = 'corpus_generation'")
+        row = cur.fetchone()
+        return row[0] if row else 0
+
+
+def bump_corpus_generation() -> None:
+    """Start a new corpus generation (e.g. after the search index changed)."""
+    with get_connection() as conn:
+        conn.execute(_GENERATION_SQL)
         conn.commit()
 
 
+# ----------------------------------------------------
+# Corpus-level aggregates
+# ----------------------------------------------------
+# Upper bounds (exclusive) and labels of the document length histogram;
+# longer documents fall in LENGTH_OVERFLOW_BUCKET
+LENGTH_BUCKETS = (
+    (1_000, "<1K"),
+    (10_000, "1K-10K"),
+    (100_000, "10K-100K"),
+    (1_000_000, "100K-1M"),
+)
+LENGTH_OVERFLOW_BUCKET = "1M+"
+
+_LENGTH_LABELS = [label for _, label in LENGTH_BUCKETS] + [LENGTH_OVERFLOW_BUCKET]
+
+# Stored with the aggregates; they are rebuilt when the buckets change
+_CORPUS_STATS_LAYOUT = "|".join(_LENGTH_LABELS)
+
+
+def _length_bucket_sql(length: str) -> str:
+    cases = " ".join(f"WHEN coalesce({length}, 0) < {edge} THEN '{label}'"
+                     for edge, label in LENGTH_BUCKETS)
+    return f"CASE {cases} ELSE '{LENGTH_OVERFLOW_BUCKET}' END"
+
+
+def _corpus_stats_sql(row: str, sign: str) -> str:
+    """Statement adding (sign "") or removing (sign "-") one documents row."""
+    return (
+        "INSERT INTO corpus_stats (metric, bucket, value) VALUES "
+        f"('documents', '', {sign}1), "
+        f"('chars', '', {sign}coalesce({row}.char_length, 0)), "
+        f"('words', '', {sign}coalesce({row}.word_count, 0)), "
+        f"('summarized', '', {sign}(coalesce({row}.summary_length, 0) > 0)), "
+        f"('summary_chars', '', {sign}coalesce({row}.summary_length, 0)), "
+        f"('type', coalesce({row}.source_type, ''), {sign}1), "
+        f"('length', {_length_bucket_sql(row + '.char_length')}, {sign}1) "
+        "ON CONFLICT (metric, bucket) DO UPDATE SET value = value + excluded.value;"
+    )
+
+
+def _init_corpus_stats(cur: sqlite3.Cursor) -> None:
+    """
+    Create the corpus_stats table and the triggers that keep it in step
+    with every insert, update and delete on documents, in the same
+    transaction. Aggregates are only computed from scratch for a database
+    that has none yet (or whose histogram buckets changed).
+    """
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS corpus_stats (
+            metric TEXT NOT NULL,
+            bucket TEXT NOT NULL DEFAULT '',
+            value INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (metric, bucket)
+        )
+        """
+    )
+    for name in ("insert", "update", "delete"):
+        cur.execute(f"DROP TRIGGER IF EXISTS documents_stats_{name}")
+    cur.execute("CREATE TRIGGER documents_stats_insert AFTER INSERT ON documents "
+                f"BEGIN {_corpus_stats_sql('NEW', '')} END")
+    cur.execute("CREATE TRIGGER documents_stats_delete AFTER DELETE ON documents "
+                f"BEGIN {_corpus_stats_sql('OLD', '-')} END")
+    cur.execute("CREATE TRIGGER documents_stats_update AFTER UPDATE OF source_type, "
+                "char_length, word_count, summary_length ON documents "
+                f"BEGIN {_corpus_stats_sql('OLD', '-')} {_corpus_stats_sql('NEW', '')} END")
+
+    cur.execute("SELECT 1 FROM corpus_stats WHERE metric = 'layout' AND bucket = ?",
+                (_CORPUS_STATS_LAYOUT,))
+    if cur.fetchone() is None:
+        _rebuild_corpus_stats(cur)
+
+
+def _rebuild_corpus_stats(cur: sqlite3.Cursor) -> None:
+    """Recompute corpus_stats from the per-document metadata columns."""
+    cur.execute("DELETE FROM corpus_stats")
+    cur.execute(
+        "INSERT INTO corpus_stats (metric, bucket, value) "
+        "SELECT 'documents', '', count(*) FROM documents UNION ALL "
+        "SELECT 'chars', '', coalesce(sum(char_length), 0) FROM documents UNION ALL "
+        "SELECT 'words', '', coalesce(sum(word_count), 0) FROM documents UNION ALL "
+        "SELECT 'summarized', '', count(*) FROM documents WHERE summary_length > 0 UNION ALL "
+        "SELECT 'summary_chars', '', coalesce(sum(summary_length), 0) FROM documents"
+    )
+    cur.execute(
+        "INSERT INTO corpus_stats (metric, bucket, value) "
+        "SELECT 'type', coalesce(source_type, ''), count(*) FROM documents GROUP BY 2"
+    )
+    cur.execute(
+        "INSERT INTO corpus_stats (metric, bucket, value) "
+        f"SELECT 'length', {_length_bucket_sql('char_length')}, count(*) "
+        "FROM documents GROUP BY 2"
+    )
+    cur.execute("INSERT INTO corpus_stats (metric, bucket, value) VALUES ('layout', ?, 1)",
+                (_CORPUS_STATS_LAYOUT,))
+
+
+def get_corpus_stats() -> Dict[str, object]:
+    """
+    Corpus-level aggregates, read from corpus_stats without touching the
+    documents table: totals, document counts per source type, a length
+    histogram (in LENGTH_BUCKETS order) and summary coverage.
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT metric, bucket, value FROM corpus_stats")
+        rows = cur.fetchall()
+
+    totals = {metric: value for metric, bucket, value in rows if bucket == ""}
+    types = {bucket: value for metric, bucket, value in rows if metric == "type" and value}
+    lengths = {bucket: value for metric, bucket, value in rows if metric == "length"}
+
+    documents = totals.get("documents", 0)
+    summarized = totals.get("summarized", 0)
+    return {
+        "documents": documents,
+        "chars": totals.get("chars", 0),
+        "words": totals.get("words", 0),
+        "avg_chars": totals.get("chars", 0) / documents if documents else 0,
+        "types": dict(sorted(types.items(), key=lambda item: (-item[1], item[0]))),
+        "length_histogram": [{"bucket": label, "documents": lengths.get(label, 0)}
+                             for label in _LENGTH_LABELS],
+        "summarized": summarized,
+        "summary_chars": totals.get("summary_chars", 0),
+        "summary_coverage": summarized / documents if documents else 0,
+    }
+
+
+_INSERT_DOCUMENT_SQL = (
+    "INSERT INTO documents (source_type, path_or_url, raw_text, summary, "
+    "char_length, word_count, line_count, summary_length, content_hash, "
+    f"{', '.join(SOURCE_COLUMNS)}, created_at) "
+    f"VALUES ({', '.join('?' * (9 + len(SOURCE_COLUMNS)))}, CURRENT_TIMESTAMP)"
+)
+
+
+def _source_values(source):
+    source = source or {}
+    return tuple(source.get(column) for column in SOURCE_COLUMNS)
+
+
+def _document_row(source_type, path_or_url, raw_text, summary, source=None):
+    char_length, word_count, line_count, text_hash = _text_stats(raw_text)
+    if isinstance(raw_text, TextFile):
+        raw_text = None     # written by _write_text_file after the insert
+    return (source_type, path_or_url, raw_text, summary,
+            char_length, word_count, line_count, len(summary or ""), text_hash,
+            *_source_values(source))
+
+
 def add_document(
     source_type: str,
     path_or_url: str,
     raw_text: str,
-    summary: Optional[str] = None
+    summary: Optional[str] = None,
+    source: Optional[Dict] = None,
 ) -> int:
-    """Insert a new document and return its ID."""
+    """
+    Insert a new document and return its ID. raw_text is a string or a
+    TextFile. source optionally holds the SOURCE_COLUMNS values
+    (source_key, source_hash, etag, last_modified).
+    """
     with get_connection() as conn:
         cur = conn.cursor()
         cur.execute(
-            "INSERT INTO documents (source_type, path_or_url, raw_text, summary) "
-            "VALUES (?, ?, ?, ?)",
-            (source_type, path_or_url, raw_text, summary),
+            _INSERT_DOCUMENT_SQL,
+            _document_row(source_type, path_or_url, raw_text, summary, source),
         )
+        doc_id = cur.lastrowid
+        if isinstance(raw_text, TextFile):
+            _write_text_file(conn, doc_id, raw_text)
         conn.commit()
-        return cur.lastrowid
+    _notify("add", doc_id)
+    return doc_id
+
+
+def add_documents_many(
+    rows: List[Tuple]
+) -> List[int]:
+    """
+    Insert (source_type, path_or_url, raw_text, summary[, source]) rows in
+    a single transaction and return their IDs in order. raw_text is a
+    string or a TextFile.
+    """
+    ids = []
+    with get_connection() as conn:
+        cur = conn.cursor()
+        for row in rows:
+            cur.execute(_INSERT_DOCUMENT_SQL, _document_row(*row))
+            ids.append(cur.lastrowid)
+            if isinstance(row[2], TextFile):
+                _write_text_file(conn, ids[-1], row[2])
+        conn.commit()
+    if ids:
+        _notify("add_many", ids)
+    return ids
+
+
+def update_document(doc_id: int, raw_text: str, source: Optional[Dict] = None) -> None:
+    """
+    Replace a document's text (re-ingest under the same ID); raw_text is
+    a string or a TextFile. Its summary is dropped, since it described
+    the old text.
+    """
+    char_length, word_count, line_count, text_hash = _text_stats(raw_text)
+    text_file = raw_text if isinstance(raw_text, TextFile) else None
+    assignments = ", ".join(f"{column} = ?" for column in SOURCE_COLUMNS)
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "UPDATE documents SET raw_text = ?, summary = NULL, summary_length = 0, "
+            "char_length = ?, word_count = ?, line_count = ?, content_hash = ?, "
+            f"{assignments} WHERE id = ?",
+            (None if text_file else raw_text, char_length, word_count, line_count,
+             text_hash, *_source_values(source), doc_id),
+        )
+        if text_file is not None and cur.rowcount:
+            _write_text_file(conn, doc_id, text_file)
+        conn.commit()
+    _notify("update", doc_id)
+
+
+def update_document_source(doc_id: int, source: Dict) -> None:
+    """Store new source values (e.g. fresh HTTP validators) without touching the text."""
+    columns = [c for c in SOURCE_COLUMNS if c in source]
+    if not columns:
+        return
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"UPDATE documents SET {', '.join(f'{c} = ?' for c in columns)} WHERE id = ?",
+            (*(source[c] for c in columns), doc_id),
+        )
+        conn.commit()
+
+
+_DEDUP_COLUMNS = ("id", "content_hash", *SOURCE_COLUMNS)
+
+
+def find_document(column: str, value: str) -> Optional[Dict]:
+    """
+    The most recent document whose content_hash, source_key or source_hash
+    equals value, as a dict of its id, hash and source columns, or None.
+    """
+    if column not in ("content_hash", "source_key", "source_hash"):
+        raise ValueError(f"Cannot look documents up by {column}")
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"SELECT {', '.join(_DEDUP_COLUMNS)} FROM documents "
+            f"WHERE {column} = ? ORDER BY id DESC LIMIT 1",
+            (value,),
+        )
+        row = cur.fetchone()
+    return dict(zip(_DEDUP_COLUMNS, row)) if row else None
+
+
+def set_page_links(source_key: str, links: List[str]) -> None:
+    """Remember the links found on a crawled page."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("INSERT OR REPLACE INTO page_links (source_key, links) VALUES (?, ?)",
+                    (source_key, json.dumps(links)))
+        conn.commit()
+
+
+def get_page_links(source_key: str) -> Optional[List[str]]:
+    """Links stored for a crawled page, or None if it was never parsed."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT links FROM page_links WHERE source_key = ?", (source_key,))
+        row = cur.fetchone()
+    return json.loads(row[0]) if row else None
 
 
 def get_all_documents() -> List[Tuple[int, str, str, str, Optional[str]]]:
@@ -56,21 +853,193 @@ def get_all_documents() -> List[Tuple[int, str, str, str, Optional[str]]]:
     return rows
 
 
+def get_document(doc_id: int) -> Optional[Tuple[int, str, str, str, Optional[str]]]:
+    """Fetch one document as (id, source_type, path_or_url, raw_text, summary)."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT id, source_type, path_or_url, raw_text, summary "
+            "FROM documents WHERE id = ?",
+            (doc_id,),
+        )
+        return cur.fetchone()
+
+
+def get_document_info(
+    doc_id: int, columns: Tuple[str, ...] = DEFAULT_LIST_COLUMNS
+) -> Optional[Dict[str, object]]:
+    """Metadata columns of one document as a dict (never raw_text), or None."""
+    unknown = [c for c in columns if c not in LIST_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown document columns: {unknown}")
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT {', '.join(columns)} FROM documents WHERE id = ?", (doc_id,))
+        row = cur.fetchone()
+        return dict(zip(columns, row)) if row else None
+
+
+def iter_document_text(doc_id: int, block_bytes: int = TEXT_BLOCK_BYTES) -> Iterator[str]:
+    """
+    Yield a document's raw_text in decoded blocks of about block_bytes,
+    reading it through SQLite incremental blob I/O so the full text is
+    never materialized in Python. Yields nothing for a missing/empty text.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT typeof(raw_text) FROM documents WHERE id = ?", (doc_id,))
+        row = cur.fetchone()
+        if row is None or row[0] != "text":
+            return
+
+        if not hasattr(conn, "blobopen"):  # Python < 3.11
+            cur.execute("SELECT raw_text FROM documents WHERE id = ?", (doc_id,))
+            yield cur.fetchone()[0]
+            return
+
+        with conn.blobopen("documents", "raw_text", doc_id, readonly=True) as blob:
+            for block in iter(lambda: blob.read(block_bytes), b""):
+                text = decoder.decode(block)
+                if text:
+                    yield text
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+
+def list_documents(
+    offset: int = 0,
+    limit: int = 50,
+    columns: Tuple[str, ...] = DEFAULT_LIST_COLUMNS,
+    order_by: str = "id",
+    descending: bool = False,
+) -> List[Dict[str, object]]:
+    """
+    Return one page of documents as dicts holding only the requested
+    metadata columns (never raw_text).
+    """
+    unknown = [c for c in (*columns, order_by) if c not in LIST_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown document columns: {unknown}")
+
+    direction = "DESC" if descending else "ASC"
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"SELECT {', '.join(columns)} FROM documents "
+            f"ORDER BY {order_by} {direction}, id {direction} LIMIT ? OFFSET ?",
+            (limit, offset),
+        )
+        return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+def count_documents() -> int:
+    """Number of stored documents (the maintained count, no table scan)."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT value FROM corpus_stats WHERE metric = 'documents' AND bucket = ''")
+        row = cur.fetchone()
+        return row[0] if row else 0
+
+
+def get_document_ids() -> List[int]:
+    """Return the IDs of all stored documents without loading their text."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM documents ORDER BY id")
+        return [row[0] for row in cur.fetchall()]
+
+
 def update_summary(doc_id: int, summary: str) -> None:
     """Update the summary field for a document."""
     with get_connection() as conn:
         cur = conn.cursor()
-        cur.execute("UPDATE documents SET summary = ? WHERE id = ?",
-                    (summary, doc_id))
+        cur.execute("UPDATE documents SET summary = ?, summary_length = ? WHERE id = ?",
+                    (summary, len(summary or ""), doc_id))
         conn.commit()
 
 
+def update_summaries_many(items: List[Tuple[int, str]]) -> None:
+    """Write several (doc_id, summary) pairs in a single transaction."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.executemany(
+            "UPDATE documents SET summary = ?, summary_length = ? WHERE id = ?",
+            [(summary, len(summary or ""), doc_id) for doc_id, summary in items],
+        )
+        conn.commit()
+
+
+def get_document_summaries() -> List[Tuple[int, str, Optional[str]]]:
+    """Return (id, path_or_url, summary) for all documents, without raw_text."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id, path_or_url, summary FROM documents ORDER BY id")
+        return cur.fetchall()
+
+
+def get_documents_without_summary(
+    max_chars: int = 8000
+) -> List[Tuple[int, str, str]]:
+    """
+    Return (id, path_or_url, first max_chars of raw_text) for every
+    document that has no summary yet. The text is truncated in SQL so
+    full bodies are never loaded.
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT id, path_or_url, substr(coalesce(raw_text, ''), 1, ?) "
+            "FROM documents WHERE summary IS NULL OR trim(summary) = '' "
+            "ORDER BY id",
+            (max_chars,),
+        )
+        return cur.fetchall()
+
+
+def get_documents_without_analysis(
+    methods: Tuple[str, ...], max_chars: int = 3000, doc_ids: Optional[List[int]] = None
+) -> List[Tuple[int, str, str, str]]:
+    """
+    Return (id, path_or_url, content_hash, first max_chars of raw_text)
+    for documents (all, or those in doc_ids) whose text has no stored
+    analysis made by one of methods. The text is truncated in SQL.
+    """
+    sql = (
+        "SELECT d.id, d.path_or_url, d.content_hash, substr(coalesce(d.raw_text, ''), 1, ?) "
+        "FROM documents d LEFT JOIN document_analysis a "
+        f"ON a.content_hash = d.content_hash AND a.method IN ({','.join('?' * len(methods))}) "
+        "WHERE a.content_hash IS NULL"
+    )
+    params = [max_chars, *methods]
+    with get_connection() as conn:
+        cur = conn.cursor()
+        if doc_ids is None:
+            cur.execute(sql + " ORDER BY d.id", params)
+            return cur.fetchall()
+
+        rows = []
+        unique = sorted(set(doc_ids))
+        for start in range(0, len(unique), _SQL_BATCH):
+            batch = unique[start:start + _SQL_BATCH]
+            cur.execute(
+                sql + f" AND d.id IN ({','.join('?' * len(batch))}) ORDER BY d.id",
+                [*params, *batch],
+            )
+            rows.extend(cur.fetchall())
+        return rows
+
+
 def delete_document(doc_id: int) -> None:
     """Delete a single document by ID."""
     with get_connection() as conn:
         cur = conn.cursor()
         cur.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+        cur.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
         conn.commit()
+    _notify("delete", doc_id)
 
 
 def clear_all_documents() -> None:
@@ -78,4 +1047,603 @@ def clear_all_documents() -> None:
     with get_connection() as conn:
         cur = conn.cursor()
         cur.execute("DELETE FROM documents")
+        cur.execute("DELETE FROM chunks")
+        cur.execute("DELETE FROM page_links")
+        cur.execute("DELETE FROM document_analysis")
+        conn.commit()
+    _notify("clear")
+
+
+# ----------------------------------------------------
+# Chunk / embedding cache
+# ----------------------------------------------------
+_SQL_BATCH = 500  # stay well under SQLite's bound-variable limit
+
+
+def set_document_chunks(doc_id: int, hashes: List[str], start: int = 0) -> None:
+    """
+    Replace the chunk layout of a document with the given content hashes.
+    With start > 0 the hashes are appended as chunks start, start + 1, ...
+    (used when a document is embedded batch by batch).
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM chunks WHERE doc_id = ? AND chunk_id >= ?", (doc_id, start))
+        cur.executemany(
+            "INSERT INTO chunks (doc_id, chunk_id, sha256) VALUES (?, ?, ?)",
+            [(doc_id, start + i, h) for i, h in enumerate(hashes)],
+        )
+        conn.commit()
+
+
+def set_chunk_headings(doc_id: int, start: int, headings: List[Optional[str]]) -> None:
+    """Record the markdown heading path of chunks start, start + 1, ..."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.executemany(
+            "UPDATE chunks SET heading = ? WHERE doc_id = ? AND chunk_id = ?",
+            [(h, doc_id, start + i) for i, h in enumerate(headings)],
+        )
+        conn.commit()
+
+
+def get_indexed_chunks(
+    items: List[Tuple[int, int, int, int, int]]
+) -> List[Optional[Tuple[Optional[str], str, Optional[str]]]]:
+    """
+    Return (source, text, heading) for each (vector_id, doc_id, chunk_id,
+    start, end) of an indexed chunk, or None when its document is gone
+    (deleted, its vectors not yet removed by a worker). The text is read
+    from chunk_fts by vector id, or sliced from the document by offsets
+    without FTS5.
+    """
+    results = []
+    with get_connection() as conn:
+        cur = conn.cursor()
+        for vector_id, doc_id, chunk_id, start, end in items:
+            cur.execute(
+                "SELECT d.path_or_url, c.heading FROM documents d "
+                "LEFT JOIN chunks c ON c.doc_id = d.id AND c.chunk_id = ? "
+                "WHERE d.id = ?",
+                (chunk_id, doc_id),
+            )
+            row = cur.fetchone()
+            if row is None:
+                results.append(None)
+                continue
+            source, heading = row
+            if FTS5_AVAILABLE:
+                cur.execute("SELECT text FROM chunk_fts WHERE rowid = ?", (vector_id,))
+            else:
+                cur.execute("SELECT substr(raw_text, ?, ?) FROM documents WHERE id = ?",
+                            (start + 1, end - start, doc_id))
+            row = cur.fetchone()
+            results.append((source, row[0] if row and row[0] is not None else "", heading))
+    return results
+
+
+def get_cached_embeddings(model: str, hashes: List[str]) -> Dict[str, Tuple[int, bytes]]:
+    """Return {sha256: (dim, vector_blob)} for the hashes already embedded by model."""
+    found: Dict[str, Tuple[int, bytes]] = {}
+    unique = list(dict.fromkeys(hashes))
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        for start in range(0, len(unique), _SQL_BATCH):
+            batch = unique[start:start + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            cur.execute(
+                "SELECT sha256, dim, vector FROM chunk_embeddings "
+                f"WHERE model = ? AND sha256 IN ({placeholders})",
+                [model, *batch],
+            )
+            for sha, dim, blob in cur.fetchall():
+                found[sha] = (dim, blob)
+    return found
+
+
+def put_cached_embeddings(model: str, items: List[Tuple[str, int, bytes]]) -> None:
+    """Store (sha256, dim, vector_blob) rows for model."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.executemany(
+            "INSERT OR REPLACE INTO chunk_embeddings (model, sha256, dim, vector) "
+            "VALUES (?, ?, ?, ?)",
+            [(model, sha, dim, blob) for sha, dim, blob in items],
+        )
+        conn.commit()
+
+
+def prune_embedding_cache(keep_model: Optional[str] = None) -> int:
+    """
+    Drop cached vectors no chunk refers to any more, plus every vector of
+    other models when keep_model is given. Returns the number of rows removed.
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        removed = 0
+        if keep_model is not None:
+            cur.execute("DELETE FROM chunk_embeddings WHERE model != ?", (keep_model,))
+            removed += cur.rowcount
+        cur.execute(
+            "DELETE FROM chunk_embeddings WHERE sha256 NOT IN "
+            "(SELECT DISTINCT sha256 FROM chunks)"
+        )
+        removed += cur.rowcount
+        conn.commit()
+    return removed
+
+
+# ----------------------------------------------------
+# Keyword (FTS5 / BM25) index over chunks
+# ----------------------------------------------------
+def put_keyword_chunks(rows: List[Tuple[int, str]]) -> None:
+    """Index (vector_id, chunk text) rows for keyword search."""
+    if not FTS5_AVAILABLE or not rows:
+        return
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.executemany("INSERT INTO chunk_fts (rowid, text) VALUES (?, ?)", rows)
+        conn.commit()
+
+
+def delete_keyword_chunks(first_id: int, last_id: int) -> None:
+    """Remove keyword rows whose vector id lies in [first_id, last_id]."""
+    if not FTS5_AVAILABLE:
+        return
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM chunk_fts WHERE rowid BETWEEN ? AND ?", (first_id, last_id))
+        conn.commit()
+
+
+def clear_keyword_chunks() -> None:
+    if not FTS5_AVAILABLE:
+        return
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM chunk_fts")
+        conn.commit()
+
+
+def search_keyword_chunks(match: str, limit: int) -> List[Tuple[int, float]]:
+    """
+    Run an FTS5 MATCH expression and return up to limit (vector_id, score)
+    pairs, best first. score is the BM25 relevance (higher is better).
+    """
+    if not FTS5_AVAILABLE or not match:
+        return []
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT rowid, -bm25(chunk_fts) AS score FROM chunk_fts "
+            "WHERE chunk_fts MATCH ? ORDER BY bm25(chunk_fts) LIMIT ?",
+            (match, limit),
+        )
+        return cur.fetchall()
+
+
+def get_term_chunk_counts(terms: List[str]) -> Tuple[int, Dict[str, int]]:
+    """
+    (number of indexed chunks, {term: chunks containing it}) from the
+    keyword index, for IDF weights. Terms are lowercase single tokens.
+    """
+    if not FTS5_AVAILABLE or not terms:
+        return 0, {}
+    counts = {}
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT count(*) FROM chunks")
+        total = cur.fetchone()[0]
+        for i in range(0, len(terms), _SQL_BATCH):
+            batch = terms[i:i + _SQL_BATCH]
+            cur.execute(
+                f"SELECT term, doc FROM chunk_vocab WHERE term IN ({','.join('?' * len(batch))})",
+                batch,
+            )
+            counts.update(cur.fetchall())
+    return total, counts
+
+
+# ----------------------------------------------------
+# Document analysis
+# ----------------------------------------------------
+_ANALYSIS_COLUMNS = ("content_hash", "sentiment", "keywords", "method")
+
+
+def get_document_analyses(hashes: List[str], method: Optional[str] = None) -> Dict[str, Dict]:
+    """
+    Stored analyses by content hash: {"sentiment", "keywords", "method"}.
+    Only those made by method when given; otherwise the LLM analysis of a
+    text wins over the local one.
+    """
+    found = {}
+    method_sql, method_params = ("AND method = ? ", [method]) if method else ("", [])
+    with get_connection() as conn:
+        cur = conn.cursor()
+        for i in range(0, len(hashes), _SQL_BATCH):
+            batch = hashes[i:i + _SQL_BATCH]
+            cur.execute(
+                f"SELECT {', '.join(_ANALYSIS_COLUMNS)} FROM document_analysis "
+                f"WHERE content_hash IN ({','.join('?' * len(batch))}) {method_sql}"
+                "ORDER BY method = 'llm'",
+                [*batch, *method_params],
+            )
+            for text_hash, sentiment, keywords, method in cur.fetchall():
+                found[text_hash] = {"sentiment": sentiment, "keywords": json.loads(keywords),
+                                    "method": method}
+    return found
+
+
+def put_document_analyses(items: List[Tuple[str, Optional[str], List[str], str]]) -> None:
+    """Store (content_hash, sentiment, keywords, method) rows in one transaction."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.executemany(
+            "INSERT OR REPLACE INTO document_analysis "
+            "(content_hash, sentiment, keywords, method) VALUES (?, ?, ?, ?)",
+            [(h, sentiment, json.dumps(keywords), method)
+             for h, sentiment, keywords, method in items],
+        )
+        conn.commit()
+
+
+def prune_document_analyses() -> int:
+    """Delete analyses no stored document text matches any more. Returns how many."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "DELETE FROM document_analysis WHERE content_hash NOT IN "
+            "(SELECT content_hash FROM documents WHERE content_hash IS NOT NULL)"
+        )
+        removed = cur.rowcount
+        conn.commit()
+    return removed
+
+
+# ----------------------------------------------------
+# Chat conversations
+# ----------------------------------------------------
+_MESSAGE_COLUMNS = ("id", "role", "content", "tokens")
+
+
+def get_conversation(conversation_id: str) -> Optional[Dict]:
+    """{"id", "summary", "summarized_upto", "version"} of a conversation, or None."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT id, summary, summarized_upto, version FROM conversations WHERE id = ?",
+            (conversation_id,),
+        )
+        row = cur.fetchone()
+    return dict(zip(("id", "summary", "summarized_upto", "version"), row)) if row else None
+
+
+def get_conversation_version(conversation_id: str) -> Optional[int]:
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT version FROM conversations WHERE id = ?", (conversation_id,))
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def get_chat_messages(conversation_id: str, after_id: int = 0,
+                      last: Optional[int] = None) -> List[Dict]:
+    """
+    Messages of a conversation with id > after_id, oldest first, as
+    {"id", "role", "content", "tokens"} dicts. With last, only the last
+    that many are returned.
+    """
+    columns = ", ".join(_MESSAGE_COLUMNS)
+    with get_connection() as conn:
+        cur = conn.cursor()
+        if last is None:
+            cur.execute(
+                f"SELECT {columns} FROM chat_messages "
+                "WHERE conversation_id = ? AND id > ? ORDER BY id",
+                (conversation_id, after_id),
+            )
+            rows = cur.fetchall()
+        else:
+            cur.execute(
+                f"SELECT {columns} FROM chat_messages "
+                "WHERE conversation_id = ? AND id > ? ORDER BY id DESC LIMIT ?",
+                (conversation_id, after_id, last),
+            )
+            rows = cur.fetchall()[::-1]
+    return [dict(zip(_MESSAGE_COLUMNS, row)) for row in rows]
+
+
+def add_chat_messages(conversation_id: str,
+                      messages: List[Tuple[str, str, int]]) -> Tuple[List[int], int]:
+    """
+    Append (role, content, tokens) messages, creating the conversation if
+    needed. Returns (new message ids, new conversation version).
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("INSERT OR IGNORE INTO conversations (id) VALUES (?)", (conversation_id,))
+        ids = []
+        for role, content, tokens in messages:
+            cur.execute(
+                "INSERT INTO chat_messages (conversation_id, role, content, tokens) "
+                "VALUES (?, ?, ?, ?)",
+                (conversation_id, role, content, tokens),
+            )
+            ids.append(cur.lastrowid)
+        cur.execute(
+            "UPDATE conversations SET version = version + 1, "
+            "updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (conversation_id,),
+        )
+        cur.execute("SELECT version FROM conversations WHERE id = ?", (conversation_id,))
+        version = cur.fetchone()[0]
+        conn.commit()
+    return ids, version
+
+
+def set_conversation_summary(conversation_id: str, summary: str, summarized_upto: int) -> None:
+    """Store the rolling summary covering messages up to summarized_upto."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "UPDATE conversations SET summary = ?, summarized_upto = ?, "
+            "version = version + 1 WHERE id = ? AND summarized_upto < ?",
+            (summary, summarized_upto, conversation_id, summarized_upto),
+        )
+        conn.commit()
+
+
+def delete_conversation(conversation_id: str) -> None:
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM chat_messages WHERE conversation_id = ?", (conversation_id,))
+        cur.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+        conn.commit()
+
+
+def clear_conversations() -> None:
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM chat_messages")
+        cur.execute("DELETE FROM conversations")
+        conn.commit()
+
+
+def prune_conversations(idle_days: float) -> int:
+    """Delete conversations idle for more than idle_days. Returns how many."""
+    cutoff = f"-{idle_days} days"
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "DELETE FROM chat_messages WHERE conversation_id IN "
+            "(SELECT id FROM conversations WHERE updated_at < datetime('now', ?))",
+            (cutoff,),
+        )
+        cur.execute("DELETE FROM conversations WHERE updated_at < datetime('now', ?)",
+                    (cutoff,))
+        removed = cur.rowcount
+        conn.commit()
+    return removed
+
+
+# ----------------------------------------------------
+# Background jobs
+# ----------------------------------------------------
+JOB_COLUMNS = ("id", "kind", "payload", "priority", "status", "attempts", "max_attempts",
+               "total", "done", "failed", "error", "cancel_requested", "worker",
+               "created_at", "started_at", "finished_at")
+
+# Columns update_job() may set
+_JOB_UPDATE_COLUMNS = {"status", "total", "error"}
+
+# Statuses of jobs that are still waiting or running
+ACTIVE_JOB_STATUSES = ("queued", "running")
+
+
+def create_job(job_id: str, kind: str, payload: Dict, priority: int = 0,
+               max_attempts: int = 1, total: int = 0) -> None:
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO jobs (id, kind, payload, priority, max_attempts, total, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(payload), priority, max_attempts, total, time.time()),
+        )
+        conn.commit()
+
+
+def get_job(job_id: str) -> Optional[Dict]:
+    """The job row (payload decoded) plus its "results" and "errors", or None."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        cur.execute("SELECT is_error, data FROM job_results WHERE job_id = ? ORDER BY id",
+                    (job_id,))
+        rows = cur.fetchall()
+
+    job = dict(zip(JOB_COLUMNS, row))
+    job["payload"] = json.loads(job["payload"])
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    job["results"] = [json.loads(data) for is_error, data in rows if not is_error]
+    job["errors"] = [json.loads(data) for is_error, data in rows if is_error]
+    return job
+
+
+def find_active_job(kind: str) -> Optional[str]:
+    """Id of a queued or running job of this kind, or None."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT id FROM jobs WHERE kind = ? AND status IN (?, ?) "
+            "ORDER BY created_at LIMIT 1",
+            (kind, *ACTIVE_JOB_STATUSES),
+        )
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def update_job(job_id: str, **fields) -> None:
+    unknown = set(fields) - _JOB_UPDATE_COLUMNS
+    if unknown:
+        raise ValueError(f"Cannot update job columns: {sorted(unknown)}")
+    if not fields:
+        return
+    with get_connection() as conn:
+        cur = conn.cursor()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        cur.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+        conn.commit()
+
+
+def add_job_results(job_id: str, results: List[Dict], errors: List[Dict]) -> None:
+    """Append results / errors and count them as done / failed."""
+    rows = [(job_id, 0, json.dumps(r)) for r in results] + \
+        [(job_id, 1, json.dumps(e)) for e in errors]
+    if not rows:
+        return
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.executemany("INSERT INTO job_results (job_id, is_error, data) VALUES (?, ?, ?)",
+                        rows)
+        cur.execute("UPDATE jobs SET done = done + ?, failed = failed + ? WHERE id = ?",
+                    (len(results), len(errors), job_id))
+        conn.commit()
+
+
+def finish_job(job_id: str, status: Optional[str] = None, error: Optional[str] = None) -> None:
+    """
+    End a queued or running job. Without a status it is "failed" when
+    every item failed, else "done". The error of an earlier attempt is
+    replaced. Finished jobs are left unchanged.
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "UPDATE jobs SET status = COALESCE(?, CASE WHEN total > 0 AND failed = total "
+            "THEN 'failed' ELSE 'done' END), error = ?, "
+            "finished_at = ?, lease_until = NULL WHERE id = ? AND status IN (?, ?)",
+            (status, error, time.time(), job_id, *ACTIVE_JOB_STATUSES),
+        )
+        conn.commit()
+
+
+def claim_job(worker: str, lease_seconds: float) -> Optional[Dict]:
+    """
+    Atomically take the next runnable job (highest priority, then oldest)
+    for worker, leased for lease_seconds. Jobs whose worker stopped
+    renewing its lease are taken over, or failed once out of attempts.
+    A retried job starts with its progress reset.
+    Returns {"id", "kind", "payload", "attempts", "max_attempts"} or None.
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        while True:
+            now = time.time()
+            # Take the write lock first so two workers never claim the same job
+            cur.execute("BEGIN IMMEDIATE")
+            cur.execute(
+                "SELECT id, kind, payload, attempts, max_attempts, status FROM jobs "
+                "WHERE (status = 'queued' AND run_after <= ?) "
+                "   OR (status = 'running' AND lease_until < ?) "
+                "ORDER BY priority DESC, created_at LIMIT 1",
+                (now, now),
+            )
+            row = cur.fetchone()
+            if row is None:
+                conn.commit()
+                return None
+
+            job_id, kind, payload, attempts, max_attempts, status = row
+            if status == "running" and attempts >= max_attempts:
+                cur.execute(
+                    "UPDATE jobs SET status = 'failed', error = 'Worker stopped', "
+                    "finished_at = ?, lease_until = NULL WHERE id = ?",
+                    (now, job_id),
+                )
+                conn.commit()
+                continue
+
+            if attempts:
+                cur.execute("DELETE FROM job_results WHERE job_id = ?", (job_id,))
+            cur.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, lease_until = ?, "
+                "attempts = attempts + 1, done = 0, failed = 0, "
+                "started_at = COALESCE(started_at, ?) WHERE id = ?",
+                (worker, now + lease_seconds, now, job_id),
+            )
+            conn.commit()
+            return {"id": job_id, "kind": kind, "payload": json.loads(payload),
+                    "attempts": attempts + 1, "max_attempts": max_attempts}
+
+
+def renew_job_lease(job_id: str, worker: str, lease_seconds: float) -> bool:
+    """Extend a running job's lease. False if the worker no longer owns it."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (time.time() + lease_seconds, job_id, worker),
+        )
+        owned = cur.rowcount == 1
+        conn.commit()
+    return owned
+
+
+def retry_job(job_id: str, delay_seconds: float, error: str) -> None:
+    """Put a failed attempt back in the queue, runnable after delay_seconds."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "UPDATE jobs SET status = 'queued', error = ?, run_after = ?, worker = NULL, "
+            "lease_until = NULL WHERE id = ? AND status = 'running'",
+            (error, time.time() + delay_seconds, job_id),
+        )
+        conn.commit()
+
+
+def cancel_job(job_id: str) -> Optional[str]:
+    """
+    Cancel a job: a queued job is cancelled at once, a running one is
+    flagged and stops at its next check. Returns the job status, or None.
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "UPDATE jobs SET status = 'cancelled', finished_at = ? "
+            "WHERE id = ? AND status = 'queued'",
+            (time.time(), job_id),
+        )
+        cur.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'",
+                    (job_id,))
+        cur.execute("SELECT status FROM jobs WHERE id = ?", (job_id,))
+        row = cur.fetchone()
+        conn.commit()
+    return row[0] if row else None
+
+
+def job_cancel_requested(job_id: str) -> bool:
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,))
+        row = cur.fetchone()
+    return bool(row and row[0])
+
+
+def prune_jobs(max_age_seconds: float) -> int:
+    """Delete jobs that finished more than max_age_seconds ago. Returns how many."""
+    cutoff = time.time() - max_age_seconds
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "DELETE FROM job_results WHERE job_id IN "
+            "(SELECT id FROM jobs WHERE finished_at < ?)",
+            (cutoff,),
+        )
+        cur.execute("DELETE FROM jobs WHERE finished_at < ?", (cutoff,))
+        removed = cur.rowcount
         conn.commit()
+    return removed
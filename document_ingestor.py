@@ -1,71 +1,195 @@
-import requests
-from bs4 import BeautifulSoup
-import docx
-import PyPDF2
-import os
+import codecs
 
+# Text files are read and yielded in line-aligned segments of about this size
+SEGMENT_CHARS = 1 << 20
 
+# Block size for binary passes over a file (encoding detection)
+READ_BLOCK_BYTES = 1 << 20
+
+
+def detect_text_encoding(filepath):
+    """
+    Return "utf-8" if the whole file decodes as UTF-8, else "latin-1".
+    Decodes incrementally, so memory stays bounded for any file size.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        with open(filepath, "rb") as f:
+            for block in iter(lambda: f.read(READ_BLOCK_BYTES), b""):
+                decoder.decode(block)
+            decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return "latin-1"
+    return "utf-8"
+
+
+# Tags that never hold page content
+NON_CONTENT_TAGS = ["script", "style", "noscript", "template", "svg", "iframe"]
+
+# Page chrome removed by strip_boilerplate: tags, ARIA roles and hints in
+# class / id names
+BOILERPLATE_TAGS = ["nav", "header", "footer", "aside", "form"]
+BOILERPLATE_ROLES = ("navigation", "banner", "contentinfo", "search", "complementary")
+BOILERPLATE_HINTS = ("nav", "menu", "sidebar", "breadcrumb", "footer", "header",
+                     "cookie", "banner", "toc", "skip-link", "share", "related")
+
+_html_parser = None
+
+
+def get_html_parser():
+    """HTML_PARSER from config; "auto" is lxml when installed, else html.parser."""
+    global _html_parser
+    if _html_parser is None:
+        from config import HTML_PARSER
+        parser = HTML_PARSER
+        if parser == "auto":
+            try:
+                import lxml  # noqa: F401
+                parser = "lxml"
+            except ImportError:
+                parser = "html.parser"
+        _html_parser = parser
+    return _html_parser
+
+
+def _is_boilerplate(tag):
+    if tag.get("role") in BOILERPLATE_ROLES:
+        return True
+    names = " ".join(tag.get("class") or []) + " " + (tag.get("id") or "")
+    words = names.lower().replace("_", "-").split()
+    return any(word == hint or word.startswith(hint + "-") or word.endswith("-" + hint)
+               for word in words for hint in BOILERPLATE_HINTS)
+
+
+def strip_boilerplate(soup):
+    """
+    Reduce a parsed page to its main content: the <main> / <article> /
+    role="main" element when there is one, without navigation, headers,
+    footers, sidebars and similar chrome.
+    """
+    root = soup.find("main") or soup.find(attrs={"role": "main"}) or soup.find("article")
+    root = root or soup.body or soup
+
+    for tag in root.find_all(BOILERPLATE_TAGS):
+        tag.decompose()
+    for tag in root.find_all(True):
+        # Children of an already removed element are decomposed too
+        if not tag.decomposed and tag.attrs and _is_boilerplate(tag):
+            tag.decompose()
+    return root
+
+
+def soup_to_text(soup, boilerplate=False):
+    """Visible text of a parsed page; modifies the soup (see html_to_text)."""
+    # Remove scripts/styles
+    for tag in soup(NON_CONTENT_TAGS):
+        tag.decompose()
+
+    root = strip_boilerplate(soup) if boilerplate else soup
+    text = root.get_text(separator="\n")
+
+    # Drop the blank lines left behind by layout markup
+    lines = (line.strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def html_to_text(html, boilerplate=False, parser=None):
+    """
+    Visible text of an HTML page (scripts and styles removed). With
+    boilerplate=True only the main content is kept (see strip_boilerplate).
+    """
+    from bs4 import BeautifulSoup
+
+    return soup_to_text(BeautifulSoup(html, parser or get_html_parser()), boilerplate)
+
+
+# Parsing libraries are imported inside each loader so that importing this
+# module (e.g. from app.py) does not pay for requests/bs4/docx/PyPDF2.
 class DocumentIngestor:
 
     def load(self, path_or_url):
         """Universal loader that chooses correct method."""
+        return "".join(self.iter_segments(path_or_url))
+
+    def iter_segments(self, path_or_url):
+        """
+        Yield the document text as a sequence of segments (pages,
+        paragraphs or line-aligned blocks). Concatenating them gives
+        exactly what load() returns, but only one segment is held in
+        memory at a time.
+        """
         if path_or_url.startswith("http://") or path_or_url.startswith("https://"):
-            return self._load_url(path_or_url)
+            return iter([self._load_url(path_or_url)])
 
         if path_or_url.endswith(".txt"):
-            return self._load_txt(path_or_url)
+            return self._iter_txt(path_or_url)
 
         if path_or_url.endswith(".docx"):
-            return self._load_docx(path_or_url)
+            return self._iter_docx(path_or_url)
 
         if path_or_url.endswith(".pdf"):
-            return self._load_pdf(path_or_url)
+            return self._iter_pdf(path_or_url)
 
         # Fallback: treat anything else as text
-        return self._load_txt(path_or_url)
+        return self._iter_txt(path_or_url)
 
     # -----------------------------------------------------
     # TXT LOADER
     # -----------------------------------------------------
     def _load_txt(self, filepath):
-        try:
-            with open(filepath, "r", encoding="utf-8") as f:
-                return f.read()
-        except:
-            with open(filepath, "r", encoding="latin-1") as f:
-                return f.read()
+        return "".join(self._iter_txt(filepath))
+
+    def _iter_txt(self, filepath, segment_chars=SEGMENT_CHARS):
+        encoding = detect_text_encoding(filepath)
+
+        with open(filepath, "r", encoding=encoding) as f:
+            lines = []
+            size = 0
+            for line in f:
+                lines.append(line)
+                size += len(line)
+                if size >= segment_chars:
+                    yield "".join(lines)
+                    lines = []
+                    size = 0
+            if lines:
+                yield "".join(lines)
 
     # -----------------------------------------------------
     # DOCX LOADER
     # -----------------------------------------------------
     def _load_docx(self, filepath):
+        return "".join(self._iter_docx(filepath))
+
+    def _iter_docx(self, filepath):
+        import docx
+
         doc = docx.Document(filepath)
-        return "\n".join([p.text for p in doc.paragraphs])
+        for i, p in enumerate(doc.paragraphs):
+            yield p.text if i == 0 else "\n" + p.text
 
     # -----------------------------------------------------
     # PDF LOADER (non-scanned PDFs)
     # -----------------------------------------------------
     def _load_pdf(self, filepath):
-        text = ""
+        return "".join(self._iter_pdf(filepath))
+
+    def _iter_pdf(self, filepath):
+        import PyPDF2
+
         with open(filepath, "rb") as f:
             reader = PyPDF2.PdfReader(f)
             for page in reader.pages:
                 try:
-                    text += page.extract_text() + "\n"
-                except:
+                    yield page.extract_text() + "\n"
+                except Exception:
                     continue
-        return text
 
     # -----------------------------------------------------
     # URL LOADER (HTML pages)
     # -----------------------------------------------------
     def _load_url(self, url):
-        response = requests.get(url, timeout=10)
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        # Remove scripts/styles
-        for tag in soup(["script", "style"]):
-            tag.decompose()
+        import requests
 
-        text = soup.get_text(separator="\n")
-        return text.strip()
+        response = requests.get(url, timeout=10)
+        return html_to_text(response.text)
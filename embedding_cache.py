@@ -0,0 +1,70 @@
+"""
+Content-addressed embedding cache backed by the SQLite chunk_embeddings table.
+
+Chunks are keyed by the sha256 of their text and by the embedding model
+name, so rebuilding an index only encodes chunks that are new or changed,
+and switching to another model never returns stale vectors. Vectors are
+stored at VECTOR_DTYPE precision; the dtype of a cached blob is told
+apart by its size, so fp32 and fp16 entries can coexist.
+"""
+
+import hashlib
+
+import numpy as np
+
+import database
+from config import VECTOR_DTYPE
+
+
+def chunk_hash(text):
+    """sha256 hex digest of a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _decode(dim, blob):
+    dtype = "float16" if len(blob) == 2 * dim else "float32"
+    return np.frombuffer(blob, dtype=dtype, count=dim)
+
+
+def encode_cached(texts, encode_fn, model_name, doc_id=None, first_chunk_id=0,
+                  storage_dtype=None):
+    """
+    Return a float32 (len(texts), dim) matrix of embeddings for texts.
+
+    Only texts whose hash is not cached for model_name are passed to
+    encode_fn (a SentenceTransformer-style encode). When doc_id is given,
+    the document's chunk layout is recorded in the chunks table, with
+    texts being its chunks from first_chunk_id on. New vectors are stored
+    as storage_dtype (default VECTOR_DTYPE).
+    """
+    storage_dtype = storage_dtype or VECTOR_DTYPE
+    hashes = [chunk_hash(t) for t in texts]
+    cached = database.get_cached_embeddings(model_name, hashes)
+
+    missing = {}
+    for text, sha in zip(texts, hashes):
+        if sha not in cached and sha not in missing:
+            missing[sha] = text
+
+    new_vectors = {}
+    if missing:
+        encoded = np.asarray(encode_fn(list(missing.values())), dtype="float32")
+        rows = []
+        for sha, vector in zip(missing.keys(), encoded):
+            new_vectors[sha] = vector
+            rows.append((sha, int(vector.shape[0]), vector.astype(storage_dtype).tobytes()))
+        database.put_cached_embeddings(model_name, rows)
+
+    vectors = []
+    for sha in hashes:
+        if sha in new_vectors:
+            vectors.append(new_vectors[sha])
+        else:
+            vectors.append(_decode(*cached[sha]))
+
+    if doc_id is not None:
+        database.set_document_chunks(doc_id, hashes, start=first_chunk_id)
+
+    if not vectors:
+        return np.zeros((0, 0), dtype="float32")
+    return np.vstack(vectors).astype("float32", copy=False)
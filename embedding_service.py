@@ -0,0 +1,159 @@
+"""
+Embedding service: every chunk and query embedding goes through here.
+
+Backends:
+    torch - the sentence-transformers model as published (fp32 PyTorch)
+    onnx  - the model's int8-quantized ONNX export run by onnxruntime,
+            noticeably faster on CPU (needs sentence-transformers[onnx])
+
+Queries are always encoded in the calling process. Bulk encodes (index
+builds, uploads) are split across EMBEDDING_WORKERS processes when set,
+so they no longer compete with request handling for the web process's
+CPU and GIL. Each worker loads its own copy of the model once.
+"""
+
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from config import (
+    EMBEDDING_BACKEND,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_MODEL,
+    EMBEDDING_ONNX_FILE,
+    EMBEDDING_WORKERS,
+)
+
+BACKENDS = ("torch", "onnx")
+
+
+def load_model(model_name, backend, onnx_file=None):
+    """Load a SentenceTransformer for the given backend."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+    from sentence_transformers import SentenceTransformer
+    if backend == "onnx":
+        return SentenceTransformer(model_name, device="cpu", backend="onnx",
+                                   model_kwargs={"file_name": onnx_file})
+    return SentenceTransformer(model_name)
+
+
+def _encode(model, texts, batch_size):
+    vectors = model.encode(list(texts), batch_size=batch_size,
+                           convert_to_numpy=True, show_progress_bar=False)
+    return np.asarray(vectors, dtype="float32")
+
+
+# -----------------------------
+# Worker processes
+# -----------------------------
+_worker_model = None
+
+
+def _init_worker(model_name, backend, onnx_file, threads):
+    global _worker_model
+    # Split the cores between workers instead of every worker using all
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_model = load_model(model_name, backend, onnx_file)
+
+
+def _encode_in_worker(texts, batch_size):
+    return _encode(_worker_model, texts, batch_size)
+
+
+# -----------------------------
+# Service
+# -----------------------------
+class EmbeddingService:
+    def __init__(self, model_name=None, backend=None, batch_size=None,
+                 workers=None, onnx_file=None):
+        self.model_name = model_name or EMBEDDING_MODEL
+        self.backend = backend or EMBEDDING_BACKEND
+        self.batch_size = batch_size or EMBEDDING_BATCH_SIZE
+        self.workers = EMBEDDING_WORKERS if workers is None else workers
+        self.onnx_file = onnx_file or EMBEDDING_ONNX_FILE
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown embedding backend: {self.backend}")
+
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    @property
+    def model_key(self):
+        """Identifies the vectors this service produces (embedding cache key)."""
+        if self.backend == "torch":
+            return self.model_name
+        return f"{self.model_name}@{self.backend}:{self.onnx_file}"
+
+    def get_model(self):
+        """The in-process model, loaded on first call."""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = load_model(self.model_name, self.backend, self.onnx_file)
+        return self._model
+
+    def get_pool(self):
+        """The worker pool, or None when bulk encoding runs in-process."""
+        if self.workers <= 0:
+            return None
+        with self._pool_lock:
+            if self._pool is None:
+                threads = max(1, (os.cpu_count() or 1) // self.workers)
+                # spawn: forking a process that already loaded torch can hang
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.model_name, self.backend, self.onnx_file, threads),
+                )
+            return self._pool
+
+    def encode(self, texts):
+        """Embed texts as a float32 (len(texts), dim) matrix."""
+        texts = list(texts)
+        pool = self.get_pool() if len(texts) >= 2 * self.batch_size else None
+        if pool is None:
+            return _encode(self.get_model(), texts, self.batch_size)
+
+        # Contiguous shards, at least one batch each, concatenated in order
+        size = max(self.batch_size, math.ceil(len(texts) / self.workers))
+        futures = [pool.submit(_encode_in_worker, texts[i:i + size], self.batch_size)
+                   for i in range(0, len(texts), size)]
+        return np.vstack([f.result() for f in futures])
+
+    def encode_query(self, query):
+        """Embed a single query as a (1, dim) float32 matrix, in-process."""
+        return _encode(self.get_model(), [query], self.batch_size)
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+
+# ----------------------------------------------------
+# Process-wide instance
+# ----------------------------------------------------
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_embedding_service():
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = EmbeddingService()
+        return _service
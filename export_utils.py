@@ -1,10 +1,33 @@
-from docx import Document
 import csv
-from openpyxl import Workbook
+import io
+
+# python-docx and openpyxl are imported inside the exporters that need them,
+# keeping app start-up free of both libraries.
+
+
+# Hits carry two scores: the cosine similarity of the chunk to the question
+# and the score they were ranked by, which in hybrid mode is a fusion score
+# (RRF values around 0.03), not a similarity.
+SCORE_HEADERS = ["Similarity", "Rank score"]
+
+
+def _format_score(score):
+    """Search scores are floats; show them rounded, pass anything else through."""
+    if score is None:
+        return "N/A"
+    if isinstance(score, float):
+        return round(score, 4)
+    return score
+
+
+def _scores(score, meta):
+    """(similarity, rank score); without meta["similarity"] the score is the cosine."""
+    similarity = meta["similarity"] if "similarity" in meta else score
+    return _format_score(similarity), _format_score(score)
 
 
 def _normalize_row(r):
-    """Convert ANY row into: (text, source, file, score).
+    """Convert ANY row into: (text, source, file, similarity, rank score).
        Handles dicts, strings, tuples, lists.
     """
 
@@ -12,7 +35,7 @@ def _normalize_row(r):
     # CASE 1: r is a string = pure text
     # ------------------
     if isinstance(r, str):
-        return r, "Unknown", "Unknown", "N/A"
+        return r, "Unknown", "Unknown", "N/A", "N/A"
 
     # ------------------
     # CASE 2: r is a list or tuple
@@ -26,9 +49,9 @@ def _normalize_row(r):
 
         source = meta.get("source", "Unknown")
         file_name = meta.get("file", source)
-        score = meta.get("score", "N/A")
+        score = meta.get("score")
 
-        return text, source, file_name, score
+        return (text, source, file_name, *_scores(score, meta))
 
     # ------------------
     # CASE 3: r is a dict (ideal case)
@@ -43,36 +66,46 @@ def _normalize_row(r):
 
         source = r.get("source") or meta.get("source", "Unknown")
         file_name = r.get("file") or source
-        score = r.get("score", "N/A")
+        score = r.get("score", meta.get("score"))
 
-        return text, source, file_name, score
+        return (text, source, file_name, *_scores(score, meta))
 
     # ------------------
     # Unknown structure
     # ------------------
-    return str(r), "Unknown", "Unknown", "N/A"
+    return str(r), "Unknown", "Unknown", "N/A", "N/A"
 
 
 # ======================================================
 #  CSV
 # ======================================================
 def export_to_csv(rows, question, answer, buffer):
+    # /export_results hands us a BytesIO; csv needs a text stream on top
+    text_buffer = None
+    if not isinstance(buffer, io.TextIOBase):
+        buffer = text_buffer = io.TextIOWrapper(buffer, encoding="utf-8", newline="")
+
     writer = csv.writer(buffer)
 
     writer.writerow(["Question", question])
     writer.writerow(["Answer", answer])
     writer.writerow([])
-    writer.writerow(["Text", "Source", "File", "Score"])
+    writer.writerow(["Text", "Source", "File", *SCORE_HEADERS])
 
     for r in rows:
-        text, source, file_name, score = _normalize_row(r)
-        writer.writerow([text, source, file_name, score])
+        writer.writerow(list(_normalize_row(r)))
+
+    if text_buffer is not None:
+        text_buffer.flush()
+        text_buffer.detach()  # leave the caller's BytesIO open
 
 
 # ======================================================
 #  Excel
 # ======================================================
 def export_to_excel(rows, question, answer, buffer):
+    from openpyxl import Workbook
+
     wb = Workbook()
     ws = wb.active
     ws.title = "RAG Export"
@@ -80,11 +113,10 @@ def export_to_excel(rows, question, answer, buffer):
     ws.append(["Question", question])
     ws.append(["Answer", answer])
     ws.append([])
-    ws.append(["Text", "Source", "File", "Score"])
+    ws.append(["Text", "Source", "File", *SCORE_HEADERS])
 
     for r in rows:
-        text, source, file_name, score = _normalize_row(r)
-        ws.append([text, source, file_name, score])
+        ws.append(list(_normalize_row(r)))
 
     wb.save(buffer)
 
@@ -93,6 +125,8 @@ def export_to_excel(rows, question, answer, buffer):
 #  DOCX
 # ======================================================
 def export_to_docx(rows, question, answer, buffer):
+    from docx import Document
+
     doc = Document()
 
     doc.add_heading("RAG Export", level=1)
@@ -101,14 +135,15 @@ def export_to_docx(rows, question, answer, buffer):
     doc.add_paragraph("")
 
     for r in rows:
-        text, source, file_name, score = _normalize_row(r)
+        text, source, file_name, similarity, rank_score = _normalize_row(r)
 
         doc.add_heading("Retrieved Chunk", level=2)
         doc.add_paragraph(text)
 
         doc.add_paragraph(f"Source: {source}")
         doc.add_paragraph(f"File: {file_name}")
-        doc.add_paragraph(f"Score: {score}")
+        doc.add_paragraph(f"Similarity: {similarity}")
+        doc.add_paragraph(f"Rank score: {rank_score}")
         doc.add_paragraph("")
 
     doc.save(buffer)
@@ -0,0 +1,667 @@
+"""
+Long-lived FAISS index over every document in the database.
+
+The index is built once, saved next to the SQLite file and then kept in
+sync through database change listeners, so /ask and /chat/send no longer
+re-chunk and re-embed the whole knowledge base on every request.
+
+Each vector id encodes (doc_id, chunk_id), which lets a document delete
+remove only that document's vectors.
+
+Only vector ids and chunk offsets are kept per chunk, both memory-mapped
+from disk along with the FAISS index (INDEX_MMAP), so every worker process
+shares one page-cache copy. Hit texts are read from SQLite by vector id.
+
+Several processes share the index files. Changes are made under a
+cross-process writer lock, on top of whatever another process saved last,
+and the files are written / read under a second lock so a reader never
+mixes two saves. Web processes (see app.py) do not change the index at
+all: they hand document changes to a job worker.
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from itertools import islice
+
+import numpy as np
+
+import database
+from ann_index import (
+    build_index,
+    get_faiss,
+    l2_to_similarity,
+    needs_rebuild,
+    read_index,
+    search_index,
+    supports_remove,
+)
+from config import (
+    HYBRID_FUSION,
+    INDEX_EF_SEARCH,
+    INDEX_MMAP,
+    INDEX_NPROBE,
+    INDEX_TYPE,
+    MIN_SIMILARITY,
+    SEARCH_MODE,
+    VECTOR_DTYPE,
+)
+import keyword_index
+from chunking import iter_chunks, resolve_options
+from embedding_service import get_embedding_service
+from rag_engine import embed_query, embed_texts
+
+# Backends without per-id deletes (HNSW) keep deleted vectors as tombstones
+# that search skips; once they exceed this share of the index it is rebuilt.
+MAX_TOMBSTONE_RATIO = 0.2
+
+# Low bits of a vector id hold the chunk number, high bits the document id.
+CHUNK_ID_BITS = 20
+CHUNK_ID_MASK = (1 << CHUNK_ID_BITS) - 1
+
+# Chunks embedded (and added to the index) per step while streaming a document
+EMBED_BATCH_SIZE = 256
+
+SEARCH_MODES = ("dense", "keyword", "hybrid")
+
+# Bumped when the chunk_fts layout changes; older indexes are rebuilt so
+# the keyword index gets (re)populated alongside FAISS.
+KEYWORD_INDEX_VERSION = 1
+
+# Hybrid search fuses this many candidates from each retriever
+HYBRID_CANDIDATES = 50
+
+try:
+    import fcntl
+except ImportError:     # Windows: no cross-process locking
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path, shared=False):
+    """Hold an flock on path, which every process on the host respects."""
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a+b") as f:
+        fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def make_vector_id(doc_id, chunk_id):
+    """Pack a (doc_id, chunk_id) pair into a single FAISS id."""
+    if chunk_id > CHUNK_ID_MASK:
+        raise ValueError(f"Document {doc_id} has too many chunks.")
+    return (int(doc_id) << CHUNK_ID_BITS) | int(chunk_id)
+
+
+def split_vector_id(vector_id):
+    """Inverse of make_vector_id: return (doc_id, chunk_id)."""
+    vector_id = int(vector_id)
+    return vector_id >> CHUNK_ID_BITS, vector_id & CHUNK_ID_MASK
+
+
+class ChunkTable:
+    """
+    Vector ids of the indexed chunks and their (start, end) offsets in the
+    document text, as a (3, n) int64 array sorted by id. Loaded from disk
+    it is memory-mapped; changes produce a new in-memory array.
+    """
+
+    def __init__(self, columns=None):
+        self.columns = np.zeros((3, 0), dtype="int64") if columns is None else columns
+        self._pending = []
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        return cls(np.load(path, mmap_mode="r" if mmap else None))
+
+    def save(self, path):
+        self._flush()
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, np.ascontiguousarray(self.columns))
+        os.replace(tmp, path)
+
+    def __len__(self):
+        return self.columns.shape[1] + sum(block.shape[1] for block in self._pending)
+
+    def __contains__(self, vector_id):
+        return self.get(vector_id) is not None
+
+    def add(self, ids, spans):
+        """Add vector ids with their (start, end) offsets."""
+        block = np.empty((3, len(ids)), dtype="int64")
+        block[0] = ids
+        block[1:] = np.asarray(spans, dtype="int64").reshape(-1, 2).T
+        self._pending.append(block)
+
+    def get(self, vector_id):
+        """(start, end) of a vector id, or None if it is not in the table."""
+        self._flush()
+        ids = self.columns[0]
+        i = int(np.searchsorted(ids, vector_id))
+        if i < len(ids) and ids[i] == vector_id:
+            return int(self.columns[1, i]), int(self.columns[2, i])
+        return None
+
+    def remove_range(self, first_id, last_id):
+        """Drop the ids in [first_id, last_id] and return them."""
+        self._flush()
+        ids = self.columns[0]
+        lo = int(np.searchsorted(ids, first_id))
+        hi = int(np.searchsorted(ids, last_id, side="right"))
+        removed = np.array(ids[lo:hi])
+        if hi > lo:
+            self.columns = np.concatenate([self.columns[:, :lo], self.columns[:, hi:]], axis=1)
+        return removed
+
+    def _flush(self):
+        if self._pending:
+            columns = np.concatenate([self.columns, *self._pending], axis=1)
+            self.columns = columns[:, np.argsort(columns[0], kind="stable")]
+            self._pending = []
+
+
+class IndexManager:
+    """
+    Owns a persistent faiss.IndexIDMap2 plus the chunk metadata it points to.
+    The wrapped backend (flat / IVF / HNSW) follows config.INDEX_TYPE.
+
+    Files written:
+        <db name>.faiss             - the FAISS index
+        <db name>.faiss.chunks.npy  - the ChunkTable (vector ids and offsets)
+        <db name>.faiss.json        - settings the index was built with, doc ids
+        <db name>.faiss.lock        - held while those three are written / read
+        <db name>.faiss.writer.lock - held for a whole change to the index
+    """
+
+    def __init__(self, db_path=None, chunk_options=None, index_type=None):
+        db_path = db_path or database.DB_PATH
+        base = os.path.splitext(db_path)[0]
+        self.index_path = base + ".faiss"
+        self.meta_path = base + ".faiss.json"
+        self.chunks_path = base + ".faiss.chunks.npy"
+        self.lock_path = base + ".faiss.lock"
+        self.writer_lock_path = base + ".faiss.writer.lock"
+        # strategy / max_chars / max_tokens / overlap, see chunking.resolve_options
+        self.chunk_options = resolve_options(**(chunk_options or {}))
+        self.configured_type = index_type or INDEX_TYPE
+
+        self.index = None
+        self.index_type = None  # resolved backend, see ann_index.INDEX_TYPES
+        self.trained_size = 0
+        self.tombstones = 0     # removed vectors still in an HNSW graph
+        self.chunks = ChunkTable()
+        self.doc_ids = set()
+        self._mapped = False    # index is memory-mapped, hence read-only
+
+        self._lock = threading.RLock()
+        self._write_depth = 0   # nesting of _writing() in this process
+        self._loaded = False
+        self._meta_mtime = None
+
+        # When set (web processes), queries call this instead of rebuilding
+        # an out-of-date index in the request; a worker process rebuilds it
+        # and queries keep using the index on disk until then.
+        self.request_rebuild = None
+        # When set (web processes), document changes are passed to this
+        # callback(event, doc_id) instead of being applied in the process.
+        self.defer_changes = None
+
+    # -----------------------------
+    # Loading / saving
+    # -----------------------------
+    def ensure_loaded(self, validate=True):
+        """
+        Load the on-disk index, or rebuild it if missing or out of date.
+        With validate=True the indexed doc ids are checked against the DB.
+        """
+        with self._lock:
+            if self._loaded and not self._changed_on_disk():
+                return
+
+            if self._load() and (not validate or
+                                 self.doc_ids == set(database.get_document_ids())):
+                return
+
+            # Index missing, unreadable, built with another embedding model
+            # or out of sync with the DB. Cached embeddings keep this cheap.
+            if validate and self.request_rebuild is not None:
+                # Checked again once the rebuilt index lands on disk
+                self._loaded = True
+                try:
+                    self._meta_mtime = os.path.getmtime(self.meta_path)
+                except OSError:
+                    self._meta_mtime = None
+                self.request_rebuild()
+                return
+            self.rebuild()
+
+    def _changed_on_disk(self):
+        """True if another process saved a newer index since we loaded ours."""
+        try:
+            return os.path.getmtime(self.meta_path) != self._meta_mtime
+        except OSError:
+            return self._meta_mtime is not None
+
+    def _load(self):
+        if not (os.path.exists(self.index_path) and os.path.exists(self.meta_path)):
+            return False
+
+        try:
+            with file_lock(self.lock_path, shared=True):
+                with open(self.meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                index = read_index(self.index_path, mmap=INDEX_MMAP)
+                chunks = ChunkTable.load(self.chunks_path, mmap=INDEX_MMAP)
+                meta_mtime = os.path.getmtime(self.meta_path)
+        except Exception:
+            return False
+
+        if meta.get("model") != get_embedding_service().model_key or \
+                meta.get("vector_dtype", "float32") != VECTOR_DTYPE or \
+                meta.get("configured_type") != self.configured_type or \
+                meta.get("chunking") != self.chunk_options or \
+                meta.get("keyword_index") != KEYWORD_INDEX_VERSION:
+            return False
+
+        self.index = index
+        self._mapped = INDEX_MMAP
+        self.index_type = meta.get("index_type")
+        self.trained_size = meta.get("trained_size", 0)
+        # Older files did not record them; count the vectors beyond the chunks
+        self.tombstones = meta.get("tombstones", max(0, index.ntotal - len(chunks)))
+        self.chunks = chunks
+        self.doc_ids = set(meta.get("doc_ids", []))
+        self._meta_mtime = meta_mtime
+        self._loaded = True
+        return True
+
+    def save(self):
+        """Atomically write the index and its metadata next to the DB file."""
+        with self._lock, file_lock(self.lock_path):
+            if self.index is None:
+                self._remove_files()
+                database.bump_corpus_generation()
+                return
+
+            tmp_index = self.index_path + ".tmp"
+            get_faiss().write_index(self.index, tmp_index)
+            os.replace(tmp_index, self.index_path)
+            self.chunks.save(self.chunks_path)
+
+            tmp_meta = self.meta_path + ".tmp"
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump({
+                    "model": get_embedding_service().model_key,
+                    "vector_dtype": VECTOR_DTYPE,
+                    "configured_type": self.configured_type,
+                    "chunking": self.chunk_options,
+                    "keyword_index": KEYWORD_INDEX_VERSION,
+                    "index_type": self.index_type,
+                    "trained_size": self.trained_size,
+                    "tombstones": self.tombstones,
+                    "doc_ids": sorted(self.doc_ids),
+                }, f)
+            os.replace(tmp_meta, self.meta_path)
+            self._meta_mtime = os.path.getmtime(self.meta_path)
+            # Only now: a reader seeing the new generation must find the new
+            # index, or it could cache an answer from the old one under it
+            database.bump_corpus_generation()
+
+            # Swap the private copies for the shared, mapped files
+            if INDEX_MMAP:
+                self.index = read_index(self.index_path, mmap=True)
+                self.chunks = ChunkTable.load(self.chunks_path)
+                self._mapped = True
+
+    def _writable(self):
+        """Replace a memory-mapped index with a private copy before changing it."""
+        if self._mapped:
+            with file_lock(self.lock_path, shared=True):
+                self.index = read_index(self.index_path)
+            self._mapped = False
+
+    def _remove_files(self):
+        for path in (self.index_path, self.meta_path, self.chunks_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._meta_mtime = None
+
+    @contextmanager
+    def _writing(self):
+        """
+        Hold the cross-process writer lock for a read-modify-write of the
+        index (re-entrant within this manager). Changes start from the
+        index another process may have saved in the meantime.
+        """
+        with self._lock:
+            if self._write_depth:
+                self._write_depth += 1
+                try:
+                    yield
+                finally:
+                    self._write_depth -= 1
+                return
+            with file_lock(self.writer_lock_path):
+                self._write_depth = 1
+                try:
+                    yield
+                finally:
+                    self._write_depth = 0
+
+    # -----------------------------
+    # Mutations
+    # -----------------------------
+    def rebuild(self):
+        """Drop everything and re-index all documents from the database."""
+        with self._writing():
+            self.chunks = ChunkTable()
+            self.doc_ids = set()
+            self._loaded = True
+            database.clear_keyword_chunks()
+
+            # Texts are streamed one document at a time; only vectors pile up,
+            # since training the index needs all of them
+            all_ids, blocks = [], []
+            for doc in database.list_documents(limit=-1, columns=("id",)):
+                segments = database.iter_document_text(doc["id"])
+                for ids, vectors in self._embed_document(doc["id"], segments):
+                    all_ids.extend(ids)
+                    blocks.append(vectors)
+
+            self._build(all_ids, blocks)
+            self.save()
+            database.prune_embedding_cache()
+
+    def add_document(self, doc_id, raw_text, source_name):
+        """Chunk, embed and add one document's vectors."""
+        self.add_documents([(doc_id, raw_text, source_name)])
+
+    def add_documents(self, docs):
+        """
+        Add several (doc_id, text, source_name) docs, saving once. text is
+        a string or an iterable of text segments, which are chunked and
+        embedded as they arrive. Hits take their source from the documents
+        table, so source_name is not stored.
+        """
+        with self._writing():
+            self.ensure_loaded(validate=False)
+            if self.index is not None and not supports_remove(self.index_type) and \
+                    any(doc_id in self.doc_ids for doc_id, _, _ in docs):
+                # A re-ingested document gets its old vector ids back, which
+                # would revive its tombstoned vectors: rebuild from the DB
+                self.rebuild()
+                return
+            if self.index is not None:
+                self._writable()
+
+            all_ids, blocks = [], []
+            for doc_id, text, _ in docs:
+                if doc_id in self.doc_ids:
+                    self._remove(doc_id)
+                segments = [text] if isinstance(text, str) else text
+                for ids, vectors in self._embed_document(doc_id, segments):
+                    if self.index is None:
+                        all_ids.extend(ids)
+                        blocks.append(vectors)
+                    else:
+                        self.index.add_with_ids(vectors, np.array(ids, dtype="int64"))
+
+            # A brand-new index is trained on everything at once
+            if all_ids:
+                self._build(all_ids, blocks)
+
+            self._save_or_rebuild()
+
+    def remove_document(self, doc_id):
+        """Remove only the vectors that belong to doc_id."""
+        with self._writing():
+            self.ensure_loaded(validate=False)
+            self._remove(doc_id)
+            self._save_or_rebuild()
+
+    def clear(self):
+        with self._writing(), file_lock(self.lock_path):
+            self.index = None
+            self.index_type = None
+            self.trained_size = 0
+            self.tombstones = 0
+            self.chunks = ChunkTable()
+            self.doc_ids = set()
+            self._loaded = True
+            self._remove_files()
+            database.clear_keyword_chunks()
+
+    def _build(self, ids, blocks):
+        """(Re)create the index from scratch using the configured backend."""
+        self._mapped = False
+        self.tombstones = 0
+        if not ids:
+            self.index, self.index_type, self.trained_size = None, None, 0
+            return
+        vectors = np.vstack(blocks)
+        self.index, self.index_type = build_index(self.configured_type, vectors, ids,
+                                                   vector_dtype=VECTOR_DTYPE)
+        self.trained_size = len(ids)
+
+    def _tombstones(self):
+        return 0 if self.index is None else self.tombstones
+
+    def _save_or_rebuild(self):
+        """
+        Rebuild when the corpus crossed an index-policy threshold, an IVF
+        index outgrew its training set or tombstones piled up; else save.
+        """
+        if self.index is not None and (
+                needs_rebuild(self.index_type, len(self.chunks), self.trained_size,
+                              self.configured_type)
+                or self._tombstones() > MAX_TOMBSTONE_RATIO * self.index.ntotal):
+            self.rebuild()
+        else:
+            self.save()
+
+    def _embed_document(self, doc_id, segments):
+        """
+        Chunk and embed a document from its text segments, registering its
+        chunk metadata. Yields (vector ids, vectors) per EMBED_BATCH_SIZE
+        chunks, so the document text is never held in memory as a whole.
+        """
+        self.doc_ids.add(doc_id)
+        chunks = iter_chunks(segments, **self.chunk_options)
+
+        first = 0
+        while True:
+            batch = list(islice(chunks, EMBED_BATCH_SIZE))
+            if not batch:
+                return
+
+            embeddings = embed_texts([c.text for c in batch], doc_id=doc_id,
+                                     first_chunk_id=first)
+            ids = [make_vector_id(doc_id, first + i) for i in range(len(batch))]
+
+            self.chunks.add(ids, [(c.start, c.end) for c in batch])
+            if any(c.heading for c in batch):
+                database.set_chunk_headings(doc_id, first, [c.heading for c in batch])
+            database.put_keyword_chunks([(vid, c.text) for vid, c in zip(ids, batch)])
+            first += len(batch)
+            yield ids, embeddings
+
+    def _remove(self, doc_id):
+        self.doc_ids.discard(doc_id)
+        database.delete_keyword_chunks(make_vector_id(doc_id, 0),
+                                       make_vector_id(doc_id, CHUNK_ID_MASK))
+        ids = self.chunks.remove_range(make_vector_id(doc_id, 0),
+                                       make_vector_id(doc_id, CHUNK_ID_MASK))
+        if not len(ids) or self.index is None:
+            return
+        if supports_remove(self.index_type):
+            self._writable()
+            self.index.remove_ids(ids)
+        else:
+            self.tombstones += len(ids)
+
+    # -----------------------------
+    # Database hook
+    # -----------------------------
+    def on_document_change(self, event, doc_id=None):
+        """Listener registered with database.add_change_listener."""
+        if self.defer_changes is not None:
+            self.defer_changes(event, doc_id)
+            return
+        if event in ("add", "add_many", "update", "update_many"):
+            doc_ids = doc_id if event.endswith("_many") else [doc_id]
+            docs = []
+            for info in filter(None, (database.get_document_info(i, ("id", "path_or_url"))
+                                      for i in doc_ids)):
+                # Text is streamed from SQLite while the document is embedded
+                docs.append((info["id"], database.iter_document_text(info["id"]),
+                             info["path_or_url"]))
+            self.add_documents(docs)
+        elif event == "delete":
+            self.remove_document(doc_id)
+        elif event == "clear":
+            self.clear()
+
+    # -----------------------------
+    # Queries
+    # -----------------------------
+    def is_empty(self):
+        with self._lock:
+            self.ensure_loaded()
+            return self.index is None or self.index.ntotal == 0
+
+    def search(self, query, top_k=5, nprobe=None, ef_search=None, query_vector=None,
+               mode=None, min_similarity=None):
+        """
+        Return up to top_k hits, best first:
+            {"text", "score", "meta": {"source", "doc_id", "chunk_id", "start",
+                                       "end", "heading", "similarity", "bm25"}}
+        score is the cosine similarity in "dense" mode, the BM25 score in
+        "keyword" mode and the fused score in "hybrid" mode (default
+        SEARCH_MODE). Dense hits below min_similarity (default
+        MIN_SIMILARITY) are dropped unless they also matched by keyword.
+        nprobe / ef_search default to INDEX_NPROBE / INDEX_EF_SEARCH.
+        query_vector may carry a precomputed embed_query(query).
+        """
+        mode = mode or SEARCH_MODE
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        min_similarity = MIN_SIMILARITY if min_similarity is None else min_similarity
+
+        with self._lock:
+            self.ensure_loaded()
+            if self.index is None or self.index.ntotal == 0:
+                return []
+
+            dense, keyword = [], []
+            if mode != "keyword":
+                if query_vector is None:
+                    query_vector = embed_query(query)
+                pool = top_k if mode == "dense" else max(top_k, HYBRID_CANDIDATES)
+                dense = self._dense_ranking(query_vector, pool, nprobe, ef_search)
+            if mode != "dense":
+                keyword = self._keyword_ranking(query, top_k if mode == "keyword"
+                                                else max(top_k, HYBRID_CANDIDATES))
+
+            if mode == "dense":
+                ranked = dense
+            elif mode == "keyword":
+                ranked = keyword
+            elif HYBRID_FUSION == "weighted":
+                ranked = keyword_index.weighted_fusion(dense, keyword)
+            else:
+                ranked = keyword_index.reciprocal_rank_fusion([dense, keyword])
+
+            similarities, bm25 = dict(dense), dict(keyword)
+            selected = []
+            for vector_id, score in ranked:
+                similarity = similarities.get(vector_id)
+                if vector_id not in bm25 and similarity is not None \
+                        and similarity < min_similarity:
+                    continue
+                selected.append((vector_id, score, similarity, bm25.get(vector_id)))
+                if len(selected) == top_k:
+                    break
+            return self._hits(selected)
+
+    def _hits(self, selected):
+        """Build hit dicts for (vector_id, score, similarity, bm25) rows."""
+        keys = []
+        for vector_id, *_ in selected:
+            doc_id, chunk_id = split_vector_id(vector_id)
+            keys.append((vector_id, doc_id, chunk_id, *self.chunks.get(vector_id)))
+        stored = database.get_indexed_chunks(keys)
+
+        hits = []
+        for (_, score, similarity, bm25), (_, doc_id, chunk_id, start, end), row in \
+                zip(selected, keys, stored):
+            if row is None:
+                continue    # document deleted since the index was saved
+            source, text, heading = row
+            hits.append({
+                "text": text,
+                "score": score,
+                "meta": {
+                    "source": source,
+                    "doc_id": doc_id,
+                    "chunk_id": chunk_id,
+                    "start": start,
+                    "end": end,
+                    "heading": heading,
+                    "similarity": similarity,
+                    "bm25": bm25,
+                },
+            })
+        return hits
+
+    def _dense_ranking(self, query_vector, top_k, nprobe, ef_search):
+        """FAISS (vector_id, cosine similarity) pairs, best first, live ids only."""
+        k = min(top_k + self._tombstones(), self.index.ntotal)
+        distances, indices = search_index(
+            self.index, query_vector, k,
+            nprobe=nprobe or INDEX_NPROBE,
+            ef_search=ef_search or INDEX_EF_SEARCH,
+        )
+
+        ranked = []
+        seen = set()
+        for distance, vector_id in zip(distances[0], indices[0]):
+            vector_id = int(vector_id)
+            # -1 pads results when fewer than k vectors are reachable
+            if vector_id not in self.chunks or vector_id in seen:
+                continue
+            seen.add(vector_id)
+            ranked.append((vector_id, l2_to_similarity(distance)))
+            if len(ranked) == top_k:
+                break
+        return ranked
+
+    def _keyword_ranking(self, query, top_k):
+        """BM25 (vector_id, score) pairs from chunk_fts, live ids only."""
+        return [(int(vid), score) for vid, score in keyword_index.search(query, top_k)
+                if int(vid) in self.chunks]
+
+
+# ----------------------------------------------------
+# Process-wide instance
+# ----------------------------------------------------
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_index_manager():
+    """Return the shared IndexManager, registering it with the database once."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = IndexManager()
+            database.add_change_listener(_manager.on_document_change)
+        return _manager
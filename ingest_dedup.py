@@ -0,0 +1,168 @@
+"""
+Duplicate detection for uploads and URLs at ingest time.
+
+A submission is matched against the stored documents by
+- source hash:  sha256 of the uploaded / fetched bytes, checked before
+                any parsing, OCR or embedding happens
+- source key:   the normalized URL (or upload path), so a re-upload or
+                re-fetch of the same source updates that document in place
+- content hash: sha256 of the extracted text, for the same content
+                arriving from another source
+
+Known URLs are re-fetched with If-None-Match / If-Modified-Since, and a
+document is only re-ingested when its bytes actually changed.
+
+Every check returns (status, doc_id) with status one of:
+    "new"        - nothing matched; ingest it
+    "changed"    - the source is known but its bytes changed; re-ingest into doc_id
+    "unchanged"  - the source is known and unchanged; doc_id is the document
+    "duplicate"  - the same bytes or text are already stored as doc_id
+"""
+
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import database
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Query parameters that only track the visitor and never change the page
+TRACKING_PARAMS = ("fbclid", "gclid", "mc_cid", "mc_eid")
+TRACKING_PREFIXES = ("utm_",)
+
+FETCH_TIMEOUT = 10
+
+
+def normalize_url(url):
+    """
+    Canonical form of a URL for duplicate detection: lowercase scheme and
+    host, no default port, no fragment, tracking parameters dropped and
+    the remaining query parameters sorted.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if ":" in host:
+        host = f"[{host}]"      # IPv6 literal: hostname drops the brackets
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    if parts.username:
+        host = f"{parts.username}@{host}"
+
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    )
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+def sha256_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+# -----------------------------
+# Checks
+# -----------------------------
+def check_source(source_key, source_hash):
+    """Match a submission by its bytes and its source key (see module doc)."""
+    known = database.find_document("source_key", source_key)
+    if known is not None:
+        status = "unchanged" if known["source_hash"] == source_hash else "changed"
+        return status, known["id"]
+
+    same_bytes = database.find_document("source_hash", source_hash)
+    if same_bytes is not None:
+        return "duplicate", same_bytes["id"]
+    return "new", None
+
+
+def check_content(text):
+    """(status, doc_id): "duplicate" if the same text is already stored, else "new"."""
+    match = database.find_document("content_hash", database.content_hash(text))
+    return ("duplicate", match["id"]) if match else ("new", None)
+
+
+def store_document(source_type, path_or_url, text, source, replace_id=None):
+    """
+    Store extracted text, deduplicated by content. replace_id re-ingests
+    into an existing document. Returns (status, doc_id) with status
+    "added", "updated" or "duplicate".
+    """
+    if replace_id is not None:
+        database.update_document(replace_id, text, source)
+        return "updated", replace_id
+
+    status, doc_id = check_content(text)
+    if status == "duplicate":
+        return status, doc_id
+    return "added", database.add_document(source_type, path_or_url, text, source=source)
+
+
+# -----------------------------
+# URLs
+# -----------------------------
+def conditional_get(url, session=None, timeout=FETCH_TIMEOUT):
+    """
+    GET url, conditionally when it is already stored. Returns
+    (source_key, known document or None, response), response being None
+    when the server answered 304 Not Modified.
+    """
+    if session is None:
+        import requests
+        session = requests
+
+    key = normalize_url(url)
+    known = database.find_document("source_key", key)
+
+    headers = {}
+    if known is not None:
+        if known["etag"]:
+            headers["If-None-Match"] = known["etag"]
+        if known["last_modified"]:
+            headers["If-Modified-Since"] = known["last_modified"]
+
+    response = session.get(url, headers=headers, timeout=timeout)
+    if known is not None and response.status_code == 304:
+        return key, known, None
+    response.raise_for_status()
+    return key, known, response
+
+
+def ingest_response(url, key, response, to_text=None):
+    """
+    Store the page in a fetched response unless it is a duplicate.
+    to_text turns the HTML into document text (default html_to_text).
+    Returns (status, doc_id) like ingest_url.
+    """
+    if to_text is None:
+        from document_ingestor import html_to_text as to_text
+
+    source = {
+        "source_key": key,
+        "source_hash": sha256_bytes(response.content),
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+    status, doc_id = check_source(key, source["source_hash"])
+    if status == "unchanged":
+        # Keep the fresh validators so the next fetch can be a 304
+        database.update_document_source(doc_id, source)
+        return status, doc_id
+    if status == "duplicate":
+        return status, doc_id
+
+    return store_document("url", url, to_text(response.text), source,
+                          replace_id=doc_id if status == "changed" else None)
+
+
+def ingest_url(url, session=None, timeout=FETCH_TIMEOUT):
+    """
+    Fetch url (conditionally when it is already stored) and store its text
+    unless it is a duplicate. Returns (status, doc_id), status being
+    "added", "updated", "unchanged" or "duplicate". session may be a
+    requests.Session to reuse connections.
+    """
+    key, known, response = conditional_get(url, session, timeout)
+    if response is None:
+        return "unchanged", known["id"]
+    return ingest_response(url, key, response)
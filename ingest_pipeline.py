@@ -0,0 +1,296 @@
+"""
+Background ingestion pipeline for uploaded files.
+
+/upload only saves the files and enqueues an "ingest" job (see jobs.py).
+A worker process runs it: parsing and OCR run in a process pool sized to
+the CPU count, and finished documents are written to the database in
+batches. Progress is available through get_job() (served by /jobs/<id>).
+Documents whose text is already stored are reported as duplicates
+instead of inserted.
+
+Texts never travel as whole strings: a pool worker streams a file's
+segments into a spool file next to the upload (computing its stats on
+the way) and returns a small database.TextFile, which is copied into
+SQLite block by block and then deleted.
+"""
+
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import database
+from jobs import JobCancelled, get_job_registry
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+# Documents committed per database transaction
+COMMIT_BATCH_SIZE = 20
+
+
+def classify_upload(filename):
+    """Return (source_type, uses_ocr) for an uploaded file name."""
+    lower = filename.lower()
+    if lower.endswith(IMAGE_EXTENSIONS):
+        return "image", True
+    if lower.endswith(".pdf"):
+        return "pdf", True
+    return "file", False
+
+
+def _strip_segments(segments):
+    """The segments of "".join(segments).strip(), without joining them."""
+    started, held = False, ""
+    for segment in segments:
+        if not started:
+            segment = segment.lstrip()
+            started = bool(segment)
+        if not segment:
+            continue
+        body = segment.rstrip()
+        if body:
+            yield held + body
+            held = ""
+        held += segment[len(body):]
+
+
+def _pdf_segments(path):
+    """
+    OCR'd pages of a PDF, or the DocumentIngestor text when OCR finds
+    nothing. Pages are OCR'd in this worker: the pipeline pool already
+    uses every core, a per-file pool would oversubscribe them.
+    """
+    from document_ingestor import DocumentIngestor
+    from ocr_utils import iter_pdf_pages
+
+    found = False
+    try:
+        for segment in _strip_segments(iter_pdf_pages(path, workers=1)):
+            found = True
+            yield segment
+    except Exception:
+        if found:
+            raise
+    if not found:
+        yield from DocumentIngestor().iter_segments(path)
+
+
+def extract_file(path):
+    """
+    Extract text from one saved upload into a spool file. Runs inside a
+    pool worker, so it only takes and returns picklable values:
+    (source_type, path, database.TextFile).
+    """
+    from document_ingestor import DocumentIngestor
+    from ocr_utils import extract_text_from_image
+
+    source_type, _ = classify_upload(path)
+
+    if source_type == "image":
+        # Images → OCR (one page of text)
+        with open(path, "rb") as f:
+            segments = [extract_text_from_image(f.read())]
+    elif source_type == "pdf":
+        # PDF → OCR or fallback
+        segments = _pdf_segments(path)
+    else:
+        # TXT / DOCX / other
+        segments = DocumentIngestor().iter_segments(path)
+
+    fd, spool_path = tempfile.mkstemp(dir=os.path.dirname(path) or None, suffix=".tmp")
+    os.close(fd)
+    try:
+        return source_type, path, database.spool_text(segments, spool_path)
+    except BaseException:
+        _discard(spool_path)
+        raise
+
+
+def _discard(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _discard_result(future):
+    """Done callback: delete the spool file of a result nobody will commit."""
+    if not future.cancelled() and future.exception() is None:
+        _discard(future.result()[2].path)
+
+
+class IngestPipeline:
+    """
+    Runs extract_file over a bounded process pool and commits results in
+    batches. Jobs are queued and tracked in the shared JobRegistry.
+    """
+
+    def __init__(self, max_workers=None, batch_size=COMMIT_BATCH_SIZE):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # At most two tasks per worker are queued at once across all jobs
+        self._slots = threading.BoundedSemaphore(self.max_workers * 2)
+
+        self.jobs = get_job_registry()
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                # spawn: forking a process that already loaded torch can hang
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def close(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+    def get_job(self, job_id):
+        return self.jobs.get(job_id)
+
+    def submit(self, paths, sources=None, skipped=None):
+        """
+        Queue saved files for ingestion and return the new job id.
+        sources maps a path to its document source columns, plus
+        "replace": the id of a document to re-ingest into. skipped holds
+        results for files that need no work (duplicates); they are
+        recorded on the job when it starts.
+        """
+        skipped = list(skipped or [])
+        payload = {"paths": list(paths), "sources": dict(sources or {}), "skipped": skipped}
+        return self.jobs.enqueue("ingest", payload, total=len(paths) + len(skipped))
+
+    def run(self, job_id, paths, sources, skipped=()):
+        """Ingest the files of a job (called by the worker running it)."""
+        if skipped:
+            self.jobs.add_results(job_id, list(skipped))
+        # Only duplicates were submitted: no need to start the pool
+        executor = self._get_executor() if paths else None
+
+        queued = deque(paths)
+        in_flight = {}      # future -> path
+        pending = []        # extracted documents not committed yet
+        try:
+            while queued or in_flight:
+                self.jobs.check_cancelled(job_id)
+
+                # Submit while slots are free; block for one only when idle
+                while queued and self._slots.acquire(blocking=not in_flight):
+                    path = queued.popleft()
+                    try:
+                        future = executor.submit(extract_file, path)
+                    except Exception as e:
+                        self._slots.release()
+                        self.jobs.add_errors(job_id, [_error(path, e)])
+                        continue
+                    future.add_done_callback(lambda _: self._slots.release())
+                    in_flight[future] = path
+                if not in_flight:
+                    continue
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    # Drop the future: from here only pending holds its text
+                    path = in_flight.pop(future)
+                    try:
+                        source_type, path, text = future.result()
+                        pending.append((source_type, path, text, None))
+                    except Exception as e:
+                        self.jobs.add_errors(job_id, [_error(path, e)])
+
+                if len(pending) >= self.batch_size:
+                    self._commit(job_id, pending, sources)
+                    pending = []
+        except JobCancelled:
+            for future in in_flight:
+                if not future.cancel():
+                    future.add_done_callback(_discard_result)
+            raise
+        finally:
+            # Extracted texts are kept even when the job is cancelled
+            if pending:
+                self._commit(job_id, pending, sources)
+
+        self.jobs.finish(job_id)
+
+    def _commit(self, job_id, rows, sources):
+        """
+        Store a batch: re-ingests update their document, texts already
+        stored (or repeated within the batch) are reported as duplicates,
+        the rest are inserted in one transaction. The spool files of the
+        batch are deleted afterwards.
+        """
+        try:
+            self._store(job_id, rows, sources)
+        finally:
+            for row in rows:
+                _discard(row[2].path)
+
+    def _store(self, job_id, rows, sources):
+        results, inserts = [], []
+        batch_dups = []     # (result, index into inserts of the same text)
+        seen = {}           # content hash -> index into inserts
+        try:
+            for source_type, path, text, summary in rows:
+                source = dict(sources.get(path) or {})
+                replace_id = source.pop("replace", None)
+                if replace_id is not None:
+                    database.update_document(replace_id, text, source)
+                    results.append(_result(path, source_type, replace_id, "updated"))
+                    continue
+
+                text_hash = text.content_hash
+                stored = database.find_document("content_hash", text_hash)
+                if stored is not None:
+                    results.append(_result(path, source_type, stored["id"], "duplicate"))
+                elif text_hash in seen:
+                    batch_dups.append((_result(path, source_type, None, "duplicate"),
+                                       seen[text_hash]))
+                else:
+                    seen[text_hash] = len(inserts)
+                    inserts.append((source_type, path, text, summary, source))
+
+            doc_ids = database.add_documents_many(inserts)
+        except Exception as e:
+            self.jobs.add_errors(job_id, [_error(r[1], e) for r in rows])
+            return
+
+        for result, index in batch_dups:
+            result["doc_id"] = doc_ids[index]
+            results.append(result)
+        results.extend(_result(row[1], row[0], doc_id, "added")
+                       for row, doc_id in zip(inserts, doc_ids))
+        self.jobs.add_results(job_id, results)
+
+
+def _result(path, source_type, doc_id, status):
+    return {"file": os.path.basename(path), "type": source_type,
+            "doc_id": doc_id, "status": status}
+
+
+def _error(path, exc):
+    return {"file": os.path.basename(path), "error": str(exc)}
+
+
+# ----------------------------------------------------
+# Process-wide instance
+# ----------------------------------------------------
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline():
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = IngestPipeline()
+        return _pipeline
@@ -0,0 +1,124 @@
+"""
+Durable queue of background jobs (ingestion, crawling, summarization,
+reindexing, ...), stored in SQLite so any process can enqueue a job or
+read its status.
+
+Web processes only enqueue jobs and serve their status (/jobs/<id>);
+worker processes (worker.py) claim them in priority order and run them.
+A job whose handler raises is retried with exponential backoff up to
+its max attempts; a running job can be cancelled and stops at its next
+check_cancelled() call.
+
+Jobs are returned as plain dicts so they can be served as JSON.
+"""
+
+import threading
+import uuid
+
+import database
+from config import JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS
+
+# Finished jobs are kept this long for status polling
+JOB_TTL_SECONDS = 3600
+
+# Higher runs first. Interactive work (uploads, single URLs) goes ahead
+# of bulk runs; index work goes ahead of both since search waits on it.
+JOB_PRIORITIES = {
+    "reindex": 30,
+    "index_sync": 30,
+    "ingest": 20,
+    "fetch_url": 20,
+    "crawl": 10,
+    "analyze": 0,
+    "summarize": 0,
+}
+
+
+class JobCancelled(Exception):
+    """Raised inside a job handler when the job was cancelled."""
+
+
+class JobRegistry:
+    def __init__(self, ttl_seconds=JOB_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+
+    # -----------------------------
+    # Enqueueing / status
+    # -----------------------------
+    def enqueue(self, kind, payload=None, total=0, priority=None, max_attempts=None,
+                unique=False):
+        """
+        Queue a job and return its id. With unique=True an already queued
+        or running job of the same kind is returned instead.
+        """
+        database.prune_jobs(self.ttl_seconds)
+        if unique:
+            active = database.find_active_job(kind)
+            if active is not None:
+                return active
+
+        job_id = uuid.uuid4().hex
+        database.create_job(
+            job_id, kind, payload or {},
+            priority=JOB_PRIORITIES.get(kind, 0) if priority is None else priority,
+            max_attempts=max_attempts or JOB_MAX_ATTEMPTS,
+            total=total,
+        )
+        return job_id
+
+    def get(self, job_id):
+        """Return the job status dict, or None."""
+        return database.get_job(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a job; returns its status afterwards, or None if unknown."""
+        return database.cancel_job(job_id)
+
+    # -----------------------------
+    # Progress, reported by handlers
+    # -----------------------------
+    def update(self, job_id, **fields):
+        database.update_job(job_id, **fields)
+
+    def add_results(self, job_id, results):
+        database.add_job_results(job_id, results, [])
+
+    def add_errors(self, job_id, errors):
+        database.add_job_results(job_id, [], errors)
+
+    def finish(self, job_id, status=None, error=None):
+        """Mark the job done (or failed if nothing succeeded)."""
+        database.finish_job(job_id, status, error)
+
+    def cancelled(self, job_id):
+        """True if cancelling job_id was requested."""
+        return bool(job_id) and database.job_cancel_requested(job_id)
+
+    def check_cancelled(self, job_id):
+        """Raise JobCancelled if cancelling job_id was requested."""
+        if self.cancelled(job_id):
+            raise JobCancelled(job_id)
+
+    # -----------------------------
+    # Workers
+    # -----------------------------
+    def claim(self, worker, lease_seconds=JOB_LEASE_SECONDS):
+        return database.claim_job(worker, lease_seconds)
+
+    def renew(self, job_id, worker, lease_seconds=JOB_LEASE_SECONDS):
+        return database.renew_job_lease(job_id, worker, lease_seconds)
+
+    def retry(self, job_id, delay_seconds, error):
+        database.retry_job(job_id, delay_seconds, error)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_job_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = JobRegistry()
+        return _registry
@@ -0,0 +1,67 @@
+"""
+Keyword retrieval over the chunk_fts table and fusion with dense results.
+
+Queries are turned into an FTS5 expression in which every whitespace
+separated term is a quoted phrase, OR'ed together: identifiers such as
+"ERR-404" or "AB12.7" then match as exact token sequences, and user
+input can never produce an FTS syntax error. Ranking is SQLite's
+built-in BM25, served from the inverted index (no table scan).
+"""
+
+import re
+
+import database
+from config import HYBRID_DENSE_WEIGHT, RRF_K
+
+_TERM_RE = re.compile(r"[^\s\"]+")
+_WORD_RE = re.compile(r"\w")
+
+
+def build_match_query(query):
+    """FTS5 MATCH expression for a free-text query ("" if nothing to match)."""
+    terms = [t for t in _TERM_RE.findall(query) if _WORD_RE.search(t)]
+    return " OR ".join(f'"{t}"' for t in dict.fromkeys(terms))
+
+
+def search(query, limit):
+    """Return up to limit (vector_id, bm25 score) pairs, best first."""
+    return database.search_keyword_chunks(build_match_query(query), limit)
+
+
+# -----------------------------
+# Fusion
+# -----------------------------
+def reciprocal_rank_fusion(rankings, k=None):
+    """
+    Fuse ranked lists of (id, score) pairs: each id scores the sum of
+    1 / (k + rank) over the lists it appears in. Returns (id, score)
+    pairs, best first.
+    """
+    k = RRF_K if k is None else k
+    fused = {}
+    for ranking in rankings:
+        for rank, (item_id, _) in enumerate(ranking, start=1):
+            fused[item_id] = fused.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda pair: pair[1], reverse=True)
+
+
+def weighted_fusion(dense, keyword, dense_weight=None):
+    """
+    Fuse dense and keyword (id, score) lists by min-max normalizing each
+    list's scores and mixing them with dense_weight / (1 - dense_weight).
+    """
+    dense_weight = HYBRID_DENSE_WEIGHT if dense_weight is None else dense_weight
+    fused = {}
+    for ranking, weight in ((dense, dense_weight), (keyword, 1.0 - dense_weight)):
+        for item_id, score in _min_max(ranking):
+            fused[item_id] = fused.get(item_id, 0.0) + weight * score
+    return sorted(fused.items(), key=lambda pair: pair[1], reverse=True)
+
+
+def _min_max(ranking):
+    if not ranking:
+        return []
+    scores = [score for _, score in ranking]
+    low, high = min(scores), max(scores)
+    span = high - low
+    return [(item_id, (score - low) / span if span else 1.0) for item_id, score in ranking]
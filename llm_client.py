@@ -0,0 +1,324 @@
+"""
+Shared LLM client used by rag_qa, rag_multi_qa and simple_qa.
+
+One client (and one underlying connection pool) per process, with:
+- sync (generate / stream) and asyncio (agenerate / astream) call styles
+- a cap on in-flight requests: a threading semaphore for sync callers,
+  an asyncio.Semaphore of the same size (per event loop) for async ones
+- retries with exponential backoff and full jitter on rate limits
+- pluggable backends: Gemini (google-genai) or a plain HTTP server,
+  which is what tests point at through LLM_BACKEND_URL
+- JSON-mode completions (generate_json), optionally constrained to a
+  response schema
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+import weakref
+
+from config import (
+    GEMINI_API_KEY,
+    GEMINI_MODEL,
+    LLM_BACKEND_URL,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_RETRIES,
+)
+
+# Backoff: sleep uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2**attempt))
+BASE_BACKOFF = 0.5
+MAX_BACKOFF = 20.0
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+RETRYABLE_MARKERS = ("429", "RESOURCE_EXHAUSTED", "rate limit", "UNAVAILABLE")
+
+
+class LLMError(RuntimeError):
+    """Raised when the backend fails after all retries."""
+
+
+def is_retryable(exc):
+    """True for rate-limit / transient server errors worth retrying."""
+    for attr in ("code", "status_code", "status"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int) and value in RETRYABLE_STATUS:
+            return True
+    message = str(exc)
+    return any(marker.lower() in message.lower() for marker in RETRYABLE_MARKERS)
+
+
+def configuration_error():
+    """Empty string if a backend is configured, else the error to show."""
+    if not GEMINI_API_KEY and not LLM_BACKEND_URL:
+        return (
+            "Gemini API key is not configured. "
+            "Set GEMINI_API_KEY or GOOGLE_API_KEY in your environment."
+        )
+    return ""
+
+
+def backoff_delay(attempt):
+    return random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * (2 ** attempt)))
+
+
+def parse_json(text):
+    """Parse a JSON completion, tolerating a surrounding ```json fence."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    return json.loads(text)
+
+
+# ----------------------------------------------------
+# Backends
+# ----------------------------------------------------
+class GeminiBackend:
+    """google-genai backend; the Client keeps its HTTP connections pooled."""
+
+    def __init__(self, api_key=None, model=None):
+        from google import genai
+
+        self.model = model or GEMINI_MODEL
+        self.client = genai.Client(api_key=api_key or GEMINI_API_KEY)
+
+    def generate(self, prompt):
+        response = self.client.models.generate_content(model=self.model, contents=prompt)
+        return getattr(response, "text", "") or ""
+
+    def generate_json(self, prompt, schema=None):
+        config = {"response_mime_type": "application/json"}
+        if schema is not None:
+            config["response_schema"] = schema
+        response = self.client.models.generate_content(model=self.model, contents=prompt,
+                                                       config=config)
+        return getattr(response, "text", "") or ""
+
+    def stream(self, prompt):
+        for chunk in self.client.models.generate_content_stream(model=self.model,
+                                                                contents=prompt):
+            text = getattr(chunk, "text", "")
+            if text:
+                yield text
+
+    async def agenerate(self, prompt):
+        response = await self.client.aio.models.generate_content(model=self.model,
+                                                                 contents=prompt)
+        return getattr(response, "text", "") or ""
+
+    async def astream(self, prompt):
+        async for chunk in await self.client.aio.models.generate_content_stream(
+                model=self.model, contents=prompt):
+            text = getattr(chunk, "text", "")
+            if text:
+                yield text
+
+
+class HttpBackend:
+    """
+    Minimal JSON-over-HTTP backend, e.g. a local fake server in tests:
+        POST {base_url}/generate  {"model", "prompt"}           -> {"text"}
+        POST {base_url}/stream    {"model", "prompt"}           -> NDJSON {"text"} lines
+    JSON-mode requests add "response_mime_type" and "response_schema".
+    Non-2xx responses raise an error carrying status_code.
+    """
+
+    def __init__(self, base_url, model=None, timeout=60):
+        import requests
+
+        self.base_url = base_url.rstrip("/")
+        self.model = model or GEMINI_MODEL
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _post(self, path, prompt, stream=False, **fields):
+        response = self.session.post(
+            f"{self.base_url}/{path}",
+            json={"model": self.model, "prompt": prompt, **fields},
+            timeout=self.timeout,
+            stream=stream,
+        )
+        response.raise_for_status()
+        return response
+
+    def generate(self, prompt):
+        return self._post("generate", prompt).json().get("text", "")
+
+    def generate_json(self, prompt, schema=None):
+        return self._post("generate", prompt, response_mime_type="application/json",
+                          response_schema=schema).json().get("text", "")
+
+    def stream(self, prompt):
+        with self._post("stream", prompt, stream=True) as response:
+            for line in response.iter_lines():
+                if line:
+                    text = json.loads(line).get("text", "")
+                    if text:
+                        yield text
+
+    async def agenerate(self, prompt):
+        return await asyncio.to_thread(self.generate, prompt)
+
+    async def astream(self, prompt):
+        # A thread drives the blocking stream and hands each piece over as
+        # it arrives; (None, error) marks the end
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        stop = threading.Event()
+
+        def pump():
+            error = None
+            try:
+                for text in self.stream(prompt):
+                    if stop.is_set():
+                        return
+                    loop.call_soon_threadsafe(queue.put_nowait, (text, None))
+            except Exception as e:
+                error = e
+            if not stop.is_set():
+                loop.call_soon_threadsafe(queue.put_nowait, (None, error))
+
+        threading.Thread(target=pump, name="llm-astream", daemon=True).start()
+        try:
+            while True:
+                text, error = await queue.get()
+                if text is None:
+                    if error is not None:
+                        raise error
+                    return
+                yield text
+        finally:
+            stop.set()  # the caller stopped early: drop the rest
+
+
+def make_default_backend():
+    if LLM_BACKEND_URL:
+        return HttpBackend(LLM_BACKEND_URL)
+    return GeminiBackend()
+
+
+# ----------------------------------------------------
+# Client
+# ----------------------------------------------------
+class LLMClient:
+    def __init__(self, backend=None, max_concurrency=None, max_retries=None):
+        self._backend = backend
+        self._backend_lock = threading.Lock()
+        self.max_retries = LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.max_concurrency = max_concurrency or LLM_MAX_CONCURRENCY
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        # asyncio.Semaphore is bound to one event loop, so one per loop
+        self._async_slots = weakref.WeakKeyDictionary()
+        self._async_slots_lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    self._backend = make_default_backend()
+        return self._backend
+
+    # -----------------------------
+    # Sync
+    # -----------------------------
+    def _call(self, method, *args):
+        for attempt in range(self.max_retries + 1):
+            with self._slots:
+                try:
+                    return method(*args)
+                except Exception as e:
+                    if attempt == self.max_retries or not is_retryable(e):
+                        raise LLMError(str(e)) from e
+            time.sleep(backoff_delay(attempt))
+
+    def generate(self, prompt):
+        """Return the full completion text for prompt."""
+        return self._call(self.backend.generate, prompt)
+
+    def generate_json(self, prompt, schema=None):
+        """
+        Return the parsed JSON completion for prompt, constrained to schema
+        (a Gemini / OpenAPI-style schema dict) when given. Raises LLMError
+        if the backend fails, ValueError if the reply is not valid JSON.
+        """
+        return parse_json(self._call(self.backend.generate_json, prompt, schema))
+
+    def stream(self, prompt):
+        """
+        Yield completion text pieces. Retries only happen before the first
+        piece has been yielded, so callers never see duplicated text.
+        """
+        for attempt in range(self.max_retries + 1):
+            started = False
+            with self._slots:
+                try:
+                    for text in self.backend.stream(prompt):
+                        started = True
+                        yield text
+                    return
+                except Exception as e:
+                    if started or attempt == self.max_retries or not is_retryable(e):
+                        raise LLMError(str(e)) from e
+            time.sleep(backoff_delay(attempt))
+
+    # -----------------------------
+    # Async
+    # -----------------------------
+    def _loop_slots(self):
+        loop = asyncio.get_running_loop()
+        with self._async_slots_lock:
+            slots = self._async_slots.get(loop)
+            if slots is None:
+                slots = self._async_slots[loop] = asyncio.Semaphore(self.max_concurrency)
+            return slots
+
+    async def agenerate(self, prompt):
+        for attempt in range(self.max_retries + 1):
+            async with self._loop_slots():
+                try:
+                    return await self.backend.agenerate(prompt)
+                except Exception as e:
+                    if attempt == self.max_retries or not is_retryable(e):
+                        raise LLMError(str(e)) from e
+            await asyncio.sleep(backoff_delay(attempt))
+
+    async def astream(self, prompt):
+        for attempt in range(self.max_retries + 1):
+            started = False
+            async with self._loop_slots():
+                try:
+                    async for text in self.backend.astream(prompt):
+                        started = True
+                        yield text
+                    return
+                except Exception as e:
+                    if started or attempt == self.max_retries or not is_retryable(e):
+                        raise LLMError(str(e)) from e
+            await asyncio.sleep(backoff_delay(attempt))
+
+
+# ----------------------------------------------------
+# Process-wide instance
+# ----------------------------------------------------
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide LLMClient."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient()
+        return _client
+
+
+def set_backend(backend):
+    """Swap the backend of the shared client (tests, alternative providers)."""
+    global _client
+    with _client_lock:
+        _client = LLMClient(backend=backend)
+        return _client
@@ -1,11 +1,30 @@
-import fitz  # PyMuPDF for scanned PDF fallback
-import pytesseract
-from PIL import Image
 import io
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from config import OCR_DPI, OCR_GRAYSCALE, OCR_WORKERS
+
+# Pages whose embedded text layer has fewer characters than this are OCR'd
+MIN_TEXT_LAYER_CHARS = 20
+
+# PyMuPDF, pytesseract and Pillow are imported on first use (see
+# _ocr_libs) so importing this module is free until OCR actually runs.
+
+
+def _ocr_libs():
+    """Return (fitz, pytesseract, PIL.Image), importing them lazily."""
+    import fitz  # PyMuPDF for scanned PDF fallback
+    import pytesseract
+    from PIL import Image
+
+    return fitz, pytesseract, Image
 
 
 def extract_text_from_image(image_bytes):
     try:
+        _, pytesseract, Image = _ocr_libs()
         img = Image.open(io.BytesIO(image_bytes))
         text = pytesseract.image_to_string(img)
         return text.strip()
@@ -13,18 +32,110 @@ def extract_text_from_image(image_bytes):
         return f"[OCR_IMAGE_ERROR] {e}"
 
 
-def extract_text_from_scanned_pdf(path):
-    try:
-        doc = fitz.open(path)
-        text = ""
+def _ocr_pdf_page(path, page_number, dpi, grayscale):
+    """
+    Render one PDF page and OCR it. Runs in a worker process, so it
+    reopens the document instead of receiving an unpicklable page.
+    """
+    fitz, pytesseract, Image = _ocr_libs()
+    with fitz.open(path) as doc:
+        page = doc[page_number]
+        colorspace = fitz.csGRAY if grayscale else fitz.csRGB
+        pix = page.get_pixmap(dpi=dpi, colorspace=colorspace, alpha=False)
+
+    # Raw samples avoid a PNG encode/decode round trip per page
+    mode = "L" if grayscale else "RGB"
+    img = Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+    return pytesseract.image_to_string(img)
+
+
+def iter_pdf_pages(path, dpi=None, grayscale=None, workers=None,
+                   min_text_chars=MIN_TEXT_LAYER_CHARS):
+    """
+    Yield the text of a PDF page by page, in order:
+    - pages with a usable PyMuPDF text layer are taken as-is
+    - only pages without one are rendered and OCR'd, in parallel processes
+
+    At most two OCR pages per worker are in flight, so memory stays bounded
+    however many pages the document has. Every page after the first is
+    prefixed with a newline, so "".join() gives the newline-joined text.
+    """
+    import fitz
 
-        for page in doc:
-            pix = page.get_pixmap()
-            img_bytes = pix.tobytes("png")
-            img = Image.open(io.BytesIO(img_bytes))
-            text += pytesseract.image_to_string(img) + "\n"
+    dpi = dpi or OCR_DPI
+    grayscale = OCR_GRAYSCALE if grayscale is None else grayscale
+    workers = workers or OCR_WORKERS or os.cpu_count() or 1
 
+    executor = None
+    pending = deque()  # (page text layer, OCR future or None), in page order
+
+    def resolve(text, future):
+        # A page whose OCR fails keeps whatever text layer it had
+        if future is not None:
+            try:
+                text = future.result()
+            except Exception:
+                pass
         return text.strip()
 
+    def ocr_inline(page_number, text):
+        try:
+            return _ocr_pdf_page(path, page_number, dpi, grayscale)
+        except Exception:
+            return text
+
+    first = True
+    try:
+        with fitz.open(path) as doc:
+            for page_number in range(len(doc)):
+                text = doc[page_number].get_text()
+                future = None
+                if len(text.strip()) < min_text_chars:
+                    if workers == 1:
+                        text = ocr_inline(page_number, text)
+                    else:
+                        if executor is None:
+                            # spawn: forking a threaded caller can deadlock.
+                            # (The ingest pipeline passes workers=1.)
+                            executor = ProcessPoolExecutor(
+                                max_workers=workers,
+                                mp_context=multiprocessing.get_context("spawn"))
+                        future = executor.submit(_ocr_pdf_page, path, page_number,
+                                                 dpi, grayscale)
+                pending.append((text, future))
+
+                # Emit finished pages from the front; block once the window is full
+                while pending and (pending[0][1] is None or pending[0][1].done()
+                                   or len(pending) > workers * 2):
+                    page_text = resolve(*pending.popleft())
+                    yield page_text if first else "\n" + page_text
+                    first = False
+
+        while pending:
+            page_text = resolve(*pending.popleft())
+            yield page_text if first else "\n" + page_text
+            first = False
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def extract_text_from_pdf(path, dpi=None, grayscale=None, workers=None,
+                          min_text_chars=MIN_TEXT_LAYER_CHARS):
+    """
+    Extract text from a PDF (see iter_pdf_pages). dpi / grayscale / workers
+    default to OCR_DPI / OCR_GRAYSCALE / OCR_WORKERS from config. Returns
+    the page texts joined by newlines.
+    """
+    return "".join(iter_pdf_pages(path, dpi, grayscale, workers, min_text_chars)).strip()
+
+
+def extract_text_from_scanned_pdf(path, workers=None):
+    """
+    OCR fallback for PDFs; pages that already have a text layer skip OCR.
+    Pass workers=1 from inside a process pool to OCR pages in-process.
+    """
+    try:
+        return extract_text_from_pdf(path, workers=workers)
     except Exception as e:
         return f"[OCR_PDF_ERROR] {e}"
@@ -1,11 +1,50 @@
-import faiss
+import threading
+import time
+
 import numpy as np
-from sentence_transformers import SentenceTransformer
 
+import chunking
 import database  # <-- required for loading docs
+from ann_index import build_index, l2_to_similarity, search_index
+from config import (
+    MIN_SIMILARITY,
+    MMR_LAMBDA,
+    RERANK_BATCH_SIZE,
+    RERANK_BUDGET_MS,
+    RERANK_CANDIDATES,
+    RERANK_MODEL,
+    RERANKER,
+    SEARCH_MODE,
+    VECTOR_DTYPE,
+)
+from embedding_cache import encode_cached
+from embedding_service import get_embedding_service
+
+# Heavy dependencies (torch via sentence-transformers, faiss) are loaded on
+# first use so importing this module stays cheap for pages that never search.
+def get_embedder():
+    """Return the in-process SentenceTransformer, loading it on first call."""
+    return get_embedding_service().get_model()
+
+
+def embed_texts(texts, doc_id=None, first_chunk_id=0):
+    """Embed texts, reusing cached vectors for chunks seen before."""
+    service = get_embedding_service()
+    return encode_cached(texts, service.encode, service.model_key,
+                         doc_id=doc_id, first_chunk_id=first_chunk_id)
+
 
-# Global embedder
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
+def embed_query(query):
+    """Embed a single query string as a (1, dim) float32 matrix."""
+    return get_embedding_service().encode_query(query)
+
+
+def chunk_text(text, max_chars=500, **options):
+    """
+    Split text into chunks of at most max_chars characters (see chunking
+    for the strategies and options). Returns the chunk strings.
+    """
+    return [c.text for c in chunking.chunk_text(text, max_chars=max_chars, **options)]
 
 
 # -----------------------------
@@ -16,58 +55,66 @@ class VectorStore:
         self.chunks = []
         self.metadatas = []
         self.index = None
+        self.index_type = None
 
-    def add_document(self, text, source_name, max_chars=500):
+    def add_document(self, text, source_name, max_chars=500, doc_id=None):
         """Chunk and store text from a document."""
-        chunk_list = self._chunk_text(text, max_chars)
+        chunk_list = chunking.chunk_text(text, max_chars=max_chars)
 
         for i, chunk in enumerate(chunk_list):
-            self.chunks.append(chunk)
+            self.chunks.append(chunk.text)
             self.metadatas.append({
                 "source": source_name,
-                "chunk_id": i
+                "doc_id": doc_id,
+                "chunk_id": i,
+                "start": chunk.start,
+                "end": chunk.end,
             })
 
     def _chunk_text(self, text, max_chars=500):
         """Split text into multiple chunks."""
-        chunks = []
-        current = ""
+        return chunk_text(text, max_chars)
 
-        for line in text.split("\n"):
-            if len(current) + len(line) < max_chars:
-                current += line + "\n"
-            else:
-                chunks.append(current.strip())
-                current = line + "\n"
-
-        if current.strip():
-            chunks.append(current.strip())
-
-        return chunks
-
-    def build(self):
+    def build(self, index_type="auto"):
+        """
+        Embed all chunks and build the index. index_type is one of
+        "auto", "flat", "ivf_flat", "ivf_pq" or "hnsw" (see ann_index).
+        """
         if not self.chunks:
             raise ValueError("No chunks to index.")
 
-        embeddings = embedder.encode(self.chunks)
-        embeddings = np.array(embeddings).astype("float32")
+        embeddings = embed_texts(self.chunks)
+        self.index, self.index_type = build_index(index_type, embeddings,
+                                                   vector_dtype=VECTOR_DTYPE)
 
-        dim = embeddings.shape[1]
-        self.index = faiss.IndexFlatL2(dim)
-        self.index.add(embeddings)
-
-    def search(self, query, top_k=5):
+    def search(self, query, top_k=5, nprobe=None, ef_search=None, min_similarity=None):
+        """
+        Return up to top_k closest chunks as {"text", "score", "meta"},
+        score being the cosine similarity; chunks below min_similarity
+        (default MIN_SIMILARITY) are dropped. nprobe (IVF) and ef_search
+        (HNSW) trade latency for recall; None keeps the index defaults.
+        """
         if self.index is None:
             raise RuntimeError("Index not built.")
+        min_similarity = MIN_SIMILARITY if min_similarity is None else min_similarity
 
-        query_embed = embedder.encode([query]).astype("float32")
-        distances, indices = self.index.search(query_embed, top_k)
+        query_embed = embed_query(query)
+        distances, indices = search_index(self.index, query_embed,
+                                          min(top_k, len(self.chunks)),
+                                          nprobe=nprobe, ef_search=ef_search)
 
         results = []
-        for idx in indices[0]:
+        for distance, idx in zip(distances[0], indices[0]):
+            # FAISS pads with -1 when fewer than top_k vectors are reachable
+            if idx < 0:
+                continue
+            similarity = l2_to_similarity(distance)
+            if similarity < min_similarity:
+                continue
             results.append({
                 "text": self.chunks[idx],
-                "meta": self.metadatas[idx]
+                "score": similarity,
+                "meta": dict(self.metadatas[idx], similarity=similarity),
             })
 
         return results
@@ -95,7 +142,7 @@ def build_vector_store_from_db():
         if not raw_text:
             continue
 
-        vs.add_document(raw_text, source_name=path_or_url)
+        vs.add_document(raw_text, source_name=path_or_url, doc_id=doc_id)
         all_texts.append(raw_text)
 
     if not vs.chunks:
@@ -106,17 +153,182 @@ def build_vector_store_from_db():
 
 
 # ----------------------------------------------------
-# NEW: General RAG Query Helper
+# Re-ranking stage
 # ----------------------------------------------------
-def run_rag_query(question, top_k=4):
+class RerankTimeout(Exception):
+    """Raised by a reranker that ran past its deadline."""
+
+
+class Reranker:
     """
-    Runs a question against vector DB.
-    Returns retrieved_chunks.
+    Base class of the second retrieval stage. rerank() gets the candidate
+    hits in search order and returns the best top_k in a new order; it
+    must raise RerankTimeout once time.perf_counter() passes deadline.
+    """
+
+    name = "none"
+
+    def rerank(self, query, hits, top_k, deadline, query_vector=None):
+        return hits[:top_k]
+
+
+class MMRReranker(Reranker):
+    """
+    Maximal marginal relevance over the candidates' embeddings (served
+    from the embedding cache): trades relevance against redundancy with
+    lambda_ (1.0 = pure relevance).
     """
-    vs, _ = build_vector_store_from_db()
 
-    if vs is None:
+    name = "mmr"
+
+    def __init__(self, lambda_=None):
+        self.lambda_ = MMR_LAMBDA if lambda_ is None else lambda_
+
+    def rerank(self, query, hits, top_k, deadline, query_vector=None):
+        if len(hits) <= 1:
+            return hits[:top_k]
+        if query_vector is None:
+            query_vector = embed_query(query)
+
+        vectors = _unit_rows(embed_texts([h["text"] for h in hits]))
+        query_vector = _unit_rows(np.asarray(query_vector, dtype="float32").reshape(1, -1))[0]
+        relevance = vectors @ query_vector
+        similarity = vectors @ vectors.T
+
+        selected = []
+        remaining = list(range(len(hits)))
+        while remaining and len(selected) < top_k:
+            if time.perf_counter() > deadline:
+                raise RerankTimeout()
+            if selected:
+                redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+            else:
+                redundancy = np.zeros(len(remaining), dtype="float32")
+            scores = self.lambda_ * relevance[remaining] - (1 - self.lambda_) * redundancy
+            best = int(np.argmax(scores))
+            selected.append(remaining.pop(best))
+            hits[selected[-1]]["meta"]["rerank_score"] = float(scores[best])
+
+        return [hits[i] for i in selected]
+
+
+class CrossEncoderReranker(Reranker):
+    """
+    Scores (query, chunk) pairs with a local sentence-transformers
+    CrossEncoder on CPU, batch_size pairs at a time, checking the deadline
+    between batches. The model is loaded on first use.
+    """
+
+    name = "cross_encoder"
+
+    def __init__(self, model_name=None, batch_size=None):
+        self.model_name = model_name or RERANK_MODEL
+        self.batch_size = batch_size or RERANK_BATCH_SIZE
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    def get_model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name, device="cpu")
+        return self._model
+
+    def rerank(self, query, hits, top_k, deadline, query_vector=None):
+        model = self.get_model()
+        scores = []
+        for start in range(0, len(hits), self.batch_size):
+            if time.perf_counter() > deadline:
+                raise RerankTimeout()
+            batch = hits[start:start + self.batch_size]
+            scores.extend(model.predict([(query, h["text"]) for h in batch],
+                                        batch_size=self.batch_size))
+
+        order = sorted(range(len(hits)), key=lambda i: scores[i], reverse=True)[:top_k]
+        for i in order:
+            hits[i]["meta"]["rerank_score"] = float(scores[i])
+        return [hits[i] for i in order]
+
+
+def _unit_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+# name -> factory; register_reranker() plugs in other stages
+RERANKERS = {
+    "none": Reranker,
+    "mmr": MMRReranker,
+    "cross_encoder": CrossEncoderReranker,
+}
+_rerankers = {}
+_rerankers_lock = threading.Lock()
+
+
+def register_reranker(name, factory):
+    """Make a Reranker factory available as RERANKER=<name>."""
+    with _rerankers_lock:
+        RERANKERS[name] = factory
+        _rerankers.pop(name, None)
+
+
+def get_reranker(name=None):
+    """Return the shared Reranker instance for name (default RERANKER)."""
+    name = name or RERANKER
+    with _rerankers_lock:
+        if name not in _rerankers:
+            if name not in RERANKERS:
+                raise ValueError(f"Unknown reranker: {name}")
+            _rerankers[name] = RERANKERS[name]()
+        return _rerankers[name]
+
+
+def retrieve(query, top_k=4, candidates=None, reranker=None, budget_ms=None,
+             query_vector=None):
+    """
+    Two-stage retrieval over the persistent index: fetch `candidates` hits
+    (default RERANK_CANDIDATES), then let the reranker keep the best top_k.
+    If reranking fails or takes longer than budget_ms (default
+    RERANK_BUDGET_MS) the first top_k hits in search order are returned. Each hit's meta
+    records the stage that ordered it under "reranker".
+    """
+    from index_manager import get_index_manager
+
+    manager = get_index_manager()
+    if manager.is_empty():
         return []
 
-    hits = vs.search(question, top_k=top_k)
-    return [h["text"] for h in hits]
+    stage = get_reranker(reranker)
+    candidates = top_k if stage.name == "none" else max(top_k, candidates or RERANK_CANDIDATES)
+    budget_ms = RERANK_BUDGET_MS if budget_ms is None else budget_ms
+
+    # One query embedding serves the dense search and MMR
+    if query_vector is None and (SEARCH_MODE != "keyword" or stage.name == "mmr"):
+        query_vector = embed_query(query)
+    hits = manager.search(query, top_k=candidates, query_vector=query_vector)
+
+    ranked, used = hits[:top_k], "none"
+    if stage.name != "none" and len(hits) > 1:
+        deadline = time.perf_counter() + budget_ms / 1000.0
+        try:
+            ranked = stage.rerank(query, hits, top_k, deadline, query_vector=query_vector)
+            used = stage.name
+        except Exception:
+            pass  # timed out (RerankTimeout) or failed: keep search order
+
+    for hit in ranked:
+        hit["meta"]["reranker"] = used
+    return ranked
+
+
+# ----------------------------------------------------
+# NEW: General RAG Query Helper
+# ----------------------------------------------------
+def run_rag_query(question, top_k=4):
+    """
+    Runs a question against the persistent vector index.
+    Returns retrieved_chunks.
+    """
+    return [h["text"] for h in retrieve(question, top_k=top_k)]
@@ -1,10 +1,7 @@
-from google import genai
-from config import GEMINI_API_KEY, GEMINI_MODEL
+from llm_client import get_client
 
 
 def ask_gemini(chunks, question):
-    client = genai.Client(api_key=GEMINI_API_KEY)
-
     context = ""
     for i, ch in enumerate(chunks, start=1):
         context += f"[Chunk {i} | Source: {ch['meta']['source']}]\n"
@@ -23,9 +20,4 @@ Question: {question}
 If the answer cannot be found in the context, say "Not found".
 """
 
-    response = client.models.generate_content(
-        model=GEMINI_MODEL,
-        contents=prompt
-    )
-
-    return response.text
+    return get_client().generate(prompt)
@@ -1,23 +1,22 @@
-import os
-from typing import List
+from typing import Iterator, List
 
-import google.generativeai as genai
+from llm_client import configuration_error, get_client
 
-# Prefer GEMINI_API_KEY, fall back to GOOGLE_API_KEY if needed
-_API_KEY = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
 
-if _API_KEY:
-    genai.configure(api_key=_API_KEY)
+def _build_prompt(context_chunks: List[str], question: str) -> str:
+    context_text = "\n\n--- Retrieved Context ---\n" + \
+        "\n\n".join(context_chunks)
+
+    return f"""
+You are an AI assistant. Use ONLY the provided context to answer the question.
 
+{context_text}
+
+--- QUESTION ---
+{question}
 
-def _ensure_configured() -> str:
-    """Return empty string if OK, or error message if API key missing."""
-    if not _API_KEY:
-        return (
-            "Gemini API key is not configured. "
-            "Set GEMINI_API_KEY or GOOGLE_API_KEY in your environment."
-        )
-    return ""
+Provide a clear and helpful answer.
+"""
 
 
 def ask_gemini_with_context(context_chunks: List[str], question: str) -> str:
@@ -25,27 +24,48 @@ def ask_gemini_with_context(context_chunks: List[str], question: str) -> str:
     Sends question + retrieved context to Gemini and returns the answer.
     Uses a fast, cheap model for RAG.
     """
-    key_error = _ensure_configured()
+    key_error = configuration_error()
     if key_error:
         return f"Error calling Gemini API: {key_error}"
 
-    context_text = "\n\n--- Retrieved Context ---\n" + \
-        "\n\n".join(context_chunks)
+    prompt = _build_prompt(context_chunks, question)
 
-    prompt = f"""
-You are an AI assistant. Use ONLY the provided context to answer the question.
+    try:
+        answer = get_client().generate(prompt)
+        return answer.strip() or "(No answer returned by model.)"
+    except Exception as e:
+        return f"Error calling Gemini API: {e}"
 
-{context_text}
 
---- QUESTION ---
-{question}
+async def ask_gemini_with_context_async(context_chunks: List[str], question: str) -> str:
+    """asyncio variant of ask_gemini_with_context (same prompt, same errors)."""
+    key_error = configuration_error()
+    if key_error:
+        return f"Error calling Gemini API: {key_error}"
 
-Provide a clear and helpful answer.
-"""
+    prompt = _build_prompt(context_chunks, question)
 
     try:
-        model = genai.GenerativeModel("gemini-2.5-flash")
-        response = model.generate_content(prompt)
-        return getattr(response, "text", "").strip() or "(No answer returned by model.)"
+        answer = await get_client().agenerate(prompt)
+        return answer.strip() or "(No answer returned by model.)"
     except Exception as e:
         return f"Error calling Gemini API: {e}"
+
+
+def stream_gemini_with_context(context_chunks: List[str], question: str) -> Iterator[str]:
+    """
+    Same prompt as ask_gemini_with_context, but yields the answer text
+    piece by piece as Gemini produces it. Errors are yielded as text.
+    """
+    key_error = configuration_error()
+    if key_error:
+        yield f"Error calling Gemini API: {key_error}"
+        return
+
+    prompt = _build_prompt(context_chunks, question)
+
+    try:
+        for text in get_client().stream(prompt):
+            yield text
+    except Exception as e:
+        yield f"Error calling Gemini API: {e}"
@@ -1,6 +1,5 @@
 import os
-from google import genai
-from config import GEMINI_API_KEY, GEMINI_MODEL
+from llm_client import get_client
 
 # PDF/docx libraries
 import fitz  # PyMuPDF for PDFs
@@ -30,8 +29,6 @@ def load_text_from_file(path):
 
 
 def ask_gemini(context_text, question):
-    client = genai.Client(api_key=GEMINI_API_KEY)
-
     prompt = f"""
 You are a question-answering assistant.
 
@@ -45,12 +42,7 @@ If the answer is not found in the document, say "Not found".
 Question: {question}
 """
 
-    response = client.models.generate_content(
-        model=GEMINI_MODEL,
-        contents=prompt
-    )
-
-    return response.text
+    return get_client().generate(prompt)
 
 
 def main():
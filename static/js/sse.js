@@ -0,0 +1,47 @@
+// POST a form and read the Server-Sent Events response as it streams.
+// EventSource only supports GET, so the stream is parsed by hand.
+// handlers: { sources(data), token(data), done(data) } — all optional.
+function postSSE(url, formData, handlers) {
+  return fetch(url, { method: "POST", body: formData }).then(response => {
+    const contentType = response.headers.get("Content-Type") || "";
+    if (!contentType.startsWith("text/event-stream")) {
+      // Validation errors come back as plain JSON
+      return response.json().then(data => {
+        if (handlers.error) handlers.error(data);
+      });
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    function dispatch(block) {
+      let event = "message";
+      const dataLines = [];
+      block.split("\n").forEach(line => {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) dataLines.push(line.slice(5).trim());
+      });
+      if (!dataLines.length || !handlers[event]) return;
+      handlers[event](JSON.parse(dataLines.join("\n")));
+    }
+
+    function pump() {
+      return reader.read().then(({ done, value }) => {
+        if (done) {
+          if (buffer.trim()) dispatch(buffer);
+          return;
+        }
+        buffer += decoder.decode(value, { stream: true });
+        let sep;
+        while ((sep = buffer.indexOf("\n\n")) !== -1) {
+          dispatch(buffer.slice(0, sep));
+          buffer = buffer.slice(sep + 2);
+        }
+        return pump();
+      });
+    }
+
+    return pump();
+  });
+}
@@ -0,0 +1,55 @@
+"""
+Shared fixtures: a throwaway SQLite database per test and a small
+deterministic embedding model in place of sentence-transformers.
+"""
+
+import hashlib
+import os
+import re
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+import embedding_service  # noqa: E402
+
+EMBEDDING_DIM = 64
+
+
+class HashingModel:
+    """
+    Bag-of-words embeddings: each word is hashed to a dimension, so texts
+    sharing words are close and identical texts have similarity 1.0.
+    """
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        vectors = np.zeros((len(texts), EMBEDDING_DIM), dtype="float32")
+        for row, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                digest = hashlib.md5(word.encode("utf-8")).digest()
+                vectors[row, digest[0] % EMBEDDING_DIM] += 1.0
+            norm = np.linalg.norm(vectors[row])
+            vectors[row] = vectors[row] / norm if norm else 1.0 / np.sqrt(EMBEDDING_DIM)
+        return vectors
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """An initialized, empty database file under tmp_path."""
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "documents.db"))
+    monkeypatch.setattr(database, "_change_listeners", [])
+    database.init_db()
+    yield database.DB_PATH
+    database.get_pool().close_all()
+
+
+@pytest.fixture
+def embedder(monkeypatch):
+    """Route every embedding through HashingModel, in-process."""
+    monkeypatch.setattr(embedding_service, "load_model", lambda *args, **kwargs: HashingModel())
+    monkeypatch.setattr(embedding_service, "_service",
+                        embedding_service.EmbeddingService(workers=0))
+    return embedding_service.get_embedding_service()
@@ -0,0 +1,72 @@
+import sqlite3
+
+import pytest
+
+import analysis_utils
+import database
+
+
+@pytest.fixture
+def docs(db):
+    return [database.add_document("file", "a.txt", "apples grow on apple trees in the orchard"),
+            database.add_document("file", "b.txt", "rockets fly rockets to the moon")]
+
+
+def test_local_runs_on_texts_with_an_llm_analysis(docs):
+    first = database.content_hash("apples grow on apple trees in the orchard")
+    database.put_document_analyses([(first, "positive", ["apples"], "llm")])
+
+    results = analysis_utils.analyze_documents(method="local")
+
+    assert sorted(r["id"] for r in results) == docs
+    assert all(r["method"] == "local" and r["keywords"] for r in results)
+    # Both analyses are kept; the LLM one is shown
+    assert database.get_document_analyses([first], "local")[first]["method"] == "local"
+    shown = analysis_utils.get_document_analysis(docs[0])
+    assert (shown["method"], shown["sentiment"]) == ("llm", "positive")
+
+    assert analysis_utils.analyze_documents(method="local") == []
+
+
+def test_old_analysis_table_is_rekeyed(db):
+    database.get_pool().close_all()
+    conn = sqlite3.connect(db)
+    conn.execute("DROP TABLE document_analysis")
+    conn.execute("CREATE TABLE document_analysis (content_hash TEXT PRIMARY KEY, "
+                 "sentiment TEXT, keywords TEXT NOT NULL, method TEXT NOT NULL, "
+                 "created_at TEXT DEFAULT CURRENT_TIMESTAMP)")
+    conn.execute("INSERT INTO document_analysis (content_hash, sentiment, keywords, method) "
+                 "VALUES ('h', 'neutral', '[\"k\"]', 'llm')")
+    conn.commit()
+    conn.close()
+
+    database.init_db()
+    database.put_document_analyses([("h", None, ["local"], "local")])
+
+    assert database.get_document_analyses(["h"], "llm")["h"]["keywords"] == ["k"]
+    assert database.get_document_analyses(["h"], "local")["h"]["keywords"] == ["local"]
+
+
+def test_leading_text_stops_reading_at_the_limit(db, monkeypatch):
+    doc_id = database.add_document("file", "long.txt", "0123456789" * 100)
+    read = []
+    iter_text = database.iter_document_text
+
+    def counting(doc_id):
+        for block in iter_text(doc_id, block_bytes=10):
+            read.append(block)
+            yield block
+
+    monkeypatch.setattr(database, "iter_document_text", counting)
+
+    assert analysis_utils._leading_text(doc_id, limit=25) == ("0123456789" * 3)[:25]
+    assert len(read) == 3
+
+
+def test_doc_id_filter_is_batched(docs, monkeypatch):
+    monkeypatch.setattr(database, "_SQL_BATCH", 1)
+    wanted = [docs[1], docs[0], docs[1], 10_000]
+
+    todo = database.get_documents_without_analysis(("local",), 100, wanted)
+
+    assert [row[0] for row in todo] == sorted(docs)
@@ -0,0 +1,111 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+import database
+from answer_cache import AnswerCache
+
+CHUNKS = [(1, 0), (1, 1)]
+
+
+@pytest.fixture
+def cache(db):
+    return AnswerCache(max_entries=10, ttl_seconds=60, similarity=0.95, model="m")
+
+
+def test_exact_and_semantic_hits(cache):
+    vector = np.array([1.0, 0.0, 0.0])
+    cache.put("What is RAG?", CHUNKS, "answer", vector)
+
+    assert cache.get("what is rag", CHUNKS) == "answer"
+    assert cache.get("Explain RAG", CHUNKS, np.array([0.99, 0.05, 0.0])) == "answer"
+    assert cache.get("Explain RAG", CHUNKS, np.array([0.0, 1.0, 0.0])) is None
+    assert cache.get("What is RAG?", [(2, 0)]) is None
+
+
+def test_entries_expire_in_order_and_are_lru_bounded(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("answer_cache.time.time", lambda: now[0])
+    for i in range(12):
+        cache.put(f"question {i}", CHUNKS, f"answer {i}")
+        now[0] += 1
+    assert cache.stats()["entries"] == 10       # max_entries: 0 and 1 evicted
+
+    assert cache.get("question 2", CHUNKS) == "answer 2"    # used, still expires first
+    now[0] = 1000.0 + 60 + 3.5                  # ttl passed for 2 and 3
+    assert cache.get("question 2", CHUNKS) is None
+    assert cache.get("question 4", CHUNKS) == "answer 4"
+    assert cache.stats()["entries"] == 8
+
+
+def test_update_from_another_process_invalidates(cache):
+    doc_id = database.add_document("file", "a.txt", "old text")
+    cache.put("question", [(doc_id, 0)], "old answer")
+
+    # A job worker re-ingests the document in place: same doc and chunk
+    # ids, and no change listener runs in this process
+    conn = sqlite3.connect(database.DB_PATH)
+    conn.execute("UPDATE documents SET raw_text = 'new text' WHERE id = ?", (doc_id,))
+    conn.commit()
+    conn.close()
+
+    assert cache.get("question", [(doc_id, 0)]) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_delete_reaches_every_web_worker(db):
+    workers = [AnswerCache(model="m") for _ in range(2)]
+    doc_id = database.add_document("file", "a.txt", "text")
+    for cache in workers:
+        cache.put("question", [(doc_id, 0)], "answer")
+
+    database.delete_document(doc_id)
+
+    assert [cache.get("question", [(doc_id, 0)]) for cache in workers] == [None, None]
+
+
+def test_answer_built_during_a_change_is_not_served(cache):
+    generation = cache.generation()
+    database.add_document("file", "a.txt", "text")  # lands while the LLM runs
+    cache.put("question", CHUNKS, "answer", generation=generation)
+
+    assert cache.get("question", CHUNKS) is None
+
+
+def test_summaries_keep_the_generation(cache):
+    doc_id = database.add_document("file", "a.txt", "text")
+    cache.put("question", [(doc_id, 0)], "answer")
+
+    database.update_summary(doc_id, "a summary")
+
+    assert cache.get("question", [(doc_id, 0)]) == "answer"
+
+
+def test_index_save_bumps_generation(db, embedder):
+    from index_manager import IndexManager
+
+    manager = IndexManager(index_type="flat")
+    before = database.get_corpus_generation()
+    manager.save()
+    assert database.get_corpus_generation() == before + 1
+
+
+
+def test_generation_moves_only_once_the_new_index_is_on_disk(db, embedder, monkeypatch):
+    import json
+    from index_manager import IndexManager
+
+    manager = IndexManager(index_type="flat")
+    first = database.add_document("file", "a.txt", "text")
+    manager.add_documents([(first, "text", "a.txt")])
+    second = database.add_document("file", "b.txt", "more text")
+
+    # What another process would load at the moment the generation moves
+    on_disk = []
+    bump = database.bump_corpus_generation
+    monkeypatch.setattr(database, "bump_corpus_generation", lambda: (
+        on_disk.append(json.load(open(manager.meta_path))["doc_ids"]), bump()))
+
+    manager.add_documents([(second, "more text", "b.txt")])
+    assert on_disk == [[first, second]]
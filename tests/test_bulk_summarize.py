@@ -0,0 +1,61 @@
+import pytest
+
+import bulk_summarize
+import database
+from jobs import JobCancelled, get_job_registry
+
+
+@pytest.fixture
+def docs(db):
+    return [database.add_document("file", f"{name}.txt", f"All about {name}.")
+            for name in ("apples", "bananas", "cherries")]
+
+
+def _summaries():
+    return {doc_id: summary for doc_id, _, summary in database.get_document_summaries()}
+
+
+def test_failed_items_are_reported_and_retried_next_run(docs, monkeypatch):
+    def flaky(text):
+        if "bananas" in text:
+            raise RuntimeError("model overloaded")
+        return f"summary of {text}"
+
+    monkeypatch.setattr(bulk_summarize, "summarize_text", flaky)
+    jobs = get_job_registry()
+    job_id = jobs.enqueue("summarize")
+
+    results = bulk_summarize.run_bulk_summarize(job_id, concurrency=2, batch_size=10)
+
+    assert sorted(r["id"] for r in results) == [docs[0], docs[2]]
+    assert jobs.get(job_id)["errors"] == [
+        {"id": docs[1], "source": "bananas.txt", "error": "model overloaded"}]
+    assert not _summaries()[docs[1]]
+
+    # The next run only picks up what is still unsummarized
+    monkeypatch.setattr(bulk_summarize, "summarize_text", lambda text: "fixed")
+    assert [r["id"] for r in bulk_summarize.run_bulk_summarize()] == [docs[1]]
+    assert _summaries()[docs[1]] == "fixed"
+
+
+def test_cancel_keeps_finished_summaries(docs, monkeypatch):
+    jobs = get_job_registry()
+    job_id = jobs.enqueue("summarize")
+    jobs.claim("w1")
+
+    def cancel_after_first(text):
+        jobs.cancel(job_id)
+        return f"summary of {text}"
+
+    monkeypatch.setattr(bulk_summarize, "summarize_text", cancel_after_first)
+
+    with pytest.raises(JobCancelled):
+        bulk_summarize.run_bulk_summarize(job_id, concurrency=1, batch_size=10)
+
+    # What finished before the cancel is stored even though the batch was not full
+    summarized = [doc_id for doc_id, summary in _summaries().items() if summary]
+    assert 1 <= len(summarized) < len(docs)
+
+    monkeypatch.setattr(bulk_summarize, "summarize_text", lambda text: "rest")
+    rest = bulk_summarize.run_bulk_summarize()
+    assert sorted(summarized + [r["id"] for r in rest]) == docs
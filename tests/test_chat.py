@@ -0,0 +1,20 @@
+import pytest
+
+
+@pytest.fixture
+def app(db, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)     # importing app creates ./uploads
+    import app
+
+    return app
+
+
+def test_chat_history_is_rendered_as_text(app):
+    client = app.app.test_client()
+    with client.session_transaction() as session:
+        session["chat_id"] = "c1"
+    app.chat_store.append("c1", "<b>hi</b>", "<img src=x onerror=alert(1)>")
+
+    page = client.get("/chat").get_data(as_text=True)
+    assert "&lt;img src=x onerror=alert(1)&gt;" in page
+    assert "<img src=x" not in page and "<b>hi</b>" not in page
@@ -0,0 +1,74 @@
+import pytest
+
+import chat_store
+from chat_store import ChatStore
+
+
+@pytest.fixture
+def prompts(monkeypatch):
+    """Summaries come from a fake LLM that records what it was asked."""
+    prompts = []
+
+    def fake_llm(chunks, question):
+        prompts.append(chunks[0])
+        return f"summary #{len(prompts)}"
+
+    monkeypatch.setattr(chat_store, "ask_gemini_with_context", fake_llm)
+    return prompts
+
+
+@pytest.fixture
+def store(db, monkeypatch):
+    store = ChatStore(history_tokens=50)
+    # Compress inline instead of on a background thread
+    monkeypatch.setattr(store, "_schedule_compress", store.compress)
+    return store
+
+
+def _exchange(n):
+    return f"question {n} " + "x" * 30, f"answer {n} " + "y" * 30     # ~11 tokens each
+
+
+def test_append_returns_only_the_new_messages(store):
+    first = store.append("c1", "hi", "hello")
+    second = store.append("c1", "how are you?", "fine")
+
+    assert [(m["role"], m["content"]) for m in second] == [("user", "how are you?"),
+                                                           ("assistant", "fine")]
+    assert second[0]["id"] > first[-1]["id"]
+    assert store.messages("c1", after_id=first[-1]["id"]) == second
+
+
+def test_old_turns_are_folded_into_a_rolling_summary(store, prompts):
+    for n in range(2):
+        store.append("c1", *_exchange(n))
+    assert prompts == []        # still within the budget
+
+    store.append("c1", *_exchange(2))
+    summary, recent = store.context("c1")
+    assert summary == "summary #1"
+    assert "question 0" in prompts[0] and "Summary so far" not in prompts[0]
+    assert sum(m["tokens"] for m in recent) <= store.history_tokens
+    assert recent[-1]["content"] == _exchange(2)[1]
+
+    for n in range(3, 5):
+        store.append("c1", *_exchange(n))
+    assert "Summary so far:\nsummary #1" in prompts[-1]
+    assert store.context("c1")[0] == f"summary #{len(prompts)}"
+
+    # The summary only shortens what is sent; the visible history is complete
+    assert len(store.messages("c1")) == 10
+    # Another process reads the same summary from the database
+    assert ChatStore(history_tokens=50).context("c1") == store.context("c1")
+
+
+def test_failed_summary_keeps_the_history_capped(store, monkeypatch):
+    monkeypatch.setattr(chat_store, "ask_gemini_with_context",
+                        lambda chunks, question: "Error calling Gemini API: down")
+    for n in range(5):
+        store.append("c1", *_exchange(n))
+
+    summary, recent = store.context("c1")
+    assert summary == ""
+    assert sum(m["tokens"] for m in recent) <= store.history_tokens
+    assert recent[-1]["content"] == _exchange(4)[1]
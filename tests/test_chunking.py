@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+from chunking import STRATEGIES, chunk_text, iter_chunks
+
+MARKDOWN = ("# Intro\nSome intro text.\n\n## Setup\nInstall it.\nRun it.\n\n"
+            "# Usage\n```\n# not a heading\n```\nUse it.\n")
+
+
+def _text(seed=0, words=2000):
+    rng = random.Random(seed)
+    vocab = ["alpha", "beta", "gamma.", "delta!", "epsilon?", "zeta,", "\n", "\n\n", "# Title\n"]
+    return " ".join(rng.choice(vocab) for _ in range(words))
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+def test_chunks_are_exact_nonempty_slices(strategy):
+    text = _text()
+    chunks = chunk_text(text, strategy=strategy, max_chars=120, max_tokens=20, overlap=0)
+
+    assert chunks
+    for chunk in chunks:
+        assert chunk.text and chunk.text == text[chunk.start:chunk.end]
+        if strategy != "tokens":
+            assert len(chunk.text) <= 120
+    assert [c.start for c in chunks] == sorted(c.start for c in chunks)
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+def test_segment_boundaries_do_not_change_chunks(strategy):
+    text = _text(seed=1)
+    options = {"strategy": strategy, "max_chars": 100, "max_tokens": 16, "overlap": 4}
+    rng = random.Random(2)
+    cuts = sorted(rng.sample(range(1, len(text)), 40))
+    segments = [text[a:b] for a, b in zip([0, *cuts], [*cuts, len(text)])]
+
+    assert list(iter_chunks(segments, **options)) == chunk_text(text, **options)
+
+
+def test_markdown_headings_start_chunks_with_their_path():
+    chunks = chunk_text(MARKDOWN, strategy="markdown", max_chars=200, overlap=0)
+
+    assert [(c.text.splitlines()[0], c.heading) for c in chunks] == [
+        ("# Intro", "Intro"),
+        ("## Setup", "Intro > Setup"),
+        ("# Usage", "Usage"),       # the "#" inside the code fence is not a heading
+    ]
+
+
+def test_token_windows_overlap():
+    chunks = chunk_text("a b c d e f g", strategy="tokens", max_tokens=3, overlap=1)
+    assert [c.text for c in chunks] == ["a b c", "c d e", "e f g"]
+
+
+def test_sentences_are_kept_whole():
+    text = "One. Two two! Three three three? Four."
+    chunks = chunk_text(text, strategy="sentences", max_chars=20, overlap=0)
+    assert [c.text for c in chunks] == ["One. Two two!", "Three three three?", "Four."]
+
+
+def test_long_lines_are_split():
+    chunks = chunk_text("x" * 25, strategy="lines", max_chars=10, overlap=0)
+    assert [len(c.text) for c in chunks] == [10, 10, 5]
+
+
+@pytest.mark.parametrize("options", [
+    {"strategy": "paragraphs"},
+    {"strategy": "lines", "max_chars": 10, "overlap": 10},
+    {"strategy": "tokens", "max_tokens": 5, "overlap": 5},
+])
+def test_invalid_options(options):
+    with pytest.raises(ValueError):
+        chunk_text("text", **options)
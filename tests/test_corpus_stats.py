@@ -0,0 +1,50 @@
+import database
+
+
+def _rebuilt():
+    """The aggregates computed from scratch, for comparison."""
+    with database.get_connection() as conn:
+        cur = conn.cursor()
+        database._rebuild_corpus_stats(cur)
+        conn.commit()
+    return database.get_corpus_stats()
+
+
+def test_triggers_match_a_full_rebuild(db):
+    first = database.add_document("file", "a.txt", "one two three")
+    database.add_documents_many([
+        ("url", "https://example.com", "x" * 5_000, "a summary", {}),
+        ("pdf", "b.pdf", "word " * 30_000, None, {}),
+    ])
+    database.update_document(first, "one two three four " * 100)
+    database.update_summary(first, "short")
+    incremental = database.get_corpus_stats()
+    assert incremental == _rebuilt()
+
+    assert incremental["documents"] == database.count_documents() == 3
+    assert incremental["types"] == {"file": 1, "pdf": 1, "url": 1}
+    assert [b["documents"] for b in incremental["length_histogram"]] == [0, 2, 0, 1, 0]
+    assert incremental["summarized"] == 2
+
+    database.delete_document(first)
+    stats = database.get_corpus_stats()
+    assert stats == _rebuilt()
+    assert (stats["documents"], stats["types"]) == (2, {"pdf": 1, "url": 1})
+
+
+def test_stats_are_rebuilt_when_missing(db):
+    database.add_document("file", "a.txt", "one two three")
+    with database.get_connection() as conn:
+        conn.execute("DELETE FROM corpus_stats")
+        conn.commit()
+
+    database.init_db()
+    stats = database.get_corpus_stats()
+    assert (stats["documents"], stats["words"], stats["chars"]) == (1, 3, 13)
+
+
+def test_clear_resets_stats(db):
+    database.add_document("file", "a.txt", "one two three")
+    database.clear_all_documents()
+    stats = database.get_corpus_stats()
+    assert (stats["documents"], stats["chars"], stats["types"]) == (0, 0, {})
@@ -0,0 +1,175 @@
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import database
+from crawler import Crawler
+
+PAGES = {
+    "/docs/index.html": '<a href="a.html">A</a> <a href="private.html">P</a> '
+                        '<a href="/outside.html">out</a> <a href="logo.png">logo</a>',
+    "/docs/a.html": '<p>Page A about apples.</p> <a href="b.html">B</a>',
+    "/docs/b.html": '<p>Page B about bananas.</p> <a href="c.html">C</a>',
+    "/docs/c.html": "<p>Page C about cherries.</p>",
+    "/docs/private.html": "<p>Private page.</p>",
+    "/outside.html": "<p>Outside the seed directory.</p>",
+}
+ROBOTS = "User-agent: *\nDisallow: /docs/private\n"
+
+
+class Site:
+    """Local HTTP server with ETags, 304 answers and a request log."""
+
+    def __init__(self):
+        self.pages = {path: f"<html><body><main>{body}</main></body></html>"
+                      for path, body in PAGES.items()}
+        self.requests = []      # (path, If-None-Match sent)
+        self.robots_gate = None     # Event the robots.txt of "localhost" waits for
+        self.robots_released = None
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                site.requests.append((self.path, self.headers.get("If-None-Match")))
+                if self.path == "/docs/b.html" and site.robots_gate:
+                    site.robots_gate.set()
+                if self.path == "/robots.txt":
+                    if site.robots_gate and self.headers["Host"].startswith("localhost"):
+                        site.robots_released = site.robots_gate.wait(5)
+                    return self._send(200, ROBOTS, "text/plain")
+                body = site.pages.get(self.path)
+                if body is None:
+                    return self._send(404, "not found", "text/plain")
+                etag = '"%s"' % hashlib.md5(body.encode()).hexdigest()
+                if self.headers.get("If-None-Match") == etag:
+                    return self._send(304, None, "text/html", etag)
+                return self._send(200, body, "text/html", etag)
+
+            def _send(self, status, body, content_type, etag=None):
+                data = (body or "").encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                if etag:
+                    self.send_header("ETag", etag)
+                if status != 304:
+                    self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                if status != 304:
+                    self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def fetched(self, path):
+        return [inm for p, inm in self.requests if p == path]
+
+
+@pytest.fixture
+def site():
+    site = Site()
+    yield site
+    site.server.shutdown()
+    site.server.server_close()
+
+
+@pytest.fixture
+def events(db):
+    events = []
+    database.add_change_listener(lambda event, doc_id=None: events.append((event, doc_id)))
+    return events
+
+
+def _crawl(site, **options):
+    crawler = Crawler(max_depth=2, concurrency=4, **options)
+    try:
+        results, errors = crawler.run([site.url + "/docs/index.html"])
+    finally:
+        crawler.session.close()
+    assert errors == []
+    return {r["url"][len(site.url):]: (r["status"], r["depth"]) for r in results}
+
+
+def test_depth_scope_and_robots(site, events):
+    results = _crawl(site)
+
+    assert results == {
+        "/docs/index.html": ("added", 0),
+        "/docs/a.html": ("added", 1),
+        "/docs/private.html": ("disallowed", 1),
+        "/docs/b.html": ("added", 2),
+    }
+    assert site.fetched("/docs/c.html") == []           # beyond max_depth
+    assert site.fetched("/docs/private.html") == []     # robots.txt
+    assert site.fetched("/outside.html") == []          # outside /docs/
+    assert database.count_documents() == 3
+
+
+def test_recrawl_uses_conditional_gets(site, events):
+    _crawl(site)
+    site.requests.clear()
+    site.pages["/docs/a.html"] = site.pages["/docs/a.html"].replace("apples", "apricots")
+
+    results = _crawl(site)
+
+    assert results["/docs/index.html"] == ("unchanged", 0)
+    assert results["/docs/a.html"] == ("updated", 1)
+    # b.html is still reached through the stored links of the 304 pages
+    assert results["/docs/b.html"] == ("unchanged", 2)
+    assert all(site.fetched(path) == [inm] and inm
+               for path, inm in site.requests if path != "/robots.txt")
+    assert database.count_documents() == 3
+
+
+def test_pages_are_indexed_in_batches(site, events):
+    _crawl(site)
+    assert [event for event, _ in events] == ["add_many"]
+    assert len(events[0][1]) == 3
+
+    events.clear()
+    _crawl(site, index_batch=1)
+    assert events == []     # nothing stored, nothing to index
+
+    database.clear_all_documents()
+    events.clear()
+    _crawl(site, index_batch=2)
+    assert [len(ids) for _, ids in events] in ([2, 1], [3])
+
+
+def test_failed_final_index_flush_fails_the_job(site, db, monkeypatch):
+    import worker
+    from jobs import get_job_registry
+
+    def failing_index(event, doc_id=None):
+        raise RuntimeError("index unavailable")
+
+    database.add_change_listener(failing_index)
+    jobs = get_job_registry()
+    job_id = jobs.enqueue("crawl", {"seeds": [site.url + "/docs/index.html"],
+                                    "options": {"max_depth": 1}}, max_attempts=1)
+
+    worker.run_job(jobs.claim("w1"), "w1")
+
+    job = jobs.get(job_id)
+    assert (job["status"], job["error"]) == ("failed", "index unavailable")
+
+
+def test_slow_robots_txt_does_not_stall_other_hosts(site, events):
+    site.robots_gate = threading.Event()
+    other = site.url.replace("127.0.0.1", "localhost")
+    crawler = Crawler(max_depth=2, concurrency=4)
+    try:
+        results, errors = crawler.run([site.url + "/docs/index.html",
+                                       other + "/docs/index.html"])
+    finally:
+        crawler.session.close()
+
+    # The first host was crawled while the second host's robots.txt hung
+    assert site.robots_released is True
+    assert errors == []
+    assert sum(r["status"] == "disallowed" for r in results) == 2
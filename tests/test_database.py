@@ -0,0 +1,79 @@
+import threading
+
+import pytest
+
+import database
+from database import ConnectionPool
+
+
+def test_pool_reuses_and_bounds_connections(db):
+    pool = ConnectionPool(db, max_size=2)
+    first = pool.acquire()
+    second = pool.acquire()
+    assert first is not second
+
+    # Full pool: the next caller waits for a release
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+    waiter.start()
+    waiter.join(0.1)
+    assert got == []
+    pool.release(first)
+    waiter.join(1)
+    assert got == [first]
+
+    assert first.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    pool.release(second)
+    pool.release(got[0])
+    pool.close_all()
+
+
+def test_failed_block_is_rolled_back(db):
+    with pytest.raises(RuntimeError):
+        with database.get_connection() as conn:
+            conn.execute("INSERT INTO documents (source_type, path_or_url, raw_text) "
+                         "VALUES ('file', 'a.txt', 'text')")
+            raise RuntimeError()
+
+    assert database.get_document_ids() == []
+
+
+def test_listing_pages_metadata_only(db):
+    ids = [database.add_document("file", f"{name}.txt", "word " * size)
+           for name, size in (("a", 3), ("b", 1), ("c", 2))]
+
+    page = database.list_documents(offset=1, limit=1, columns=("id", "word_count"),
+                                   order_by="word_count", descending=True)
+    assert page == [{"id": ids[2], "word_count": 2}]
+    assert database.get_document_info(ids[0], ("char_length", "line_count")) == \
+        {"char_length": 15, "line_count": 1}
+
+    with pytest.raises(ValueError):
+        database.list_documents(columns=("id", "raw_text"))
+    with pytest.raises(ValueError):
+        database.list_documents(order_by="raw_text")
+
+
+def test_document_text_is_read_in_blocks(db):
+    text = "héllo wörld " * 100
+    doc_id = database.add_document("file", "a.txt", text)
+
+    blocks = list(database.iter_document_text(doc_id, block_bytes=7))
+    assert len(blocks) > 1
+    assert "".join(blocks) == text
+    assert list(database.iter_document_text(doc_id + 1)) == []
+
+
+@pytest.mark.parametrize("text", ["", "one", "  two words \n", "héllo wörld\nsecond  line " * 50])
+def test_spooled_text_matches_document_stats(db, tmp_path, text):
+    # Cut at every few characters, inside words and whitespace runs alike
+    segments = [text[i:i + 3] for i in range(0, len(text), 3)]
+    spooled = database.spool_text(segments, str(tmp_path / "text.tmp"))
+    assert spooled[2:] == database.document_stats(text)
+
+    doc_id = database.add_document("file", "a.txt", spooled)
+    assert "".join(database.iter_document_text(doc_id)) == text
+    assert database.get_document(doc_id)[3] == text
+    database.update_document(doc_id, database.spool_text([text, "!"], spooled.path))
+    assert database.get_document(doc_id)[3] == text + "!"
+    assert database.find_document("content_hash", database.content_hash(text + "!"))
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+import database
+from conftest import HashingModel
+from embedding_cache import chunk_hash, encode_cached
+
+
+@pytest.fixture
+def encoder(db):
+    """HashingModel.encode, recording the texts it was asked to embed."""
+    calls = []
+
+    def encode(texts):
+        calls.append(list(texts))
+        return HashingModel().encode(texts)
+
+    encode.calls = calls
+    return encode
+
+
+def test_only_new_texts_are_encoded(encoder):
+    first = encode_cached(["alpha", "beta", "alpha"], encoder, "m")
+    second = encode_cached(["beta", "gamma"], encoder, "m")
+
+    assert encoder.calls == [["alpha", "beta"], ["gamma"]]
+    assert first.shape == (3, 64) and first.dtype == np.float32
+    np.testing.assert_array_equal(first[0], first[2])
+    np.testing.assert_allclose(second[0], first[1], atol=1e-3)
+
+
+def test_models_do_not_share_vectors(encoder):
+    encode_cached(["alpha"], encoder, "m1")
+    encode_cached(["alpha"], encoder, "m2")
+    assert encoder.calls == [["alpha"], ["alpha"]]
+
+
+@pytest.mark.parametrize("dtype", ["float16", "float32"])
+def test_cached_vectors_decode_at_either_precision(encoder, dtype):
+    expected = encode_cached(["alpha beta"], encoder, "m", storage_dtype=dtype)
+    cached = encode_cached(["alpha beta"], encoder, "m", storage_dtype=dtype)
+
+    assert len(encoder.calls) == 1
+    assert cached.dtype == np.float32
+    np.testing.assert_allclose(cached, expected, atol=1e-3)
+
+
+def test_chunk_layout_and_pruning(encoder):
+    doc_id = database.add_document("file", "a.txt", "alpha beta")
+    encode_cached(["alpha", "beta"], encoder, "m", doc_id=doc_id)
+    encode_cached(["gamma"], encoder, "m", doc_id=doc_id, first_chunk_id=2)
+    encode_cached(["unused"], encoder, "m")
+    encode_cached(["alpha"], encoder, "old-model")
+
+    assert database.prune_embedding_cache(keep_model="m") == 2
+    hashes = [chunk_hash(t) for t in ("alpha", "beta", "gamma")]
+    assert set(database.get_cached_embeddings("m", hashes)) == set(hashes)
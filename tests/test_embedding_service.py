@@ -0,0 +1,72 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+import embedding_service
+from ann_index import build_index, get_faiss, search_index
+from conftest import HashingModel
+
+# Stands in for sentence-transformers inside the spawned workers; each
+# vector is (text length, pid of the process that encoded it)
+FAKE_MODEL = '''
+import os
+import numpy as np
+
+class SentenceTransformer:
+    def __init__(self, name, **kwargs):
+        pass
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        return np.array([[len(t), os.getpid()] for t in texts], dtype="float32")
+'''
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    (tmp_path / "sentence_transformers.py").write_text(FAKE_MODEL)
+    monkeypatch.syspath_prepend(str(tmp_path))     # spawned workers inherit sys.path
+    monkeypatch.delitem(sys.modules, "sentence_transformers", raising=False)
+    service = embedding_service.EmbeddingService(workers=2, batch_size=2)
+    yield service
+    service.close()
+
+
+def test_bulk_encodes_run_in_worker_processes(service):
+    texts = ["x" * n for n in range(1, 11)]
+
+    vectors = service.encode(texts)
+
+    assert vectors.dtype == np.float32
+    assert vectors[:, 0].tolist() == [len(t) for t in texts]    # order kept
+    pids = set(vectors[:, 1].astype(int).tolist())
+    assert os.getpid() not in pids and 1 <= len(pids) <= 2
+
+
+def test_small_encodes_and_queries_stay_in_process(service):
+    assert service.encode(["a", "bb", "ccc"])[:, 1].tolist() == [os.getpid()] * 3
+    assert service.encode_query("q")[0, 1] == os.getpid()
+    assert service._pool is None
+
+
+def test_fp16_storage_halves_the_index_and_keeps_neighbours():
+    texts = [f"document {i} about topic {i % 7} and item {i * 13}" for i in range(200)]
+    vectors = HashingModel().encode(texts)
+    queries = vectors[:20]
+    faiss = get_faiss()
+
+    results = {}
+    for dtype in ("float32", "float16"):
+        for index_type in ("flat", "hnsw"):
+            index, _ = build_index(index_type, vectors, ids=np.arange(200), vector_dtype=dtype)
+            _, ids = search_index(index, queries, 1)
+            results[dtype, index_type] = (ids[:, 0].tolist(),
+                                          len(faiss.serialize_index(index)))
+
+    for index_type in ("flat", "hnsw"):
+        (ids32, size32), (ids16, size16) = (results["float32", index_type],
+                                            results["float16", index_type])
+        assert ids16 == ids32 == list(range(20))
+        assert size16 < size32
+    assert results["float16", "flat"][1] < 0.6 * results["float32", "flat"][1]
@@ -0,0 +1,36 @@
+import pytest
+
+import database
+from index_manager import IndexManager
+
+
+@pytest.fixture
+def app(db, embedder, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)     # importing app creates ./uploads
+    import app
+
+    manager = IndexManager(index_type="flat")
+    database.add_change_listener(manager.on_document_change)
+    monkeypatch.setattr(app, "_retrieve_for_cache",
+                        lambda question, top_k=4: (manager.search(question, top_k=top_k), None))
+    monkeypatch.setattr(app, "ask_gemini_with_context", lambda chunks, question: "An answer.")
+    yield app
+    database.remove_change_listener(manager.on_document_change)
+
+
+def test_session_keeps_chunk_refs_and_export_rereads_texts(app):
+    text = "rockets fly to the moon " * 40
+    database.add_document("file", "rockets.txt", text)
+    client = app.app.test_client()
+
+    hits = client.post("/ask", data={"question": "rockets moon"}).get_json()["hits"]
+    assert hits
+
+    with client.session_transaction() as session:
+        refs = session["last_export"]
+    assert len(refs) == len(hits)
+    assert not any(isinstance(value, str) for ref in refs for value in ref)
+
+    csv = client.post("/export_results", data={"format": "csv"}).get_data(as_text=True)
+    assert "rockets.txt" in csv
+    assert hits[0]["text"].strip() in csv
@@ -0,0 +1,27 @@
+import csv
+import io
+
+from export_utils import export_to_csv
+
+HITS = [
+    # hybrid: ranked by the fused score, not by similarity
+    {"text": "dense and keyword", "score": 0.0327869,
+     "meta": {"source": "a.txt", "similarity": 0.8123456, "bm25": 4.2}},
+    {"text": "keyword only", "score": 0.0161290,
+     "meta": {"source": "b.txt", "similarity": None, "bm25": 3.1}},
+    # rag_engine hits: the score is the cosine similarity
+    {"text": "plain", "score": 0.75, "meta": {"source": "c.txt"}},
+]
+
+
+def test_csv_exports_similarity_and_rank_score():
+    buffer = io.BytesIO()
+    export_to_csv(HITS, "question", "answer", buffer)
+
+    rows = list(csv.reader(io.StringIO(buffer.getvalue().decode("utf-8"))))
+    assert rows[3] == ["Text", "Source", "File", "Similarity", "Rank score"]
+    assert [row[3:] for row in rows[4:]] == [
+        ["0.8123", "0.0328"],
+        ["N/A", "0.0161"],
+        ["0.75", "0.75"],
+    ]
@@ -0,0 +1,123 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import database
+from index_manager import IndexManager, split_vector_id
+
+
+@pytest.fixture
+def make_manager(db, embedder):
+    """IndexManager for a given backend, kept in sync through the DB listeners."""
+    managers = []
+
+    def make(index_type):
+        manager = IndexManager(index_type=index_type)
+        database.add_change_listener(manager.on_document_change)
+        managers.append(manager)
+        return manager
+
+    yield make
+    for manager in managers:
+        database.remove_change_listener(manager.on_document_change)
+
+
+def _dense_docs(manager, query):
+    return [(hit["meta"]["doc_id"], hit["text"])
+            for hit in manager.search(query, top_k=5, mode="dense", min_similarity=0.9)]
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_add_and_delete(make_manager, index_type):
+    manager = make_manager(index_type)
+    first = database.add_document("file", "a.txt", "apples and oranges grow on trees")
+    second = database.add_document("file", "b.txt", "rockets fly to the moon")
+
+    assert _dense_docs(manager, "rockets fly to the moon") == [(second, "rockets fly to the moon")]
+
+    database.delete_document(second)
+    assert _dense_docs(manager, "rockets fly to the moon") == []
+    assert manager.doc_ids == {first}
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_update_replaces_old_vectors(make_manager, index_type):
+    manager = make_manager(index_type)
+    doc_id = database.add_document("file", "a.txt", "apples and oranges grow on trees")
+    database.add_document("file", "b.txt", "rockets fly to the moon")
+
+    database.update_document(doc_id, "zebra zebra zebra")
+
+    # The old text must not come back under the reused vector ids
+    assert _dense_docs(manager, "apples and oranges grow on trees") == []
+    assert _dense_docs(manager, "zebra zebra zebra") == [(doc_id, "zebra zebra zebra")]
+    assert manager.index.ntotal == len(manager.chunks)
+    assert manager.tombstones == 0
+
+
+def test_hnsw_counts_tombstones(make_manager, monkeypatch):
+    monkeypatch.setattr("index_manager.MAX_TOMBSTONE_RATIO", 1.0)
+    manager = make_manager("hnsw")
+    keep = database.add_document("file", "a.txt", "apples and oranges grow on trees")
+    drop = database.add_document("file", "b.txt", "rockets fly to the moon")
+    total = manager.index.ntotal
+
+    database.delete_document(drop)
+    assert manager.index.ntotal == total      # HNSW cannot remove vectors
+    assert manager.tombstones == total - len(manager.chunks)
+    assert all(split_vector_id(vid)[0] == keep for vid in manager.chunks.columns[0])
+
+    # The count survives a reload from disk
+    reloaded = IndexManager(index_type="hnsw")
+    reloaded.ensure_loaded()
+    assert reloaded.tombstones == manager.tombstones
+
+
+def test_tombstones_trigger_rebuild(make_manager, monkeypatch):
+    monkeypatch.setattr("index_manager.MAX_TOMBSTONE_RATIO", 0.0)
+    manager = make_manager("hnsw")
+    database.add_document("file", "a.txt", "apples and oranges grow on trees")
+    drop = database.add_document("file", "b.txt", "rockets fly to the moon")
+
+    database.delete_document(drop)
+    assert manager.tombstones == 0
+    assert manager.index.ntotal == len(manager.chunks)
+
+
+WRITER = """
+import sys
+import database, embedding_service
+from conftest import HashingModel
+from index_manager import IndexManager
+
+database.DB_PATH = sys.argv[1]
+database.init_db()
+embedding_service.load_model = lambda *args, **kwargs: HashingModel()
+embedding_service._service = embedding_service.EmbeddingService(workers=0)
+manager = IndexManager(index_type="flat")
+database.add_change_listener(manager.on_document_change)
+database.add_document("file", "b.txt", "rockets fly to the moon")
+"""
+
+
+def test_mapped_reader_reloads_after_another_process_saves(make_manager, db):
+    writer = make_manager("flat")
+    database.add_document("file", "a.txt", "apples and oranges grow on trees")
+    database.remove_change_listener(writer.on_document_change)
+
+    # A web process: reads the saved files memory-mapped, never rebuilds
+    reader = IndexManager(index_type="flat")
+    reader.request_rebuild = lambda: pytest.fail("reader asked for a rebuild")
+    assert len(_dense_docs(reader, "apples and oranges grow on trees")) == 1
+    assert reader._mapped
+
+    tests = os.path.dirname(os.path.abspath(__file__))
+    subprocess.run([sys.executable, "-c", WRITER, db], check=True,
+                   env={**os.environ, "PYTHONPATH": os.pathsep.join([os.path.dirname(tests),
+                                                                     tests])})
+
+    assert [text for _, text in _dense_docs(reader, "rockets fly to the moon")] == \
+        ["rockets fly to the moon"]
+    assert reader._mapped and len(reader.doc_ids) == 2
@@ -0,0 +1,71 @@
+import pytest
+
+import database
+import index_manager
+import worker
+from index_manager import IndexManager
+from jobs import get_job_registry
+
+APPLES = "apples and oranges grow on trees"
+ROCKETS = "rockets fly to the moon"
+
+
+def _docs(manager, query):
+    return [hit["meta"]["doc_id"]
+            for hit in manager.search(query, top_k=5, mode="dense", min_similarity=0.9)]
+
+
+@pytest.fixture
+def processes(db, embedder, monkeypatch):
+    """A job worker's IndexManager (the listener) and a web process's one."""
+    job_worker = IndexManager(index_type="flat")
+    database.add_change_listener(job_worker.on_document_change)
+    monkeypatch.setattr(index_manager, "_manager", job_worker)
+
+    web = IndexManager(index_type="flat")
+    web.defer_changes = lambda event, doc_id=None: get_job_registry().enqueue(
+        "index_sync", {"event": event, "doc_id": doc_id})
+    return job_worker, web
+
+
+def _run_queued_jobs():
+    jobs = get_job_registry()
+    while (job := jobs.claim("test-worker")) is not None:
+        worker.run_job(job, "test-worker")
+
+
+def test_web_delete_is_applied_by_a_worker(processes):
+    job_worker, web = processes
+    keep = database.add_document("file", "a.txt", APPLES)
+    drop = database.add_document("file", "b.txt", ROCKETS)
+    assert _docs(web, ROCKETS) == [drop]
+
+    # The web process only deletes the row and queues the index change
+    database.remove_change_listener(job_worker.on_document_change)
+    database.add_change_listener(web.on_document_change)
+    database.delete_document(drop)
+    ntotal = web.index.ntotal
+
+    assert _docs(web, ROCKETS) == []    # its vectors are still there, but skipped
+    assert web.index.ntotal == ntotal
+
+    _run_queued_jobs()
+    assert drop not in job_worker.doc_ids
+    assert _docs(web, APPLES) == [keep]
+    assert web.doc_ids == {keep}        # picked up the worker's save
+
+
+def test_writers_build_on_each_others_saves(db, embedder):
+    first, second = IndexManager(index_type="flat"), IndexManager(index_type="flat")
+    a = database.add_document("file", "a.txt", APPLES)
+    b = database.add_document("file", "b.txt", ROCKETS)
+    first.add_documents([(a, APPLES, "a.txt")])
+    second.ensure_loaded(validate=False)
+
+    first.add_documents([(b, ROCKETS, "b.txt")])
+    second.remove_document(a)           # must not drop first's b
+
+    reader = IndexManager(index_type="flat")
+    reader.ensure_loaded(validate=False)
+    assert reader.doc_ids == {b}
+    assert _docs(reader, ROCKETS) == [b]
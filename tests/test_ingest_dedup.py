@@ -0,0 +1,28 @@
+import pytest
+
+import database
+from ingest_dedup import check_content, check_source, normalize_url, sha256_bytes
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("HTTP://Example.COM:80/a?b=2&a=1#top", "http://example.com/a?a=1&b=2"),
+    ("https://example.com:8443", "https://example.com:8443/"),
+    ("https://example.com/?utm_source=x&fbclid=y&q=1", "https://example.com/?q=1"),
+    ("http://user@example.com/", "http://user@example.com/"),
+    ("http://[::1]:8000/docs", "http://[::1]:8000/docs"),
+    ("http://[2001:DB8::1]/", "http://[2001:db8::1]/"),
+])
+def test_normalize_url(url, expected):
+    assert normalize_url(url) == expected
+
+
+def test_check_source_and_content(db):
+    assert check_source("a.txt", sha256_bytes(b"apples")) == ("new", None)
+    doc_id = database.add_document("file", "a.txt", "apples", source={
+        "source_key": "a.txt", "source_hash": sha256_bytes(b"apples")})
+
+    assert check_source("a.txt", sha256_bytes(b"apples")) == ("unchanged", doc_id)
+    assert check_source("a.txt", sha256_bytes(b"apricots")) == ("changed", doc_id)
+    assert check_source("b.txt", sha256_bytes(b"apples")) == ("duplicate", doc_id)
+    assert check_content("apples") == ("duplicate", doc_id)
+    assert check_content("bananas") == ("new", None)
@@ -0,0 +1,85 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import database
+import ingest_pipeline
+from ingest_pipeline import IngestPipeline
+from jobs import JobCancelled
+
+
+@pytest.fixture
+def pipeline(db):
+    pipeline = IngestPipeline(max_workers=1, batch_size=2)
+    yield pipeline
+    pipeline.close()
+
+
+def _files(tmp_path, texts):
+    paths = []
+    for i, text in enumerate(texts):
+        path = tmp_path / f"doc{i}.txt"
+        path.write_text(text)
+        paths.append(str(path))
+    return paths
+
+
+def _start(pipeline, paths):
+    job_id = pipeline.submit(paths)
+    assert pipeline.jobs.claim("test")["id"] == job_id
+    return job_id
+
+
+def test_run_commits_batches_and_reports_duplicates(pipeline, tmp_path):
+    paths = _files(tmp_path, ["apples", "bananas", "apples", "cherries"])
+    job_id = _start(pipeline, paths)
+
+    pipeline.run(job_id, paths, {})
+
+    job = pipeline.get_job(job_id)
+    assert job["status"] == "done"
+    assert sorted(r["status"] for r in job["results"]) == ["added", "added", "added", "duplicate"]
+    assert database.count_documents() == 3
+    assert pipeline._executor._mp_context.get_start_method() == "spawn"
+    assert not list(tmp_path.glob("*.tmp"))     # spool files are removed
+
+
+def test_extracted_text_is_streamed_into_the_database(pipeline, tmp_path):
+    text = "".join(f"line {i} with wörds\n" for i in range(500))
+    paths = _files(tmp_path, [text])
+
+    source_type, path, spooled = ingest_pipeline.extract_file(paths[0])
+
+    assert (source_type, path) == ("file", paths[0])
+    assert spooled[1:] == (len(text.encode("utf-8")), *database.document_stats(text))
+    pipeline._commit(_start(pipeline, paths), [(source_type, path, spooled, None)], {})
+    doc_id, = database.get_document_ids()
+    assert "".join(database.iter_document_text(doc_id)) == text
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_strip_segments():
+    segments = ["", "  \n ", " a b ", "  ", "\n", "c  ", " \n"]
+    assert "".join(ingest_pipeline._strip_segments(segments)) == "".join(segments).strip()
+
+
+def test_cancel_stops_submitting(pipeline, tmp_path, monkeypatch):
+    paths = _files(tmp_path, [f"text {i}" for i in range(10)])
+    job_id = _start(pipeline, paths)
+    extracted = []
+
+    def extract(path):
+        extracted.append(path)
+        pipeline.jobs.cancel(job_id)
+        return "file", path, database.spool_text([open(path).read()], path + ".tmp")
+
+    monkeypatch.setattr(ingest_pipeline, "extract_file", extract)
+    monkeypatch.setattr(pipeline, "_get_executor", lambda: ThreadPoolExecutor(1))
+
+    with pytest.raises(JobCancelled):
+        pipeline.run(job_id, paths, {})
+
+    # Only the files already in flight ran; texts already handled were kept
+    assert 0 < len(extracted) <= 2
+    assert 1 <= database.count_documents() <= len(extracted)
+    assert not list(tmp_path.glob("*.tmp"))
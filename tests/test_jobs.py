@@ -0,0 +1,109 @@
+import pytest
+
+import database
+import worker
+from jobs import get_job_registry
+
+
+@pytest.fixture
+def jobs(db):
+    return get_job_registry()
+
+
+def _run(jobs, handler, monkeypatch, worker_name="w1"):
+    monkeypatch.setitem(worker.HANDLERS, "test", handler)
+    job = jobs.claim(worker_name)
+    worker.run_job(job, worker_name)
+    return jobs.get(job["id"])
+
+
+def test_claims_follow_priority_then_age(jobs):
+    first_bulk = jobs.enqueue("summarize")
+    second_bulk = jobs.enqueue("summarize")
+    ingest = jobs.enqueue("ingest")
+    reindex = jobs.enqueue("reindex")
+
+    claimed = [jobs.claim("w1")["id"] for _ in range(4)]
+    assert claimed == [reindex, ingest, first_bulk, second_bulk]
+    assert jobs.claim("w1") is None
+
+
+def test_unique_returns_the_active_job(jobs):
+    job_id = jobs.enqueue("reindex", unique=True)
+    assert jobs.enqueue("reindex", unique=True) == job_id
+    jobs.claim("w1")
+    assert jobs.enqueue("reindex", unique=True) == job_id
+    jobs.finish(job_id)
+    assert jobs.enqueue("reindex", unique=True) != job_id
+
+
+def test_expired_lease_is_taken_over_then_failed(jobs):
+    job_id = jobs.enqueue("test", total=1, max_attempts=2)
+    assert jobs.claim("w1", lease_seconds=-1)["attempts"] == 1
+    jobs.add_results(job_id, [{"item": 1}])
+    assert not jobs.renew(job_id, "w2")
+
+    # w1 stopped renewing: w2 takes over with the progress reset
+    taken = jobs.claim("w2", lease_seconds=-1)
+    assert (taken["id"], taken["attempts"]) == (job_id, 2)
+    job = jobs.get(job_id)
+    assert (job["worker"], job["done"], job["results"]) == ("w2", 0, [])
+
+    # Out of attempts: failed instead of claimed again
+    assert jobs.claim("w3") is None
+    job = jobs.get(job_id)
+    assert (job["status"], job["error"]) == ("failed", "Worker stopped")
+
+
+def test_failing_handler_is_retried_with_backoff(jobs, monkeypatch):
+    monkeypatch.setattr(worker, "JOB_RETRY_DELAY", 0)
+    calls = []
+
+    def handler(job_id, payload):
+        calls.append(job_id)
+        if len(calls) < 2:
+            raise RuntimeError("flaky")
+
+    job_id = jobs.enqueue("test", max_attempts=3)
+    job = _run(jobs, handler, monkeypatch)
+    assert (job["status"], job["error"]) == ("queued", "flaky")
+
+    job = _run(jobs, handler, monkeypatch)
+    assert (job["status"], job["error"], job["attempts"]) == ("done", None, 2)
+    assert calls == [job_id, job_id]
+
+
+def test_last_attempt_failure_is_final(jobs, monkeypatch):
+    def handler(job_id, payload):
+        raise RuntimeError("broken")
+
+    jobs.enqueue("test", max_attempts=1)
+    job = _run(jobs, handler, monkeypatch)
+    assert (job["status"], job["error"]) == ("failed", "broken")
+    assert jobs.claim("w1") is None
+
+
+def test_cancel_queued_and_running_jobs(jobs, monkeypatch):
+    queued = jobs.enqueue("test")
+    assert jobs.cancel(queued) == "cancelled"
+    assert jobs.claim("w1") is None
+
+    def handler(job_id, payload):
+        assert jobs.cancel(job_id) == "running"   # requested, not yet stopped
+        jobs.check_cancelled(job_id)
+
+    jobs.enqueue("test")
+    assert _run(jobs, handler, monkeypatch)["status"] == "cancelled"
+    assert jobs.cancel("unknown") is None
+
+
+def test_job_fails_when_every_item_failed(jobs):
+    job_id = jobs.enqueue("test", total=2)
+    jobs.claim("w1")
+    jobs.add_errors(job_id, [{"file": "a"}, {"file": "b"}])
+    jobs.finish(job_id)
+
+    job = jobs.get(job_id)
+    assert (job["status"], job["failed"], len(job["errors"])) == ("failed", 2, 2)
+    assert database.prune_jobs(-1) == 1
+    assert jobs.get(job_id) is None
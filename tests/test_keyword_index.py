@@ -0,0 +1,55 @@
+import pytest
+
+import database
+import keyword_index
+from index_manager import IndexManager, split_vector_id
+
+
+def test_build_match_query_quotes_terms():
+    assert keyword_index.build_match_query('ERR-404 "AB12.7" error ERR-404 -- ') == \
+        '"ERR-404" OR "AB12.7" OR "error"'
+    assert keyword_index.build_match_query('"" -- ') == ""
+
+
+def test_reciprocal_rank_fusion():
+    fused = keyword_index.reciprocal_rank_fusion([[("a", 0.9), ("b", 0.8)],
+                                                  [("b", 12.0), ("c", 3.0)]], k=60)
+    assert [item for item, _ in fused] == ["b", "a", "c"]
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused[1][1] == pytest.approx(1 / 61)
+
+
+def test_weighted_fusion_normalizes_each_list():
+    fused = dict(keyword_index.weighted_fusion([("a", 0.9), ("b", 0.5)],
+                                               [("b", 20.0), ("c", 10.0)], dense_weight=0.25))
+    assert fused == pytest.approx({"a": 0.25, "b": 0.75, "c": 0.0})
+
+
+@pytest.fixture
+def manager(db, embedder):
+    manager = IndexManager(index_type="flat")
+    database.add_change_listener(manager.on_document_change)
+    yield manager
+    database.remove_change_listener(manager.on_document_change)
+
+
+def test_keyword_search_follows_index_changes(manager):
+    first = database.add_document("file", "a.txt", "The server returned ERR-404 for the page")
+    second = database.add_document("file", "b.txt", "Errors are logged by the server")
+
+    ranked = keyword_index.search("ERR-404", 5)
+    assert [split_vector_id(vid)[0] for vid, _ in ranked] == [first]
+    assert {split_vector_id(vid)[0] for vid, _ in keyword_index.search("server", 5)} == \
+        {first, second}
+
+    database.delete_document(first)
+    assert keyword_index.search("ERR-404", 5) == []
+
+
+def test_hybrid_search_finds_exact_identifiers(manager):
+    doc_id = database.add_document("file", "a.txt", "Order AB12.7 shipped late")
+    database.add_document("file", "b.txt", "Shipping was late again for orders")
+
+    hits = manager.search("AB12.7", top_k=2, mode="hybrid", min_similarity=0.99)
+    assert hits[0]["meta"]["doc_id"] == doc_id
+    assert hits[0]["meta"]["bm25"] is not None
@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use only, never by importing a module
+HEAVY = ("faiss", "sentence_transformers", "torch", "fitz", "pytesseract", "PIL",
+         "google.genai", "openpyxl", "docx", "bs4", "PyPDF2", "requests")
+
+
+@pytest.mark.parametrize("module", ["app", "rag_engine", "index_manager", "ocr_utils",
+                                    "export_utils", "analysis_utils"])
+def test_import_loads_no_heavy_library(module, tmp_path):
+    # A fresh interpreter, run in tmp_path: importing app creates its
+    # database and uploads folder in the working directory
+    code = (f"import sys, {module}; "
+            f"print(','.join(m for m in {HEAVY!r} if m in sys.modules))")
+    proc = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, capture_output=True,
+                          text=True, env={**os.environ, "PYTHONPATH": ROOT})
+
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.strip() == ""
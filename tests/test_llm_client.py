@@ -0,0 +1,163 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import llm_client
+from llm_client import HttpBackend, LLMClient, LLMError
+
+
+class FakeLLM:
+    """Local LLM server: fails the first `failures` requests with `status`."""
+
+    def __init__(self):
+        self.failures = 0
+        self.status = 429
+        self.delay = 0.0
+        self.requests = 0
+        self.active = self.max_active = 0
+        self.release = threading.Event()    # a stream's second piece waits for it
+        self.released = None
+        lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                prompt = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["prompt"]
+                with lock:
+                    server.requests += 1
+                    failing = server.requests <= server.failures
+                    server.active += 1
+                    server.max_active = max(server.max_active, server.active)
+                try:
+                    time.sleep(server.delay)
+                    if failing:
+                        return self._send(server.status, b"{}")
+                    if self.path == "/stream":
+                        return self._stream(prompt)
+                    self._send(200, json.dumps({"text": f"echo {prompt}"}).encode())
+                finally:
+                    with lock:
+                        server.active -= 1
+
+            def _send(self, status, body):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self, prompt):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                self._chunk({"text": "first "})
+                server.released = server.release.wait(5)
+                self._chunk({"text": prompt})
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _chunk(self, item):
+                line = json.dumps(item).encode() + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def fake():
+    fake = FakeLLM()
+    yield fake
+    fake.release.set()
+    fake.server.shutdown()
+    fake.server.server_close()
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    delays = []
+
+    def no_sleep(attempt):
+        delays.append(attempt)
+        return 0
+
+    monkeypatch.setattr(llm_client, "backoff_delay", no_sleep)
+    return delays
+
+
+def test_rate_limits_are_retried_with_backoff(fake, delays):
+    fake.failures = 2
+    client = LLMClient(HttpBackend(fake.url), max_retries=3)
+
+    assert client.generate("hi") == "echo hi"
+    assert fake.requests == 3
+    assert delays == [0, 1]     # one growing backoff per retry
+
+
+def test_retries_stop_at_max_retries(fake, delays):
+    fake.failures = 10
+    client = LLMClient(HttpBackend(fake.url), max_retries=2)
+
+    with pytest.raises(LLMError):
+        client.generate("hi")
+    assert fake.requests == 3
+
+
+def test_other_errors_are_not_retried(fake, delays):
+    fake.failures, fake.status = 1, 400
+    client = LLMClient(HttpBackend(fake.url), max_retries=3)
+
+    with pytest.raises(LLMError):
+        client.generate("hi")
+    assert (fake.requests, delays) == (1, [])
+
+
+def test_backoff_is_capped_full_jitter():
+    for attempt in range(12):
+        delay = llm_client.backoff_delay(attempt)
+        assert 0 <= delay <= min(llm_client.MAX_BACKOFF, llm_client.BASE_BACKOFF * 2 ** attempt)
+
+
+def test_concurrency_cap_holds_for_threads_and_tasks(fake):
+    fake.delay = 0.05
+    client = LLMClient(HttpBackend(fake.url), max_concurrency=2)
+
+    threads = [threading.Thread(target=client.generate, args=(str(i),)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert fake.max_active == 2
+
+    fake.max_active = 0
+
+    async def ask_all():
+        return await asyncio.gather(*(client.agenerate(str(i)) for i in range(6)))
+
+    assert asyncio.run(ask_all()) == [f"echo {i}" for i in range(6)]
+    assert fake.max_active == 2
+
+
+def test_astream_yields_pieces_as_they_arrive(fake):
+    client = LLMClient(HttpBackend(fake.url))
+
+    async def collect():
+        pieces = []
+        async for text in client.astream("second"):
+            pieces.append(text)
+            fake.release.set()      # the server sends the rest only now
+        return pieces
+
+    assert asyncio.run(collect()) == ["first ", "second"]
+    assert fake.released is True
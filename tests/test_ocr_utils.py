@@ -0,0 +1,67 @@
+import pytest
+
+import ocr_utils
+from ingest_pipeline import extract_file
+
+fitz = pytest.importorskip("fitz")
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    """A PDF with one text page and one page without a text layer."""
+    path = str(tmp_path / "scan.pdf")
+    with fitz.open() as doc:
+        doc.new_page().insert_text((72, 72), "A page with a real text layer on it.")
+        doc.new_page()
+        doc.save(path)
+    return path
+
+
+@pytest.fixture
+def ocr_calls(monkeypatch):
+    calls = []
+
+    def fake_ocr(path, page_number, dpi, grayscale):
+        calls.append(page_number)
+        return f"ocr of page {page_number}"
+
+    monkeypatch.setattr(ocr_utils, "_ocr_pdf_page", fake_ocr)
+    return calls
+
+
+def test_only_text_less_pages_are_ocrd(pdf, ocr_calls):
+    text = ocr_utils.extract_text_from_pdf(pdf, workers=1)
+
+    assert ocr_calls == [1]
+    assert text == "A page with a real text layer on it.\nocr of page 1"
+
+
+def test_pipeline_worker_does_not_start_a_pool(pdf, ocr_calls, monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("OCR pool started inside a pipeline worker")
+
+    monkeypatch.setattr(ocr_utils, "ProcessPoolExecutor", no_pool)
+
+    source_type, _, spooled = extract_file(pdf)
+
+    assert source_type == "pdf"
+    assert ocr_calls == [1]
+    with open(spooled.path, encoding="utf-8") as f:
+        assert f.read() == "A page with a real text layer on it.\nocr of page 1"
+
+
+def test_parallel_ocr_uses_spawned_processes(pdf, ocr_calls, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    contexts = []
+
+    def recording_pool(max_workers, mp_context=None):
+        contexts.append(mp_context.get_start_method() if mp_context else None)
+        return ThreadPoolExecutor(max_workers)  # fake_ocr is not picklable
+
+    monkeypatch.setattr(ocr_utils, "ProcessPoolExecutor", recording_pool)
+
+    text = ocr_utils.extract_text_from_pdf(pdf, workers=2)
+
+    assert contexts == ["spawn"]
+    assert text == "A page with a real text layer on it.\nocr of page 1"
@@ -0,0 +1,62 @@
+import time
+
+import pytest
+
+import database
+import index_manager
+import rag_engine
+from rag_engine import MMRReranker, Reranker, RerankTimeout
+
+
+def _hit(text):
+    return {"text": text, "score": 0.0, "meta": {}}
+
+
+def _hits():
+    return [_hit("apple pie recipe"), _hit("apple pie recipe easy"), _hit("apple cider")]
+
+
+@pytest.fixture
+def later():
+    return time.perf_counter() + 60
+
+
+def test_mmr_skips_near_duplicates(db, embedder, later):
+    relevance_only = MMRReranker(lambda_=1.0).rerank("apple pie recipe", _hits(), 2, later)
+    assert [h["text"] for h in relevance_only] == ["apple pie recipe", "apple pie recipe easy"]
+
+    diverse = MMRReranker(lambda_=0.3).rerank("apple pie recipe", _hits(), 2, later)
+    assert [h["text"] for h in diverse] == ["apple pie recipe", "apple cider"]
+    assert all("rerank_score" in h["meta"] for h in diverse)
+
+
+def test_mmr_stops_at_the_deadline(db, embedder):
+    with pytest.raises(RerankTimeout):
+        MMRReranker().rerank("apple", _hits(), 2, time.perf_counter() - 1)
+
+
+class SlowReranker(Reranker):
+    name = "slow"
+
+    def rerank(self, query, hits, top_k, deadline, query_vector=None):
+        raise RerankTimeout()
+
+
+def test_retrieve_keeps_search_order_when_reranking_times_out(db, embedder, monkeypatch):
+    manager = index_manager.IndexManager(index_type="flat")
+    monkeypatch.setattr(index_manager, "get_index_manager", lambda: manager)
+    database.add_change_listener(manager.on_document_change)
+    for text in ("apple pie", "apple cider", "apple tart"):
+        database.add_document("file", f"{text}.txt", text)
+    monkeypatch.setattr(rag_engine, "RERANKERS", dict(rag_engine.RERANKERS))
+    monkeypatch.setattr(rag_engine, "_rerankers", {})
+    rag_engine.register_reranker("slow", SlowReranker)
+
+    hits = rag_engine.retrieve("apple", top_k=2, reranker="slow")
+    searched = manager.search("apple", top_k=2)
+
+    assert [h["text"] for h in hits] == [h["text"] for h in searched]
+    assert {h["meta"]["reranker"] for h in hits} == {"none"}
+
+    with pytest.raises(ValueError):
+        rag_engine.get_reranker("missing")
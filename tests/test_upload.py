@@ -0,0 +1,41 @@
+import io
+
+import pytest
+
+import database
+from ingest_dedup import sha256_bytes
+
+
+@pytest.fixture
+def client(db, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)     # importing app creates ./uploads
+    import app
+
+    (tmp_path / "uploads").mkdir(exist_ok=True)
+    monkeypatch.setitem(app.app.config, "UPLOAD_FOLDER", str(tmp_path / "uploads"))
+    return app.app.test_client()
+
+
+def _upload(client, name, data):
+    response = client.post("/upload", data={"file": (io.BytesIO(data), name)},
+                           content_type="multipart/form-data")
+    assert response.status_code == 200
+    return response.get_json()["results"][0]["status"]
+
+
+def test_only_new_and_changed_uploads_are_kept(client, tmp_path):
+    folder = tmp_path / "uploads"
+
+    assert _upload(client, "a.txt", b"apples") == "new"
+    assert [p.name for p in folder.iterdir()] == ["a.txt"]
+    path = str(folder / "a.txt")
+    database.add_document("file", path, "apples", source={
+        "source_key": path, "source_hash": sha256_bytes(b"apples")})
+
+    assert _upload(client, "b.txt", b"apples") == "duplicate"
+    assert _upload(client, "a.txt", b"apples") == "unchanged"
+    assert [p.name for p in folder.iterdir()] == ["a.txt"]
+
+    assert _upload(client, "a.txt", b"apricots") == "changed"
+    assert [p.name for p in folder.iterdir()] == ["a.txt"]
+    assert (folder / "a.txt").read_bytes() == b"apricots"
@@ -0,0 +1,89 @@
+"""
+Optional warm-up of the lazily loaded libraries.
+
+Importing app.py no longer loads the embedder, FAISS, Gemini, OCR or
+export libraries. Call start_warmup() (or set WARMUP_ON_START=1) to load
+them in a background thread so the first real request does not pay for it.
+"""
+
+import threading
+
+
+def _load_embedder():
+    from rag_engine import get_embedder
+    get_embedder()
+
+
+def _load_faiss():
+    from ann_index import get_faiss
+    get_faiss()
+
+
+def _load_index():
+    from index_manager import get_index_manager
+    get_index_manager().ensure_loaded()
+
+
+def _load_reranker():
+    from rag_engine import get_reranker
+    reranker = get_reranker()
+    if hasattr(reranker, "get_model"):
+        reranker.get_model()
+
+
+def _load_gemini():
+    from llm_client import get_client
+    get_client().backend
+
+
+def _load_ocr():
+    from ocr_utils import _ocr_libs
+    _ocr_libs()
+
+
+def _load_ingest_libs():
+    import docx  # noqa: F401
+    import PyPDF2  # noqa: F401
+    import requests  # noqa: F401
+    from bs4 import BeautifulSoup  # noqa: F401
+
+
+def _load_export_libs():
+    import openpyxl  # noqa: F401
+
+
+# Order matters: the index load needs both faiss and the embedder.
+WARMUP_STEPS = [
+    ("faiss", _load_faiss),
+    ("embedder", _load_embedder),
+    ("index", _load_index),
+    ("reranker", _load_reranker),
+    ("gemini", _load_gemini),
+    ("ocr", _load_ocr),
+    ("ingest", _load_ingest_libs),
+    ("export", _load_export_libs),
+]
+
+
+def warm_up(steps=None):
+    """
+    Load the selected components now. Returns {name: error or None};
+    a missing optional library is reported, never raised.
+    """
+    results = {}
+    for name, loader in WARMUP_STEPS:
+        if steps is not None and name not in steps:
+            continue
+        try:
+            loader()
+            results[name] = None
+        except Exception as e:
+            results[name] = str(e)
+    return results
+
+
+def start_warmup(steps=None):
+    """Run warm_up() in a daemon thread and return the thread."""
+    thread = threading.Thread(target=warm_up, args=(steps,), name="warmup", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,211 @@
+"""
+Worker processes for the background job queue (jobs.py).
+
+    python worker.py            # JOB_WORKERS processes (at least one)
+    python worker.py 4
+
+Each worker claims the highest-priority runnable job, runs its handler
+and renews its lease while it runs. A handler that raises is retried
+after JOB_RETRY_DELAY seconds (doubled per attempt) until the job is out
+of attempts; a worker that dies loses its lease and the job is taken
+over by another worker. app.py starts JOB_WORKERS of these itself when
+run directly; under a WSGI server run this script next to it.
+
+Documents added by a worker are embedded and indexed in that worker
+(index_manager listens for them), and the saved index is picked up by
+the web processes. Changes made in a web process (deletes, resets)
+reach the index as "index_sync" jobs.
+"""
+
+import atexit
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+
+import database
+from config import JOB_LEASE_SECONDS, JOB_POLL_SECONDS, JOB_RETRY_DELAY, JOB_WORKERS
+from jobs import JobCancelled, get_job_registry
+
+
+# -----------------------------
+# Handlers: handler(job_id, payload)
+# -----------------------------
+def _ingest(job_id, payload):
+    from ingest_pipeline import get_pipeline
+    get_pipeline().run(job_id, payload["paths"], payload["sources"], payload["skipped"])
+
+
+def _fetch_url(job_id, payload):
+    from ingest_dedup import ingest_url
+    url = payload["url"]
+    status, doc_id = ingest_url(url)
+    get_job_registry().add_results(job_id, [{"file": url, "type": "url",
+                                             "doc_id": doc_id, "status": status}])
+
+
+def _crawl(job_id, payload):
+    from crawler import Crawler
+    crawler = Crawler(**payload.get("options", {}))
+    try:
+        crawler.run(payload["seeds"], job_id)
+    finally:
+        crawler.session.close()
+
+
+def _summarize(job_id, payload):
+    from bulk_summarize import run_bulk_summarize
+    run_bulk_summarize(job_id)
+
+
+def _analyze(job_id, payload):
+    from analysis_utils import analyze_documents
+    analyze_documents(payload.get("doc_ids"), payload.get("method", "llm"), job_id)
+
+
+def _index_sync(job_id, payload):
+    from index_manager import get_index_manager
+    # A document change made in a web process, applied to the index here
+    get_index_manager().on_document_change(payload["event"], payload.get("doc_id"))
+
+
+def _reindex(job_id, payload):
+    from index_manager import get_index_manager
+    # Loads the index saved by another worker if that is already current
+    get_index_manager().ensure_loaded()
+
+
+HANDLERS = {
+    "ingest": _ingest,
+    "fetch_url": _fetch_url,
+    "crawl": _crawl,
+    "summarize": _summarize,
+    "analyze": _analyze,
+    "reindex": _reindex,
+    "index_sync": _index_sync,
+}
+
+
+# -----------------------------
+# Worker loop
+# -----------------------------
+def run_job(job, worker):
+    """Run one claimed job, renewing its lease until the handler returns."""
+    jobs = get_job_registry()
+    job_id = job["id"]
+
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(JOB_LEASE_SECONDS / 3):
+            jobs.renew(job_id, worker)
+
+    thread = threading.Thread(target=heartbeat, name=f"lease-{job_id[:8]}", daemon=True)
+    thread.start()
+    try:
+        handler = HANDLERS.get(job["kind"])
+        if handler is None:
+            jobs.finish(job_id, "failed", f"Unknown job kind: {job['kind']}")
+            return
+        handler(job_id, job["payload"])
+        jobs.finish(job_id)
+    except JobCancelled:
+        jobs.finish(job_id, "cancelled")
+    except Exception as e:
+        if job["attempts"] < job["max_attempts"]:
+            jobs.retry(job_id, JOB_RETRY_DELAY * 2 ** (job["attempts"] - 1), str(e))
+        else:
+            jobs.finish(job_id, "failed", str(e))
+    finally:
+        stop.set()
+
+
+def run_worker(stop=None, worker=None):
+    """Claim and run jobs until stop (a threading / multiprocessing Event) is set."""
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    database.init_db()
+
+    # Documents this worker stores are indexed here
+    from index_manager import get_index_manager
+    get_index_manager()
+
+    jobs = get_job_registry()
+    try:
+        while stop is None or not stop.is_set():
+            job = jobs.claim(worker)
+            if job is not None:
+                run_job(job, worker)
+            elif stop is not None:
+                stop.wait(JOB_POLL_SECONDS)
+            else:
+                time.sleep(JOB_POLL_SECONDS)
+    finally:
+        # A worker process joins its children on exit before their pools
+        # would shut down on their own, so close them first
+        from embedding_service import get_embedding_service
+        from ingest_pipeline import get_pipeline
+        get_pipeline().close()
+        get_embedding_service().close()
+
+
+def _worker_main(stop, db_path):
+    database.DB_PATH = db_path
+    try:
+        run_worker(stop)
+    except KeyboardInterrupt:
+        pass
+
+
+# ----------------------------------------------------
+# Worker processes
+# ----------------------------------------------------
+def start_workers(count=JOB_WORKERS):
+    """
+    Start count worker processes and return (processes, stop event).
+    They are stopped when the calling process exits.
+    """
+    # spawn: the caller may already hold threads, sockets and model state
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    processes = []
+    for i in range(count):
+        # Not daemonic: workers start their own OCR / embedding pools
+        process = context.Process(target=_worker_main, args=(stop, database.DB_PATH),
+                                  name=f"job-worker-{i}")
+        process.start()
+        processes.append(process)
+    atexit.register(stop_workers, processes, stop)
+    return processes, stop
+
+
+def stop_workers(processes, stop, timeout=10):
+    """Let workers finish their current job, then terminate stragglers."""
+    stop.set()
+    deadline = time.monotonic() + timeout
+    for process in processes:
+        process.join(max(0.0, deadline - time.monotonic()))
+        if process.is_alive():
+            process.terminate()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else max(1, JOB_WORKERS)
+    if count == 1:
+        try:
+            run_worker()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    processes, stop = start_workers(count)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        stop_workers(processes, stop)
+
+
+if __name__ == "__main__":
+    main()